@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""Scaling benchmarks of cset
+
+Runs the operations that grow with the number of cpusets or tasks at
+increasing sizes and reports the best time of several runs, the
+throughput, the time per item and the peak memory of one extra run
+under tracemalloc.  The cpusets and processes are simulated (see
+cpuset/backend.py) unless --tree is given, then the hierarchy is laid
+out as files in a directory, best one on tmpfs; the benchmarks of
+processes always run on a simulated system.  Neither needs root.
+
+With --save the results are stored as the baseline, later runs compare
+the time per item against it and flag, and exit with status 1 for,
+everything that got slower by more than the threshold.
+
+    python benchmarks/bench.py --save         # on the old code
+    python benchmarks/bench.py                # on the new code
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, os, gc, json, time, shutil, logging, optparse, tempfile, tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cpuset import backend, config, cset
+from cpuset.commands import proc, set
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+class Tree(backend.Kernel):
+    """a cpuset hierarchy laid out as plain files under root"""
+    def __init__(self, root):
+        self.root = root
+    def read(self, path):
+        if path == '/proc/mounts':
+            return 'cgroup %s cgroup rw,cpuset 0 0\n' % self.root
+        return backend.Kernel.read(self, path)
+
+def set_paths(n):
+    """paths of n sets, in groups of up to 100 below the root"""
+    l = []
+    for g in range((n + 99) // 100):
+        l.append('/grp%d' % g)
+        for s in range(min(99, n - len(l))):
+            l.append('/grp%d/set%d' % (g, s))
+    return l[:n]
+
+class Env(object):
+    """what one benchmark run works on"""
+    tree = None
+    current = None
+
+    def __init__(self, sets=0, processes=0):
+        self.sim = backend.Simulated(cpus=8, processes=processes, kthreads=0)
+        self.paths = set_paths(sets)
+        if Env.tree and sets:
+            root = tempfile.mkdtemp(dir=Env.tree)
+            self.cleanup = lambda: shutil.rmtree(root)
+            self.hierarchy = Tree(root)
+            self.layout(root, ['/'] + self.paths)
+        else:
+            self.cleanup = lambda: None
+            self.hierarchy = self.sim
+            for path in self.paths:
+                self.sim.mkdir(self.sim.root + path)
+                self.sim.write(self.sim.root + path + '/cpuset.cpus', '0-7')
+                self.sim.write(self.sim.root + path + '/cpuset.mems', '0')
+        cset.backend = self.hierarchy
+        cset.RootSet = None
+        cset.CpuSet.basepath = ''
+        cset.CpuSet.sets = {}
+        cset.watcher = None
+        Env.current = self
+
+    def layout(self, root, paths):
+        for path in paths:
+            dir = root + path.rstrip('/')
+            if path != '/': os.mkdir(dir)
+            for name, val in (('cpuset.cpus', '0-7'), ('cpuset.mems', '0'),
+                              ('cpuset.cpu_exclusive', '0'),
+                              ('cpuset.mem_exclusive', '0'), ('tasks', '')):
+                f = open(dir + '/' + name, 'w')
+                f.write(val + '\n')
+                f.close()
+
+def restore():
+    cset.backend = cset.kernel
+    cset.RootSet = None
+    cset.CpuSet.basepath = ''
+    cset.CpuSet.sets = {}
+
+# Each benchmark is set up by a function that is given the size and
+# returns the function to time and the number of items it processes.
+
+def discover(n):
+    Env(sets=n)
+    cset.locate()
+    return cset.CpuSet, n + 1
+
+def rescan(n):
+    Env(sets=n)
+    cset.watcher = cset.HierarchyWatcher()
+    cset.rescan()
+    # unchanged hierarchy, only the check for changes is done
+    return cset.rescan, n + 1
+
+def find_sets(n):
+    env = Env(sets=n)
+    cset.rescan()
+    names = [p[p.rfind('/')+1:] for p in env.paths[::max(1, n // 100)]]
+    def run():
+        for name in names: cset.find_sets(name)
+    return run, len(names)
+
+def unique_set(n):
+    env = Env(sets=n)
+    cset.rescan()
+    paths = env.paths[::max(1, n // 100)]
+    def run():
+        for path in paths: cset.unique_set(path)
+    return run, len(paths)
+
+def list_sets(n):
+    Env(sets=n)
+    cset.rescan()
+    return lambda: set.list_sets('root', recurse=True), n + 1
+
+def task_detail_table(n):
+    env = Env(processes=n)
+    pids = env.sim.pids()[:n]
+    return lambda: proc.task_detail_table(pids), n
+
+def pidspec_to_list(n):
+    env = Env(processes=n)
+    return lambda: proc.pidspec_to_list('1-%d' % (n + n // 2)), n + n // 2
+
+def pidspec_to_list_fset(n):
+    env = Env(processes=n)
+    cset.rescan()
+    return lambda: proc.pidspec_to_list('1-%d' % n, 'root'), n
+
+def selective_move(n):
+    env = Env(processes=n)
+    set.create('target', '0-7', '0', False, False)
+    fset, tset = cset.unique_set('root'), cset.unique_set('target')
+    return lambda: proc.selective_move(fset, tset), n
+
+benchmarks = [
+    ('discover', discover, (10, 1000, 10000)),
+    ('rescan', rescan, (10, 1000, 10000)),
+    ('find_sets', find_sets, (10, 1000, 10000)),
+    ('unique_set', unique_set, (10, 1000, 10000)),
+    ('list_sets', list_sets, (10, 1000, 10000)),
+    ('task_detail_table', task_detail_table, (1000, 10000, 100000)),
+    ('pidspec_to_list', pidspec_to_list, (1000, 10000, 100000)),
+    ('pidspec_to_list_fset', pidspec_to_list_fset, (1000, 10000)),
+    ('selective_move', selective_move, (1000, 10000)),
+]
+
+@contextlib.contextmanager
+def quiet():
+    """discard the progress bars and listings of the commands"""
+    null = open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(null):
+            yield
+    finally:
+        null.close()
+
+def measure(setup, size, repeat):
+    """return (best seconds, items, peak bytes)"""
+    best = None
+    for i in range(repeat + 1):
+        run, items = setup(size)
+        gc.collect()
+        try:
+            with quiet():
+                if i == repeat:
+                    tracemalloc.start()
+                    run()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                else:
+                    start = time.perf_counter()
+                    run()
+                    secs = time.perf_counter() - start
+                    if best == None or secs < best: best = secs
+        finally:
+            restore()
+            Env.current.cleanup()
+    return best, items, peak
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [BENCHMARK...]')
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='timed runs of each benchmark, the best counts [%default]')
+    parser.add_option('-q', '--quick', action='store_true',
+                      help='only run the smallest sizes')
+    parser.add_option('--tree', metavar='DIR',
+                      help='lay out the cpuset hierarchy as files in DIR')
+    parser.add_option('-b', '--baseline', metavar='FILE',
+                      default=os.path.join(here, 'baseline.json'),
+                      help='baseline to compare with [%default]')
+    parser.add_option('-s', '--save', action='store_true',
+                      help='store the results as the baseline')
+    parser.add_option('-t', '--threshold', type='float', default=25,
+                      help='percent slower than the baseline to flag [%default]')
+    parser.add_option('-l', '--list', action='store_true',
+                      help='list the benchmarks and their sizes')
+    options, args = parser.parse_args()
+    if options.list:
+        for name, setup, sizes in benchmarks:
+            print('%-22s %s' % (name, ' '.join([str(s) for s in sizes])))
+        return 0
+    for name in args:
+        if name not in [b[0] for b in benchmarks]:
+            parser.error('unknown benchmark "%s"' % name)
+    Env.tree = options.tree
+    config.mread = False
+    logging.disable(logging.CRITICAL)
+
+    baseline = {}
+    if not options.save and os.access(options.baseline, os.R_OK):
+        f = open(options.baseline)
+        baseline = json.load(f)
+        f.close()
+    results = {}
+    slower = []
+    print('%-22s %7s %10s %12s %10s %10s %8s' % ('Benchmark', 'Size', 'Seconds',
+                                                 'Items/s', 'us/item', 'Peak KiB',
+                                                 'Change'))
+    for name, setup, sizes in benchmarks:
+        if args and name not in args: continue
+        if options.quick: sizes = sizes[:1]
+        for size in sizes:
+            key = '%s/%s' % (name, size)
+            secs, items, peak = measure(setup, size, options.repeat)
+            per = secs / items
+            results[key] = {'seconds': secs, 'items': items, 'per_item': per,
+                            'peak': peak}
+            change = ''
+            if key in baseline:
+                pct = 100.0 * (per - baseline[key]['per_item']) / baseline[key]['per_item']
+                change = '%+.0f%%' % pct
+                if pct > options.threshold:
+                    change += ' SLOWER'
+                    slower.append(key)
+            print('%-22s %7s %10.6f %12.0f %10.3f %10.0f %8s' %
+                  (name, size, secs, items / secs if secs else 0, per * 1e6,
+                   peak / 1024.0, change))
+            sys.stdout.flush()
+    if options.save:
+        f = open(options.baseline, 'w')
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.write('\n')
+        f.close()
+        print('baseline saved to %s' % options.baseline)
+    if slower:
+        print('%d slower than the baseline by more than %s%%: %s' %
+              (len(slower), options.threshold, ' '.join(slower)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Startup time of cset
+
+Measures with -X importtime what the modules cset loads on the path of
+"cset proc --exec" take to import, on top of those the interpreter loads
+anyway, and reports the best of several runs.  The time depends on the
+machine, runs that exceed the budget exit with status 1.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --budget 40000 --repeat 10
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, os, optparse, subprocess
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import time budget in microseconds
+BUDGET = 30000
+
+CODE = 'import cpuset.main, cpuset.commands.proc'
+
+def importtime(code):
+    """return {module: self time in us} of running code with -X importtime"""
+    # byte-compiling is not what we measure, let the first run cache it
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         cwd=TOP, env=env, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, universal_newlines=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        times[fields[2].strip()] = int(fields[0])
+    return times
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--budget', type='int', default=BUDGET, metavar='US',
+                      help='fail above US microseconds (default %d)' % BUDGET)
+    parser.add_option('--repeat', type='int', default=5, metavar='N',
+                      help='best of N runs (default 5)')
+    parser.add_option('--top', type='int', default=10, metavar='N',
+                      help='list the N slowest modules (default 10)')
+    options, args = parser.parse_args()
+    importtime(CODE)
+    best = None
+    for i in range(options.repeat):
+        base = importtime('pass')
+        mods = dict([(m, t) for m, t in importtime(CODE).items()
+                     if m not in base])
+        total = sum(mods.values())
+        if best == None or total < best[0]:
+            best = (total, mods)
+    total, mods = best
+    for mod in sorted(mods, key=lambda m: -mods[m])[:options.top]:
+        print('%-40s %8d us' % (mod, mods[mod]))
+    print('%-40s %8d us (budget %d us)' % ('total', total, options.budget))
+    if total > options.budget:
+        print('over budget')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+"""Programmatic interface to cpusets
+
+The objects in this module keep all of their state, nothing is taken
+from the configuration or from module globals, so several hierarchies
+(for example directories laid out like a cpuset mount in tests) can be
+used side by side in one process.  Operations return their results
+instead of printing them and report errors with the cpuset exceptions.
+
+    >>> h = Hierarchy()
+    >>> s = h.create('/rt', cpus='2-3', mems='0')
+    >>> TaskMover(h).move([1234], s)
+    MoveResult(moved=[1234], notfound=[], unmovable=[])
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, re, time, errno, select, collections
+
+from cpuset import backend as _backend
+from cpuset.util import (CpusetException, CpusetNotFound, CpusetNotUnique,
+                         CpusetExists)
+
+MoveResult = collections.namedtuple('MoveResult', 'moved notfound unmovable')
+ShieldStatus = collections.namedtuple('ShieldStatus',
+        'active system_cpus user_cpus system_tasks user_tasks')
+
+def cpuspec_to_ints(cpuspec):
+    """return the frozenset of cpu (or memory node) numbers in a cpuspec"""
+    l = []
+    for sub in cpuspec.split(','):
+        items = sub.split('-')
+        if len(items) == 1:
+            if not len(items[0]):
+                continue
+            l.append(int(items[0]))
+        elif len(items) == 2:
+            l.extend(range(int(items[0]), int(items[1])+1))
+        else:
+            raise CpusetException('CPUSPEC "%s" has bad group "%s"' % (cpuspec, sub))
+    return frozenset(l)
+
+def ints_to_cpuspec(ints):
+    """return the canonical cpuspec for a collection of cpu numbers"""
+    groups = []
+    for x in sorted(ints):
+        if len(groups) and groups[-1][1] == x-1:
+            groups[-1][1] = x
+        else:
+            groups.append([x, x])
+    return ','.join([str(a) if a == b else '%d-%d' % (a, b) for a, b in groups])
+
+def spec(val):
+    """return a cpuspec for a cpuspec string or a collection of numbers"""
+    if isinstance(val, str):
+        return ints_to_cpuspec(cpuspec_to_ints(val))
+    return ints_to_cpuspec(val)
+
+def locate_mount(backend=None):
+    """return where the cpuset filesystem is mounted, None if it is not"""
+    if backend == None: backend = _backend.kernel
+    regex = re.compile(r"^[^ ]+ (/.+) (?:cpuset |cgroup (?:[^ ]*,)?cpuset[, ])")
+    for line in backend.read('/proc/mounts').splitlines():
+        res = regex.search(line)
+        if res:
+            return res.group(1)
+    return None
+
+class Hierarchy(object):
+    """a cpuset hierarchy, the cpuset filesystem or a directory tree
+
+    Sets are addressed by their path relative to the root of the
+    hierarchy; nothing is cached, every access reads the filesystem.
+    If a stats object with a count(name, n) method is given, reads,
+    writes and moves are counted into it.  All I/O goes through backend,
+    the running kernel unless given, see cpuset.backend.
+    """
+    def __init__(self, root=None, stats=None, backend=None):
+        self.stats = stats
+        self.backend = backend or _backend.kernel
+        if root == None:
+            root = locate_mount(self.backend)
+            if root == None:
+                raise CpusetException('the cpuset filesystem is not mounted')
+        self.root = root.rstrip('/')
+        # mounted as a cgroup controller the files carry a prefix
+        if self.backend.exists(self.root + '/cpus'):
+            self.prefix = ''
+        else:
+            self.prefix = 'cpuset.'
+
+    def __repr__(self):
+        return '<Hierarchy %s>' % self.root
+
+    def dir(self, path):
+        """absolute directory of the set at path"""
+        return self.root + path.rstrip('/')
+
+    def file(self, path, name):
+        """absolute path of a file of the set at path"""
+        if name != 'tasks':
+            name = self.prefix + name
+        return self.dir(path) + '/' + name
+
+    def exists(self, path):
+        return self.backend.exists(self.file(path, 'cpus'))
+
+    def set(self, path):
+        """the set at path, raise CpusetNotFound if there is none"""
+        if path == 'root': path = '/'
+        if not path.startswith('/'): path = '/' + path
+        if len(path) > 1: path = path.rstrip('/')
+        if not self.exists(path):
+            raise CpusetNotFound('cpuset "%s" not found in cpusets' % path)
+        return CpuSet(self, path)
+
+    @property
+    def rootset(self):
+        return CpuSet(self, '/')
+
+    def sets(self):
+        """generate all sets, parents before their children"""
+        for dir, dirs, files in self.backend.walk(self.root):
+            dirs.sort()
+            path = dir[len(self.root):] or '/'
+            yield CpuSet(self, path)
+
+    def find(self, name):
+        """return the sets with a name or path, raise CpusetNotFound if none"""
+        if name == 'root' or name.find('/') != -1:
+            return [self.set(name)]
+        found = [s for s in self.sets() if s.path != '/' and s.name == name]
+        if len(found) == 0:
+            raise CpusetNotFound('cpuset "%s" not found in cpusets' % name)
+        return found
+
+    def unique(self, name):
+        """return the one set with a name or path"""
+        if isinstance(name, CpuSet): return name
+        found = self.find(name)
+        if len(found) > 1:
+            raise CpusetNotUnique('cpuset name "%s" not unique: %s' %
+                                  (name, [s.path for s in found]))
+        return found[0]
+
+    def create(self, path, cpus, mems, cpu_exclusive=False, mem_exclusive=False):
+        """create the set at path, the parent must exist"""
+        if not path.startswith('/'): path = '/' + path
+        path = path.rstrip('/')
+        if self.exists(path):
+            raise CpusetExists('cpuset "%s" already exists' % path)
+        parent = path[:path.rfind('/')] or '/'
+        if not self.exists(parent):
+            raise CpusetNotFound('parent cpuset "%s" does not exist' % parent)
+        self.backend.mkdir(self.dir(path))
+        new = CpuSet(self, path)
+        try:
+            new.mems = mems
+            new.cpus = cpus
+            if cpu_exclusive: new.cpu_exclusive = True
+            if mem_exclusive: new.mem_exclusive = True
+        except (IOError, OSError):
+            self.backend.rmdir(self.dir(path))
+            raise
+        return new
+
+    def destroy(self, cpuset, recurse=False, timeout=3.5):
+        """destroy a set, and its subsets if recurse is true
+
+        All tasks of the sets are moved to the parent of cpuset first,
+        the sets are then removed bottom-up.  Returns the MoveResult of
+        moving the tasks out.
+        """
+        top = self.unique(cpuset)
+        if top.path == '/':
+            raise CpusetException('the root cpuset cannot be destroyed')
+        tree = [top]
+        for node in tree:
+            children = node.children
+            if len(children) and not recurse:
+                raise CpusetException('cpuset "%s" has subsets' % top.path)
+            tree.extend(children)
+        tasks = []
+        for node in tree:
+            tasks.extend(node.tasks)
+        mover = TaskMover(self)
+        res = mover.move(tasks, top.parent)
+        for node in reversed(tree):
+            left = mover.wait_empty(node, top.parent, timeout)
+            if len(left):
+                raise CpusetException('trying to destroy cpuset %s with tasks '
+                                      'running: %s' % (node.path, left))
+            self.backend.rmdir(self.dir(node.path))
+        return res
+
+class CpuSet(object):
+    """one set of a Hierarchy, cpus and mems are frozensets of numbers"""
+    def __init__(self, hierarchy, path):
+        self.hierarchy = hierarchy
+        self.path = path
+        self.name = 'root' if path == '/' else path[path.rfind('/')+1:]
+
+    def __repr__(self):
+        return '<CpuSet %s>' % self.path
+
+    def __eq__(self, other):
+        return (isinstance(other, CpuSet) and self.path == other.path and
+                self.hierarchy.root == other.hierarchy.root)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.hierarchy.root, self.path))
+
+    def read(self, name):
+        if self.hierarchy.stats:
+            self.hierarchy.stats.count('tasks_reads' if name == 'tasks'
+                                       else 'property_reads')
+        return self.hierarchy.backend.read(self.hierarchy.file(self.path, name))
+
+    def write(self, name, value):
+        if self.hierarchy.stats:
+            self.hierarchy.stats.count('property_writes')
+        self.hierarchy.backend.write(self.hierarchy.file(self.path, name), value)
+
+    @property
+    def parent(self):
+        if self.path == '/': return self
+        return CpuSet(self.hierarchy, self.path[:self.path.rfind('/')] or '/')
+
+    @property
+    def children(self):
+        base = '' if self.path == '/' else self.path
+        for dir, dirs, files in self.hierarchy.backend.walk(self.hierarchy.dir(self.path)):
+            return [CpuSet(self.hierarchy, base + '/' + d) for d in sorted(dirs)]
+        return []
+
+    @property
+    def cpus(self):
+        return cpuspec_to_ints(self.read('cpus').strip())
+    @cpus.setter
+    def cpus(self, val):
+        self.write('cpus', spec(val))
+
+    @property
+    def mems(self):
+        return cpuspec_to_ints(self.read('mems').strip())
+    @mems.setter
+    def mems(self, val):
+        self.write('mems', spec(val))
+
+    @property
+    def cpu_exclusive(self):
+        return self.read('cpu_exclusive').strip() == '1'
+    @cpu_exclusive.setter
+    def cpu_exclusive(self, val):
+        self.write('cpu_exclusive', '1' if val else '0')
+
+    @property
+    def mem_exclusive(self):
+        return self.read('mem_exclusive').strip() == '1'
+    @mem_exclusive.setter
+    def mem_exclusive(self, val):
+        self.write('mem_exclusive', '1' if val else '0')
+
+    @property
+    def tasks(self):
+        return [int(t) for t in self.read('tasks').split()]
+
+    def info(self):
+        """return the properties of the set as a dict"""
+        return {'path': self.path, 'name': self.name,
+                'cpus': ints_to_cpuspec(self.cpus),
+                'mems': ints_to_cpuspec(self.mems),
+                'cpu_exclusive': self.cpu_exclusive,
+                'mem_exclusive': self.mem_exclusive,
+                'tasks': len(self.tasks)}
+
+def path_of(cpuset):
+    """the path of a CpuSet, or of a set given by its path"""
+    if isinstance(cpuset, CpuSet): return cpuset.path
+    if cpuset == 'root': return '/'
+    return cpuset
+
+class TaskMover(object):
+    """move tasks between the sets of a Hierarchy, the sets are given as
+       CpuSet objects or by path"""
+    def __init__(self, hierarchy):
+        self.hierarchy = hierarchy
+
+    def move(self, tasks, target, progress=None):
+        """move tasks into target, return a MoveResult
+
+        The tasks file is opened once and every task is written with
+        its own write(2), the kernel moves one task per write.  If
+        given, progress is called with the number of tasks done.
+        """
+        moved, notfound, unmovable = [], [], []
+        stats = self.hierarchy.stats
+        f = self.hierarchy.backend.open_tasks(self.hierarchy.file(path_of(target), 'tasks'))
+        try:
+            for nr, task in enumerate(tasks):
+                try:
+                    f.write(task)
+                    moved.append(task)
+                except OSError as err:
+                    if err.errno == errno.ESRCH:
+                        notfound.append(task)
+                    else:
+                        unmovable.append(task)
+                    if stats:
+                        stats.count('migrate_' + errno.errorcode.get(err.errno,
+                                                                     str(err.errno)))
+                if progress: progress(nr + 1)
+        finally:
+            f.close()
+        if stats:
+            stats.count('tasks_writes', len(tasks))
+            stats.count('migrate_ok', len(moved))
+        return MoveResult(moved, notfound, unmovable)
+
+    def move_all(self, source, target, progress=None):
+        """move all tasks of source into target"""
+        return self.move(CpuSet(self.hierarchy, path_of(source)).tasks, target,
+                         progress)
+
+    def wait_empty(self, cpuset, moveto=None, timeout=3.5):
+        """wait for cpuset to have no tasks left, return the tasks left
+
+        Tasks that still show up, e.g. forked by tasks while they were
+        being moved out, are moved to moveto if given.  Where the kernel
+        provides cgroup.events the wait is driven by its notifications,
+        otherwise the tasks are re-checked with exponential backoff.
+        """
+        path = path_of(cpuset)
+        deadline = time.time() + timeout
+        backend = self.hierarchy.backend
+        tasksfile = self.hierarchy.file(path, 'tasks')
+        if not backend.exists(tasksfile):
+            tasksfile = self.hierarchy.dir(path) + '/cgroup.procs'
+        events = self.hierarchy.dir(path) + '/cgroup.events'
+        poller = None
+        # only the kernel notifies, a simulation has no cgroup.events
+        if backend.exists(events):
+            evfd = os.open(events, os.O_RDONLY)
+            poller = select.poll()
+            poller.register(evfd, select.POLLPRI | select.POLLERR)
+        delay = 0.001
+        try:
+            while True:
+                if poller:
+                    os.lseek(evfd, 0, os.SEEK_SET)
+                    if os.read(evfd, 4096).find(b'populated 0') != -1:
+                        return []
+                tasks = backend.read(tasksfile).split()
+                if len(tasks) == 0:
+                    return []
+                if moveto != None:
+                    self.move(tasks, moveto)
+                left = deadline - time.time()
+                if left <= 0:
+                    return tasks
+                if poller:
+                    poller.poll(left * 1000)
+                else:
+                    time.sleep(min(delay, left))
+                    delay = min(delay * 2, 0.1)
+        finally:
+            if poller: os.close(evfd)
+
+def task_kind(pid, backend=None, classifier=None):
+    """return 'user', 'kthread' or 'bound' (a kernel thread bound to one
+       cpu) for a task, None if it does not exist; kernel threads are
+       told by the PF_KTHREAD flag of their stat file, see
+       cpuset.procfs.Classifier, which classifier may be to read many
+       tasks at once"""
+    if classifier == None:
+        from cpuset import procfs
+        if backend == None: backend = _backend.kernel
+        classifier = procfs.Classifier(backend)
+    kind = classifier.kind(pid)
+    if kind == None:
+        return None
+    if not kind.kthread:
+        return 'user'
+    return 'bound' if classifier.bound(pid) else 'kthread'
+
+class Shield(object):
+    """the basic shield: a user set of shielded cpus and a system set
+       with the other cpus, both children of the root set"""
+    def __init__(self, hierarchy, system='system', user='user'):
+        self.hierarchy = hierarchy
+        self.system = '/' + system.strip('/')
+        self.user = '/' + user.strip('/')
+
+    def __repr__(self):
+        return '<Shield %s %s>' % (self.system, self.user)
+
+    @property
+    def active(self):
+        return self.hierarchy.exists(self.system) and self.hierarchy.exists(self.user)
+
+    def status(self):
+        """return a ShieldStatus"""
+        if not self.active:
+            return ShieldStatus(False, frozenset(), frozenset(), [], [])
+        sys = self.hierarchy.set(self.system)
+        usr = self.hierarchy.set(self.user)
+        return ShieldStatus(True, sys.cpus, usr.cpus, sys.tasks, usr.tasks)
+
+    def apply(self, cpus, mems='0', kthreads=False):
+        """shield cpus, creating the shield or changing an existing one
+
+        Both sets are changed in one planned and journaled transaction,
+        see cpuset.layout.  Then the userspace tasks of the root set,
+        and the unbound kernel threads if kthreads is true, are moved
+        to the system set.  Returns the MoveResult of that move.
+        """
+        from cpuset import layout
+        shielded = cpuspec_to_ints(spec(cpus))
+        rest = self.hierarchy.rootset.cpus - shielded
+        if not shielded <= self.hierarchy.rootset.cpus:
+            raise CpusetException('CPUSPEC "%s" names cpus that are not available'
+                                  % spec(cpus))
+        if len(rest) == 0:
+            raise CpusetException('CPUSPEC "%s" leaves no CPUs for the system set'
+                                  % spec(cpus))
+        lay = layout.Layout([layout.SetSpec(self.user,
+                                            {'cpus': spec(shielded), 'mems': spec(mems),
+                                             'cpu_exclusive': True}),
+                             layout.SetSpec(self.system,
+                                            {'cpus': spec(rest), 'mems': spec(mems),
+                                             'cpu_exclusive': True})], [])
+        state = layout.State(self.hierarchy)
+        layout.execute(layout.plan(lay, state), self.hierarchy)
+        kinds = ('user', 'kthread') if kthreads else ('user',)
+        from cpuset import procfs
+        classifier = procfs.Classifier(self.hierarchy.backend)
+        tasks = self.hierarchy.rootset.tasks
+        classifier.classify(tasks)
+        tasks = [t for t in tasks if task_kind(t, classifier=classifier) in kinds]
+        return TaskMover(self.hierarchy).move(tasks, self.system)
+
+    def reset(self, timeout=3.5):
+        """move all tasks back to the root set and remove the shield"""
+        if not self.active:
+            raise CpusetNotFound('shielding not active on system')
+        mover = TaskMover(self.hierarchy)
+        res = [mover.move_all(self.user, '/'), mover.move_all(self.system, '/')]
+        for path in (self.user, self.system):
+            self.hierarchy.destroy(path, timeout=timeout)
+        return MoveResult(res[0].moved + res[1].moved,
+                          res[0].notfound + res[1].notfound,
+                          res[0].unmovable + res[1].unmovable)
@@ -0,0 +1,606 @@
+"""File system access of cset: the kernel, or a simulation of it
+
+All reads and writes of cpuset files and of /proc go through a backend
+object, addressed with the same paths the kernel uses.  Kernel passes
+them on to the operating system.  Simulated keeps a cpuset hierarchy
+and a process table in memory and enforces the rules the kernel
+applies to cpuset writes, so cset can be exercised without root, on
+any number of cpus and with any number of processes:
+
+    >>> sim = Simulated(cpus=8, processes=1000)
+    >>> cset.backend = sim
+    >>> cset.rescan()
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, io, errno
+from array import array
+
+from cpuset import stats
+
+def counted(path, n=1):
+    """count n accesses to /proc for --stats, if path is in there"""
+    if path == '/proc' or path.startswith('/proc/'):
+        stats.count('proc_reads', n)
+
+class Backend(object):
+    """the operations cset needs, paths are absolute file system paths"""
+    def read(self, path):
+        """return the contents of a file"""
+        raise NotImplementedError
+    def write(self, path, data):
+        raise NotImplementedError
+    def exists(self, path):
+        raise NotImplementedError
+    def listdir(self, path):
+        raise NotImplementedError
+    def walk(self, top, topdown=True):
+        """like os.walk(), generate (dir, dirs, files) tuples"""
+        raise NotImplementedError
+    def mkdir(self, path):
+        raise NotImplementedError
+    def rmdir(self, path):
+        raise NotImplementedError
+    def rename(self, old, new):
+        raise NotImplementedError
+    def readlink(self, path):
+        raise NotImplementedError
+    def open_tasks(self, path):
+        """return a tasks file open for writing, its write(task) moves
+           one task and raises OSError if that fails"""
+        raise NotImplementedError
+    def read_tasks(self, path):
+        """return the task IDs of a tasks file as an array('i')"""
+        return array('i', map(int, self.read(path).split()))
+    def read_many(self, paths):
+        """generate (path, contents) for many small files, such as the
+           files of tasks in /proc, contents is None if path is gone"""
+        for path in paths:
+            try:
+                yield path, self.read(path)
+            except (IOError, OSError):
+                yield path, None
+    def pids(self):
+        """return the process IDs listed in /proc"""
+        raise NotImplementedError
+    def mount(self, mountpoint):
+        """mount the cpuset filesystem at mountpoint"""
+        raise NotImplementedError
+
+class TasksFile(object):
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_WRONLY)
+    def write(self, task):
+        os.write(self.fd, str(task).encode())
+    def close(self):
+        os.close(self.fd)
+
+# a tasks file lists at most one ID of up to 7 digits per line, this
+# holds the tasks of a cpuset of 131072 threads
+TASKS_BUFSIZE = 1 << 20
+
+class Kernel(Backend):
+    """the real thing"""
+    def read(self, path):
+        counted(path)
+        f = io.open(path, encoding="iso8859-1")
+        try: return f.read()
+        finally: f.close()
+
+    def write(self, path, data):
+        f = io.open(path, 'w', encoding="iso8859-1")
+        try: f.write(str(data))
+        finally: f.close()
+
+    def exists(self, path):
+        counted(path)
+        return os.access(path, os.F_OK)
+
+    def listdir(self, path):
+        counted(path)
+        return os.listdir(path)
+
+    def walk(self, top, topdown=True):
+        return os.walk(top, topdown=topdown)
+
+    def mkdir(self, path):
+        os.mkdir(path)
+
+    def rmdir(self, path):
+        os.rmdir(path)
+
+    def rename(self, old, new):
+        os.rename(old, new)
+
+    def readlink(self, path):
+        return os.readlink(path)
+
+    def open_tasks(self, path):
+        return TasksFile(path)
+
+    def read_tasks(self, path):
+        # one read into a buffer large enough for the whole file, the
+        # second only sees the end of it
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            data = os.read(fd, TASKS_BUFSIZE)
+            if len(data) == TASKS_BUFSIZE:
+                chunks = [data]
+                while True:
+                    chunk = os.read(fd, TASKS_BUFSIZE)
+                    if not chunk: break
+                    chunks.append(chunk)
+                data = b''.join(chunks)
+        finally:
+            os.close(fd)
+        return array('i', map(int, data.split()))
+
+    def read_many(self, paths):
+        # plain system calls, the files are small and there are many
+        for path in paths:
+            counted(path)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                yield path, None
+                continue
+            try:
+                chunks = []
+                while True:
+                    chunk = os.read(fd, 4096)
+                    if not chunk: break
+                    chunks.append(chunk)
+                yield path, b''.join(chunks).decode('iso8859-1')
+            except OSError:
+                yield path, None
+            finally:
+                os.close(fd)
+
+    def pids(self):
+        counted('/proc')
+        return [e.name for e in os.scandir('/proc') if e.name.isdigit()]
+
+    def mount(self, mountpoint):
+        if not os.access(mountpoint, os.F_OK):
+            os.mkdir(mountpoint)
+        if os.system("mount -t cpuset none " + mountpoint):
+            raise OSError(errno.EPERM, 'mount of cpuset filesystem failed')
+
+kernel = Kernel()
+
+def oserror(err, path):
+    return OSError(err, os.strerror(err), path)
+
+def ints(spec):
+    from cpuset.api import cpuspec_to_ints
+    try:
+        return cpuspec_to_ints(spec.strip())
+    except ValueError:
+        raise oserror(errno.EINVAL, spec)
+
+def spec(ints):
+    from cpuset.api import ints_to_cpuspec
+    return ints_to_cpuspec(ints)
+
+class SimSet(object):
+    def __init__(self, cpus=frozenset(), mems=frozenset()):
+        self.cpus = cpus
+        self.mems = mems
+        self.cpu_exclusive = False
+        self.mem_exclusive = False
+        self.tasks = set()
+        self.subsets = set()
+
+class SimTask(object):
+    def __init__(self, pid, tgid, ppid, comm, exe, uid, cpuset, bound=None):
+        self.pid = pid
+        self.tgid = tgid
+        self.ppid = ppid
+        self.comm = comm
+        self.exe = exe
+        self.uid = uid
+        self.cpuset = cpuset
+        self.bound = bound      # cpu of per-cpu kernel threads
+        self.state = 'S'
+        self.utime = 0          # clock ticks
+        self.stime = 0
+        self.processor = None   # the first allowed cpu if None
+
+class Simulated(Backend):
+    """a cpuset hierarchy mounted at root and a process table
+
+    Besides init and kthreadd, the system starts with two kernel
+    threads bound to each of its cpus (ksoftirqd and migration),
+    kthreads unbound ones and processes userspace processes with
+    threads extra threads each, all in the root set.
+    """
+    files = ('cpus', 'mems', 'cpu_exclusive', 'mem_exclusive')
+
+    def __init__(self, cpus=4, mems=1, processes=100, threads=0, kthreads=10,
+                 root='/sim/cpuset', prefix='cpuset.'):
+        self.root = root
+        self.prefix = prefix
+        self.sets = {'/': SimSet(frozenset(range(cpus)), frozenset(range(mems)))}
+        self.sets['/'].cpu_exclusive = self.sets['/'].mem_exclusive = True
+        self.online = frozenset(range(cpus))
+        self.tasks = {}
+        self.threads = {}       # tgid -> tids
+        # clock ticks per cpu: user nice system idle iowait irq softirq steal
+        self.cputimes = [[0] * 8 for cpu in range(cpus)]
+        self.nextpid = 1
+        self.spawn(0, 'init', '/sbin/init')
+        kthreadd = self.spawn(0, 'kthreadd', None)
+        for cpu in range(cpus):
+            for name in ('ksoftirqd', 'migration'):
+                pid = self.spawn(kthreadd, '%s/%s' % (name, cpu), None)
+                self.tasks[pid].bound = cpu
+        for n in range(kthreads):
+            self.spawn(kthreadd, 'kworker/u%s' % n, None)
+        for n in range(processes):
+            self.spawn(1, 'proc%s' % n, '/usr/bin/proc%s' % n, threads=threads)
+
+    # process table
+
+    def spawn(self, ppid, comm='task', exe='/usr/bin/task', uid=0, threads=0):
+        """fork a process from ppid, it starts in the cpuset of its
+           parent; return its pid"""
+        pid = self.nextpid
+        cs = self.tasks[ppid].cpuset if ppid in self.tasks else '/'
+        self.threads[pid] = list(range(pid, pid + threads + 1))
+        for tid in self.threads[pid]:
+            self.tasks[tid] = SimTask(tid, pid, ppid, comm, exe, uid, cs)
+            self.sets[cs].tasks.add(tid)
+        self.nextpid = pid + threads + 1
+        return pid
+
+    def clone(self, tid):
+        """start a thread from thread tid, it starts in the cpuset of
+           tid; return its thread ID"""
+        parent = self.tasks[tid]
+        new = self.nextpid
+        self.tasks[new] = SimTask(new, parent.tgid, parent.ppid, parent.comm,
+                                  parent.exe, parent.uid, parent.cpuset)
+        self.threads[parent.tgid].append(new)
+        self.sets[parent.cpuset].tasks.add(new)
+        self.nextpid = new + 1
+        return new
+
+    def exit(self, pid):
+        """end the process pid with all of its threads"""
+        for tid in self.threads.pop(pid):
+            self.sets[self.tasks[tid].cpuset].tasks.discard(tid)
+            del self.tasks[tid]
+
+    def hotplug(self, cpu, online):
+        """take cpu offline or bring it online like cgroup v1 does: an
+           offline cpu is removed from all sets, the tasks of sets left
+           without cpus move to the nearest parent with cpus; a cpu that
+           comes online is only added to the root set"""
+        if online:
+            self.online = self.online | frozenset([cpu])
+            self.sets['/'].cpus = self.sets['/'].cpus | frozenset([cpu])
+            return
+        self.online = self.online - frozenset([cpu])
+        for setpath in sorted(self.sets, reverse=True):
+            cs = self.sets[setpath]
+            cs.cpus = cs.cpus - frozenset([cpu])
+            if len(cs.cpus) == 0 and setpath != '/':
+                parent = setpath
+                while len(self.sets[parent].cpus) == 0:
+                    parent = parent.rsplit('/', 1)[0] or '/'
+                for tid in cs.tasks:
+                    self.tasks[tid].cpuset = parent
+                self.sets[parent].tasks |= cs.tasks
+                cs.tasks = set()
+
+    def task(self, pid):
+        try:
+            return self.tasks[int(pid)]
+        except (KeyError, ValueError):
+            raise oserror(errno.ENOENT, '/proc/%s' % pid)
+
+    def allowed(self, task):
+        if task.bound != None:
+            return frozenset([task.bound])
+        return self.sets[task.cpuset].cpus
+
+    # path handling
+
+    def locate(self, path):
+        """return (set path, file name or None) for a path in the
+           hierarchy, raise ENOENT if there is no such set or file"""
+        if path != self.root and not path.startswith(self.root + '/'):
+            raise oserror(errno.ENOENT, path)
+        rel = path[len(self.root):].rstrip('/') or '/'
+        if rel in self.sets:
+            return rel, None
+        parent, name = rel.rsplit('/', 1)
+        parent = parent or '/'
+        if parent in self.sets:
+            if name == 'tasks':
+                return parent, name
+            if name.startswith(self.prefix) and name[len(self.prefix):] in self.files:
+                return parent, name[len(self.prefix):]
+        raise oserror(errno.ENOENT, path)
+
+    def children(self, setpath):
+        return sorted(self.sets[setpath].subsets)
+
+    def setpath(self, parent, name):
+        return (parent.rstrip('/') + '/' + name) if parent != '/' else '/' + name
+
+    def proc(self, path):
+        """return (task, file) for a path under /proc"""
+        parts = path.split('/')[2:]
+        if len(parts) > 3 and parts[1] == 'task':
+            # the files of a thread, /proc/<pid>/task/<tid>/<file>
+            return self.task(parts[2]), '/'.join(parts[3:])
+        return self.task(parts[0]), '/'.join(parts[1:])
+
+    # Backend
+
+    def read(self, path):
+        counted(path)
+        if path == '/proc/mounts':
+            return 'cgroup %s cgroup rw,cpuset 0 0\n' % self.root
+        if path == '/proc/stat':
+            total = [sum(t) for t in zip(*self.cputimes)]
+            lines = ['cpu  ' + ' '.join([str(t) for t in total])]
+            for cpu, times in enumerate(self.cputimes):
+                lines.append('cpu%d ' % cpu + ' '.join([str(t) for t in times]))
+            running = len([t for t in self.tasks.values() if t.state == 'R'])
+            lines.append('procs_running %d' % running)
+            return '\n'.join(lines) + '\n'
+        if path == '/sys/devices/system/cpu/online':
+            return spec(self.online) + '\n'
+        if path.startswith('/proc/'):
+            task, name = self.proc(path)
+            return self.procfile(task, name)
+        setpath, name = self.locate(path)
+        if name == None:
+            raise oserror(errno.EISDIR, path)
+        cs = self.sets[setpath]
+        if name == 'tasks':
+            return ''.join(['%s\n' % t for t in sorted(cs.tasks)])
+        val = getattr(cs, name)
+        if isinstance(val, bool):
+            return '1\n' if val else '0\n'
+        return spec(val) + '\n'
+
+    def read_tasks(self, path):
+        setpath, name = self.locate(path)
+        if name != 'tasks':
+            return Backend.read_tasks(self, path)
+        return array('i', sorted(self.sets[setpath].tasks))
+
+    def procfile(self, task, name):
+        if name == 'status':
+            mask = '%x' % sum([1 << c for c in self.allowed(task)])
+            return ('Name:\t%s\nState:\tS (sleeping)\nTgid:\t%s\nPid:\t%s\n'
+                    'PPid:\t%s\nUid:\t%s\t%s\t%s\t%s\nGid:\t0\t0\t0\t0\n'
+                    'Threads:\t%s\nCpus_allowed:\t%s\nCpus_allowed_list:\t%s\n' %
+                    (task.comm, task.tgid, task.pid, task.ppid, task.uid, task.uid,
+                     task.uid, task.uid, self.nthreads(task), mask,
+                     spec(self.allowed(task))))
+        if name == 'stat':
+            fields = ['0'] * 52
+            fields[0] = str(task.pid)
+            fields[1] = '(%s)' % task.comm
+            fields[2] = task.state
+            fields[3] = str(task.ppid)
+            fields[4] = fields[5] = str(task.tgid)
+            fields[8] = str(0x00200000 if task.exe == None else 0)   # PF_KTHREAD
+            fields[13] = str(task.utime)
+            fields[14] = str(task.stime)
+            fields[17] = '20'
+            fields[19] = str(self.nthreads(task))
+            fields[38] = str(task.processor if task.processor != None
+                             else min(self.allowed(task)))
+            return ' '.join(fields) + '\n'
+        if name == 'cmdline':
+            return task.exe + '\0' if task.exe else ''
+        if name == 'cpuset':
+            return task.cpuset + '\n'
+        if name == 'comm':
+            return task.comm + '\n'
+        raise oserror(errno.ENOENT, '/proc/%s/%s' % (task.pid, name))
+
+    def nthreads(self, task):
+        return len(self.threads[task.tgid])
+
+    def write(self, path, data):
+        setpath, name = self.locate(path)
+        if name == None:
+            raise oserror(errno.EISDIR, path)
+        if name == 'tasks':
+            self.attach(setpath, data)
+        elif name in ('cpus', 'mems'):
+            self.setmask(setpath, name, ints(str(data)))
+        else:
+            self.setflag(setpath, name, str(data).strip() not in ('0', ''))
+
+    def setmask(self, setpath, name, new):
+        cs = self.sets[setpath]
+        flag = 'cpu_exclusive' if name == 'cpus' else 'mem_exclusive'
+        if setpath == '/':
+            raise oserror(errno.EACCES, setpath)
+        parent = self.sets[setpath.rsplit('/', 1)[0] or '/']
+        if not new <= getattr(parent, name):
+            raise oserror(errno.EACCES, setpath)
+        for child in self.children(setpath):
+            if not getattr(self.sets[self.setpath(setpath, child)], name) <= new:
+                raise oserror(errno.EBUSY, setpath)
+        self.check_siblings(setpath, name, new, getattr(cs, flag))
+        if len(cs.tasks) and len(new) == 0:
+            raise oserror(errno.ENOSPC, setpath)
+        setattr(cs, name, new)
+
+    def check_siblings(self, setpath, name, val, exclusive):
+        flag = 'cpu_exclusive' if name == 'cpus' else 'mem_exclusive'
+        parent = setpath.rsplit('/', 1)[0] or '/'
+        for sib in self.children(parent):
+            sibpath = self.setpath(parent, sib)
+            if sibpath == setpath: continue
+            other = self.sets[sibpath]
+            if (exclusive or getattr(other, flag)) and val & getattr(other, name):
+                raise oserror(errno.EINVAL, setpath)
+
+    def setflag(self, setpath, name, val):
+        cs = self.sets[setpath]
+        if val:
+            prop = 'cpus' if name == 'cpu_exclusive' else 'mems'
+            self.check_siblings(setpath, prop, getattr(cs, prop), True)
+        setattr(cs, name, val)
+
+    def attach(self, setpath, pid):
+        try:
+            task = self.tasks[int(str(pid).strip())]
+        except (KeyError, ValueError):
+            raise oserror(errno.ESRCH, str(pid))
+        cs = self.sets[setpath]
+        if len(cs.cpus) == 0 or len(cs.mems) == 0:
+            raise oserror(errno.ENOSPC, setpath)
+        if task.bound != None:
+            # per-cpu kernel threads may not change their affinity
+            raise oserror(errno.EINVAL, str(pid))
+        self.sets[task.cpuset].tasks.discard(task.pid)
+        cs.tasks.add(task.pid)
+        task.cpuset = setpath
+
+    def exists(self, path):
+        counted(path)
+        if path in ('/proc', '/proc/mounts', '/proc/stat',
+                    '/sys/devices/system/cpu/online'):
+            return True
+        if path.startswith('/proc/'):
+            try:
+                task, name = self.proc(path)
+            except OSError:
+                return False
+            return name in ('', 'status', 'stat', 'cmdline', 'cpuset', 'comm',
+                            'task', 'exe')
+        try:
+            self.locate(path)
+            return True
+        except OSError:
+            return False
+
+    def listdir(self, path):
+        if path == '/proc':
+            return self.pids()
+        counted(path)
+        if path.startswith('/proc/'):
+            task, name = self.proc(path.rstrip('/'))
+            if name == 'task':
+                return [str(t) for t in self.threads[task.tgid]]
+            raise oserror(errno.ENOTDIR, path)
+        setpath, name = self.locate(path)
+        if name != None:
+            raise oserror(errno.ENOTDIR, path)
+        return (self.children(setpath) + ['tasks'] +
+                [self.prefix + f for f in self.files])
+
+    def walk(self, top, topdown=True):
+        setpath, name = self.locate(top)
+        files = ['tasks'] + [self.prefix + f for f in self.files]
+        dirs = self.children(setpath)
+        top = top.rstrip('/')
+        if topdown:
+            yield top, dirs, files
+        for d in dirs:
+            for res in self.walk(top + '/' + d, topdown):
+                yield res
+        if not topdown:
+            yield top, dirs, files
+
+    def mkdir(self, path):
+        try:
+            self.locate(path)
+            raise oserror(errno.EEXIST, path)
+        except OSError as err:
+            if err.errno != errno.ENOENT: raise
+        parent, name = path.rstrip('/').rsplit('/', 1)
+        setpath, pname = self.locate(parent)
+        if pname != None:
+            raise oserror(errno.ENOTDIR, path)
+        self.sets[self.setpath(setpath, name)] = SimSet()
+        self.sets[setpath].subsets.add(name)
+
+    def rmdir(self, path):
+        setpath, name = self.locate(path)
+        if name != None:
+            raise oserror(errno.ENOTDIR, path)
+        if setpath == '/':
+            raise oserror(errno.EBUSY, path)
+        if len(self.sets[setpath].tasks) or len(self.sets[setpath].subsets):
+            raise oserror(errno.EBUSY, path)
+        del self.sets[setpath]
+        parent, name = setpath.rsplit('/', 1)
+        self.sets[parent or '/'].subsets.discard(name)
+
+    def rename(self, old, new):
+        setpath, name = self.locate(old)
+        if name != None or setpath == '/':
+            raise oserror(errno.EINVAL, old)
+        parent, newname = new.rstrip('/').rsplit('/', 1)
+        if self.locate(parent)[0] != (setpath.rsplit('/', 1)[0] or '/'):
+            # cgroups can only be renamed within their parent
+            raise oserror(errno.EIO, new)
+        if self.exists(new):
+            raise oserror(errno.EEXIST, new)
+        newpath = self.setpath(self.locate(parent)[0], newname)
+        subsets = self.sets[self.locate(parent)[0]].subsets
+        subsets.discard(setpath.rsplit('/', 1)[1])
+        subsets.add(newname)
+        for p in sorted(self.sets):
+            if p == setpath or p.startswith(setpath + '/'):
+                moved = newpath + p[len(setpath):]
+                self.sets[moved] = self.sets.pop(p)
+                for pid in self.sets[moved].tasks:
+                    self.tasks[pid].cpuset = moved
+
+    def readlink(self, path):
+        task, name = self.proc(path)
+        if name != 'exe' or task.exe == None:
+            raise oserror(errno.ENOENT, path)
+        return task.exe
+
+    def open_tasks(self, path):
+        setpath, name = self.locate(path)
+        if name != 'tasks':
+            raise oserror(errno.EINVAL, path)
+        return SimTasksFile(self, setpath)
+
+    def pids(self):
+        counted('/proc')
+        return [str(pid) for pid in sorted(self.threads)]
+
+    def mount(self, mountpoint):
+        raise oserror(errno.EPERM, mountpoint)
+
+class SimTasksFile(object):
+    def __init__(self, sim, setpath):
+        self.sim = sim
+        self.setpath = setpath
+    def write(self, task):
+        self.sim.attach(self.setpath, task)
+    def close(self):
+        pass
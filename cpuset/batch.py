@@ -0,0 +1,158 @@
+"""Launch many commands into cpusets from one process
+
+A job file has one job per line, the cpuset and the command
+separated by a tab.  The command is split into arguments like a
+shell would, but is not run by a shell.  Every cpuset is resolved
+once, then each job is forked, the child joins its cpuset with one
+write of its pid and executes the command.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, sys, time, shlex, logging
+
+from cpuset import cset
+from cpuset import output
+from cpuset.util import *
+
+log = logging.getLogger('batch')
+
+class Job(object):
+    """one line of a job file"""
+    def __init__(self, line, set, args):
+        self.line = line
+        self.set = set
+        self.args = args
+        self.path = None
+        self.pid = None
+        self.start = None
+        self.wall = None
+        self.status = None
+
+    def record(self):
+        return {'type': 'job', 'line': self.line, 'set': self.path,
+                'command': self.args, 'pid': self.pid, 'status': self.status,
+                'wall': round(self.wall, 6)}
+
+    def describe(self):
+        if self.status < 0:
+            return 'killed by signal %d' % -self.status
+        return 'exit %d' % self.status
+
+def read_jobs(f):
+    """return the Jobs of a job file, blank lines and lines starting
+       with # are skipped"""
+    jobs = []
+    for nr, line in enumerate(f, 1):
+        line = line.rstrip('\n')
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if line.find('\t') == -1:
+            raise CpusetException('job file line %d: no tab between cpuset '
+                                  'and command' % nr)
+        set, command = line.split('\t', 1)
+        try:
+            args = shlex.split(command)
+        except ValueError as err:
+            raise CpusetException('job file line %d: %s' % (nr, err))
+        if not set.strip() or not args:
+            raise CpusetException('job file line %d: cpuset or command missing'
+                                  % nr)
+        jobs.append(Job(nr, set.strip(), args))
+    return jobs
+
+def resolve(jobs):
+    """set the path of the cpuset of every job, looking each set up once;
+       sets given by path do not need the cpusets to be discovered"""
+    from cpuset.commands import set
+    paths = {}
+    for job in jobs:
+        if job.set not in paths:
+            s = cset.unique_set(job.set)
+            set.active(s)
+            paths[job.set] = s.path
+        job.path = paths[job.set]
+
+class Batch(object):
+    """runs jobs with at most limit of them at a time"""
+    def __init__(self, jobs, limit, switch=None):
+        self.jobs = jobs
+        self.limit = limit
+        self.switch = switch    # called in the child to change user
+        self.running = {}       # pid -> Job
+        self.done = []
+
+    def join(self, path):
+        cset.join(path)
+
+    def spawn(self, job):
+        job.start = time.time()
+        pid = os.fork()
+        if pid == 0:
+            # the child: nothing but the join and the exec, no return
+            try:
+                try:
+                    self.join(job.path)
+                    if self.switch: self.switch()
+                    os.execvp(job.args[0], job.args)
+                except CpusetException as err:
+                    sys.stderr.write('cset: job %d: %s\n' % (job.line, err))
+                    os._exit(126)
+                except OSError as err:
+                    sys.stderr.write('cset: job %d: %s: %s\n' %
+                                     (job.line, job.args[0], err.strerror))
+                    os._exit(127)
+            finally:
+                os._exit(126)
+        job.pid = pid
+        self.running[pid] = job
+
+    def reap(self):
+        """wait for one job to finish"""
+        pid, status = os.waitpid(-1, 0)
+        job = self.running.pop(pid, None)
+        if job == None:
+            return
+        job.wall = time.time() - job.start
+        if os.WIFSIGNALED(status):
+            job.status = -os.WTERMSIG(status)
+        else:
+            job.status = os.WEXITSTATUS(status)
+        self.done.append(job)
+        if output.structured():
+            output.emit(job.record())
+        else:
+            log.info('%5d %6d %-22s %9.3fs %s', job.line, job.pid,
+                     job.describe(), job.wall, job.path)
+
+    def run(self):
+        """run all jobs, return the Jobs in the order they finished"""
+        pending = list(self.jobs)
+        pending.reverse()
+        if not output.structured():
+            log.info(' Line    PID Status                      Wall Cpuset')
+            log.info('----- ------ ---------------------- ---------- ------')
+        sys.stdout.flush()
+        sys.stderr.flush()
+        while pending or self.running:
+            while pending and len(self.running) < self.limit:
+                self.spawn(pending.pop())
+            self.reap()
+        return self.done
@@ -0,0 +1,122 @@
+"""Declarative layout command
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, os, logging
+from optparse import OptionParser, make_option
+
+from cpuset import config
+from cpuset import cset
+from cpuset import layout
+from cpuset import output
+from cpuset.util import *
+from cpuset.commands.common import *
+
+global log
+log = logging.getLogger('apply')
+
+help = 'bring cpusets and task placement to a described layout'
+usage = """%prog [options] LAYOUT
+
+This command reads a layout file that describes the desired
+cpusets and where tasks should run, compares it with the current
+state of the system and carries out the smallest set of changes
+needed to get there.  Applying a layout that is already in place
+does not write anything.
+
+The layout is an ini style file.  Sections named "set PATH"
+describe cpusets with the keys cpus, mems, cpu_exclusive,
+mem_exclusive and absent; keys that are left out are not
+changed on existing sets.  Sections named "rule NAME" place
+tasks, they take the same keys as the rules of "cset proc
+--watch" and the first matching rule wins.
+
+For example, the following layout sets up a basic shield on a
+4-way machine:
+
+    [set /system]
+    cpus = 0
+    mems = 0
+    cpu_exclusive = yes
+
+    [set /user]
+    cpus = 1-3
+    mems = 0
+    cpu_exclusive = yes
+
+    [set /scratch]
+    absent = yes
+
+    [rule everything-else]
+    set = /system
+    from = root
+
+A set marked absent is destroyed along with its subsets, its
+tasks are moved to the nearest surviving parent.  The layout may
+also be given as a JSON object:
+
+    {"sets": {"/user": {"cpus": "1-3", "cpu_exclusive": true}},
+     "rules": [{"name": "rest", "set": "/system", "from": "root"}]}
+
+Use --dry-run to see the planned operations without carrying
+them out."""
+
+verbose = 0
+options = [make_option('-n', '--dry-run',
+                       help = 'only print the operations that would be done',
+                       dest = 'dryrun',
+                       action = 'store_true'),
+           make_option('-v', '--verbose',
+                       help = 'prints more detailed output, additive',
+                       action = 'count'),
+          ]
+
+def lock_scope(options, args):
+    """(exclusive, cpusets) to lock for cpuset.lock: a layout may
+       change any set and move tasks of any set"""
+    return not options.dryrun, ['/']
+
+def func(parser, options, args):
+    log.debug("entering func, options=%s, args=%s", options, args)
+    global verbose
+    if options.verbose: verbose = options.verbose
+    if len(args) != 1:
+        raise CpusetException('specify exactly one layout file')
+
+    lay = layout.read_layout(args[0])
+    cset.rescan()
+    ops = layout.plan(lay, layout.State())
+    if len(ops) == 0:
+        log.info('--> layout already in place, nothing to do')
+        return
+    if options.dryrun or verbose:
+        if output.structured():
+            for op in ops:
+                output.emit(layout.op_record(op))
+        elif config.mread:
+            log.info('\n'.join(['apply_op;' + layout.describe(op) for op in ops]))
+        else:
+            log.info('\n'.join(['   ' + layout.describe(op) for op in ops]))
+    if options.dryrun:
+        return
+    log.info('--> applying %s operations from "%s"', len(ops), args[0])
+    layout.execute(ops)
+    log.info('done')
@@ -0,0 +1,231 @@
+"""Resident cpuset daemon command
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, os, io, json, socket, struct, signal, logging
+from optparse import OptionParser, make_option
+
+from cpuset import config
+from cpuset import cset
+from cpuset.util import *
+from cpuset.commands.common import *
+
+global log
+log = logging.getLogger('daemon')
+
+help = 'keep the cpuset model resident and serve requests'
+usage = """%prog [options]
+
+This command starts a long-running cset daemon that discovers the
+cpuset hierarchy once and then serves set, proc and shield
+requests over a local Unix socket.  Changes made to the cpuset
+filesystem by other tools are noticed by watching the cpuset
+directories, so the model is only re-read when it actually
+changed.
+
+While the daemon is running, regular cset invocations forward
+their command to it instead of discovering the hierarchy
+themselves.  Commands that execute programs (--exec, --batch) or
+keep running (--watch, --guard, --top) always run locally.  Set the CSET_NO_DAEMON
+environment variable to bypass the daemon.
+
+The socket only accepts connections from root or the user the
+daemon runs as.  Each request is a single line JSON object of the
+form {"argv": ["proc", "-m", "1234", "user"], "mread": false}
+answered by a single line {"status": 0, "output": "..."}.
+
+For example:
+    # cset daemon &
+    # cset proc --move 1234 user
+        The second command is executed by the daemon.
+
+The socket path defaults to /run/cset.sock and can be changed
+with the daemon_socket configuration option or --socket."""
+
+options = [make_option('--socket',
+                       metavar = 'PATH',
+                       help = 'listen on PATH instead of the configured socket'),
+          ]
+
+def func(parser, options, args):
+    log.debug("entering func, options=%s, args=%s", options, args)
+    path = options.socket or config.daemon_socket
+    if not path:
+        raise CpusetException('no daemon socket configured')
+    serve(path)
+
+def forwardable(cmd, options, args):
+    """return True if the command can be run by the daemon"""
+    if (getattr(options, 'exc', False) or getattr(options, 'watch', False) or
+        getattr(options, 'guard', False) or getattr(options, 'top', False) or
+        getattr(options, 'batch', None)):
+        return False
+    if (cmd == 'shield' and len(args) > 0 and not options.cpu and
+        not options.reset and not options.shield and not options.unshield and
+        not options.kthread):
+        # the argument may turn out to be a program to execute
+        return False
+    return True
+
+def forward(cmd, argv):
+    """send command to a running daemon, return its exit status
+
+    None is returned if the command has to be run locally.
+    """
+    if 'CSET_NO_DAEMON' in os.environ or not config.daemon_socket:
+        return None
+    if not os.path.exists(config.daemon_socket):
+        return None
+    from cpuset.main import commands
+    command = commands[cmd]
+    parser = OptionParser(option_list = command.options)
+    options, args = parser.parse_args(list(argv))
+    if not forwardable(cmd, options, args):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(config.daemon_socket)
+    except OSError as err:
+        log.debug('daemon not reachable at %s: %s', config.daemon_socket, err)
+        sock.close()
+        return None
+    log.debug('forwarding "%s" to daemon', ' '.join(argv))
+    try:
+        req = {'argv': [cmd] + list(argv), 'mread': config.mread}
+        sock.sendall((json.dumps(req) + '\n').encode())
+        line = sock.makefile('rb').readline()
+    except OSError as err:
+        log.debug('daemon at %s failed: %s', config.daemon_socket, err)
+        return None
+    finally:
+        sock.close()
+    try:
+        resp = json.loads(line.decode())
+        status, output = resp['status'], resp['output']
+    except (ValueError, KeyError, TypeError):
+        # the daemon rejected us or its child died, no reply to be had
+        log.debug('no reply from daemon at %s, running locally',
+                  config.daemon_socket)
+        return None
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    return status
+
+def serve(path):
+    """serve requests on unix socket path until terminated"""
+    log.debug('entering serve, path=%s', path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(path):
+        try:
+            sock.connect(path)
+        except OSError:
+            log.debug('removing stale socket %s', path)
+            os.unlink(path)
+        else:
+            sock.close()
+            raise CpusetException('cset daemon already running on %s' % path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    cset.watcher = cset.HierarchyWatcher()
+    cset.rescan(force=True)
+    umask = os.umask(0o077)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    sock.listen(16)
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    log.info('--> serving %s cpusets on %s', len(cset.CpuSet.sets), path)
+    try:
+        while True:
+            conn, addr = sock.accept()
+            try:
+                handle(sock, conn)
+            except Exception as err:
+                log.debug('request failed: %s', err)
+            finally:
+                conn.close()
+    finally:
+        sock.close()
+        os.unlink(path)
+        log.info('done')
+
+def handle(sock, conn):
+    """run one request in a child so command state never leaks"""
+    cred = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET,
+                                               socket.SO_PEERCRED,
+                                               struct.calcsize('3i')))
+    if cred[1] != 0 and cred[1] != os.getuid():
+        log.debug('rejecting request from uid %s', cred[1])
+        return
+    req = json.loads(conn.makefile('rb').readline().decode())
+    if cset.watcher.drain():
+        log.debug('cpuset hierarchy changed, rescanning')
+        cset.rescan(force=True)
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            sock.close()
+            status, output = execute(req)
+            resp = {'status': status, 'output': output}
+            conn.sendall((json.dumps(resp) + '\n').encode())
+        finally:
+            os._exit(status)
+    os.waitpid(pid, 0)
+
+def execute(req):
+    """run request in the current process, return (status, output)"""
+    from cpuset import main
+    out = io.StringIO()
+    sys.stdout = out
+    main.console.setStream(out)
+    config.mread = bool(req.get('mread'))
+    # tasks come and go between requests, classify them anew
+    from cpuset import procfs
+    procfs.classifier.forget()
+    argv = list(req['argv'])
+    status = 0
+    try:
+        cmd = main.commands.canonical_cmd(argv[0])
+        log.debug('executing request: %s', argv)
+        command = main.commands[cmd]
+        parser = OptionParser(option_list = command.options)
+        options, args = parser.parse_args(argv[1:])
+        if cmd == 'daemon' or not forwardable(cmd, options, args):
+            log.critical('**> "%s" cannot be run by the daemon' % ' '.join(argv))
+            status = 2
+        else:
+            sys.argv = [main.prog + ' ' + cmd] + argv[1:]
+            main.run_command(cmd)
+    except SystemExit as err:
+        if err.code == None:
+            status = 0
+        elif isinstance(err.code, int):
+            status = err.code
+        else:
+            out.write('%s\n' % err.code)
+            status = 1
+    except Exception as err:
+        log.critical('**> ' + str(err))
+        status = 2
+    return status, out.getvalue()
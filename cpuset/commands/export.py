@@ -0,0 +1,201 @@
+"""Export command
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, os, time, logging
+from optparse import OptionParser, make_option
+
+from cpuset import cset
+from cpuset import lock
+from cpuset import procfs
+from cpuset.util import *
+from cpuset.commands.common import *
+
+global log
+log = logging.getLogger('export')
+
+help = 'write cpuset metrics for monitoring systems'
+usage = """%prog [options] --prometheus PATH
+
+This command writes the state and usage of all cpusets as metrics
+in the Prometheus text format to PATH, for the textfile collector
+of node_exporter.  The file is replaced atomically, so a scrape
+never sees a partial file.  With --interval the metrics are
+rewritten every S seconds until interrupted, otherwise once.
+
+The metrics are, labelled with the path of the set:
+
+    cset_cpus, cset_mems            number of cpus and memory nodes
+    cset_cpu_exclusive              1 if the set owns its cpus
+    cset_mem_exclusive              1 if the set owns its memory nodes
+    cset_tasks                      number of tasks in the set
+    cset_tasks_cpu_seconds          user and system cpu time of the
+                                    tasks now in the set (mode label)
+
+and for the shield (see "cset shield"):
+
+    cset_shield_active              1 if the shield is set up
+    cset_shield_cpus                cpus of the system and user sets
+    cset_shield_kthreads            kernel threads in the root set
+                                    that last ran on a shielded cpu,
+                                    by whether they are bound to it
+
+Each run walks the hierarchy and the task lists once and reads the
+stat file of every task once; the hierarchy itself is only
+rediscovered when sets were created, removed or renamed.
+
+For example:
+    # cset export --prometheus /var/lib/node_exporter/cset.prom --interval 15"""
+
+options = [make_option('--prometheus',
+                       help = 'write metrics in Prometheus text format to PATH',
+                       metavar = 'PATH'),
+           make_option('--interval',
+                       help = 'rewrite the metrics every S seconds',
+                       type = 'float',
+                       metavar = 'S'),
+          ]
+
+def func(parser, options, args):
+    log.debug("entering func, options=%s, args=%s", options, args)
+    if not options.prometheus:
+        raise CpusetException('specify where to write with --prometheus PATH')
+    if options.interval != None and options.interval <= 0:
+        raise CpusetException('--interval must be greater than zero')
+    # only rediscover the hierarchy when it changes
+    cset.watcher = cset.HierarchyWatcher()
+    exporter = Exporter()
+    try:
+        while True:
+            start = time.time()
+            # each scrape is a listing, it takes the shared lock
+            with lock.shared('/'):
+                text = exporter.collect()
+            write_atomic(options.prometheus, text)
+            log.debug('metrics written in %.3fs', time.time() - start)
+            if options.interval == None:
+                break
+            time.sleep(max(0, options.interval - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass
+
+def write_atomic(path, text):
+    """replace the file at path with text, readers see the old or the
+       new file, never a part of one"""
+    tmp = '%s.%s.tmp' % (path, os.getpid())
+    f = open(tmp, 'w')
+    try:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    os.rename(tmp, path)
+
+def escape(val):
+    return str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics(object):
+    """lines of the Prometheus text format, grouped by metric"""
+    def __init__(self):
+        self.order = []
+        self.help = {}
+        self.samples = {}
+
+    def add(self, name, help, labels, value):
+        if name not in self.help:
+            self.order.append(name)
+            self.help[name] = help
+            self.samples[name] = []
+        lab = ','.join(['%s="%s"' % (k, escape(v)) for k, v in labels])
+        self.samples[name].append('%s{%s} %s' % (name, lab, value) if lab
+                                  else '%s %s' % (name, value))
+
+    def text(self):
+        l = []
+        for name in self.order:
+            l.append('# HELP %s %s' % (name, self.help[name]))
+            l.append('# TYPE %s gauge' % name)
+            l.extend(self.samples[name])
+        return '\n'.join(l) + '\n'
+
+class Exporter(object):
+    """collects the metrics of the sets of the cset model"""
+    def __init__(self, hz=None):
+        self.hz = float(hz or os.sysconf('SC_CLK_TCK'))
+
+    def collect(self):
+        """return the metrics text of one scrape"""
+        from cpuset.commands import shield
+        start = time.time()
+        cset.rescan()
+        sets = [cset.RootSet] + list(cset.walk_set(cset.RootSet))
+        tasks = {}
+        for s in sets:
+            tasks[s.path] = s.task_ids
+        stat = {}
+        for st in procfs.task_stats([t for s in sets for t in tasks[s.path]]):
+            stat[st.tid] = st
+        m = Metrics()
+        for s in sets:
+            lab = [('set', s.path)]
+            cpus = cset.cpuspec_to_ints(s.cpus)
+            m.add('cset_cpus', 'Number of cpus of the cpuset.', lab, len(cpus))
+            m.add('cset_mems', 'Number of memory nodes of the cpuset.', lab,
+                  len(cset.cpuspec_to_ints(s.mems)))
+            m.add('cset_cpu_exclusive', 'Whether the cpuset owns its cpus.', lab,
+                  int(s.cpu_exclusive))
+            m.add('cset_mem_exclusive', 'Whether the cpuset owns its memory nodes.',
+                  lab, int(s.mem_exclusive))
+            m.add('cset_tasks', 'Number of tasks in the cpuset.', lab,
+                  len(tasks[s.path]))
+            sts = [stat[t] for t in tasks[s.path] if t in stat]
+            for mode, ticks in (('user', sum([st.utime for st in sts])),
+                                ('system', sum([st.stime for st in sts]))):
+                m.add('cset_tasks_cpu_seconds',
+                      'Cpu time used by the tasks now in the cpuset.',
+                      lab + [('mode', mode)], '%.2f' % (ticks / self.hz))
+        paths = [s.path for s in sets]
+        active = shield.SYS_SET in paths and shield.USR_SET in paths
+        m.add('cset_shield_active', 'Whether the shield is set up.', [], int(active))
+        if active:
+            shielded = cset.cpuspec_to_ints(cset.CpuSet.sets[shield.USR_SET].cpus)
+            for role, path in (('system', shield.SYS_SET), ('user', shield.USR_SET)):
+                m.add('cset_shield_cpus', 'Number of cpus of the shield sets.',
+                      [('role', role), ('set', path)],
+                      len(cset.cpuspec_to_ints(cset.CpuSet.sets[path].cpus)))
+            bound = unbound = 0
+            for t in tasks['/']:
+                st = stat.get(t)
+                if (st == None or not st.flags & procfs.PF_KTHREAD or
+                    st.processor not in shielded):
+                    continue
+                if len(procfs.cpus_allowed(t) or ()) == 1: bound += 1
+                else: unbound += 1
+            for b, n in (('1', bound), ('0', unbound)):
+                m.add('cset_shield_kthreads',
+                      'Kernel threads in the root cpuset that last ran on a '
+                      'shielded cpu.', [('bound', b)], n)
+        m.add('cset_scrape_duration_seconds', 'Time taken to collect the metrics.',
+              [], '%.6f' % (time.time() - start))
+        m.add('cset_scrape_timestamp_seconds', 'When the metrics were collected.',
+              [], '%.3f' % start)
+        return m.text()
@@ -20,18 +20,17 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
-import sys, os, io, re, logging, pwd, grp
+import sys, os, re, time, errno, contextlib, logging
 from optparse import OptionParser, make_option
 
 from cpuset import config
 from cpuset import cset
+from cpuset import output
+from cpuset import trace
+from cpuset import stats
+from cpuset import procfs
 from cpuset.util import *
 from cpuset.commands.common import *
-try: from cpuset.commands import set 
-except SyntaxError:
-    raise
-except: 
-    pass
 
 global log
 log = logging.getLogger('proc')
@@ -70,6 +69,31 @@ For example:
         This command will execute "ls -l" on the cpuset called
         "myset".
 
+If the cpuset is given by its path, such as /myset or /rt/job1,
+cset joins it directly without discovering the other cpusets and
+executes the command right away.  Use this form to launch many
+short-lived commands.
+
+Many commands are launched into cpusets from one cset process
+with --batch and a job file.  Each line of the job file gives a
+cpuset and a command separated by a tab; blank lines and lines
+starting with # are skipped.  The command is split into arguments
+like a shell does, but is not run by a shell, use sh -c for pipes
+and redirections.  Every cpuset is looked up once, then each job
+is forked, joins its cpuset and executes its command.  At most
+--jobs commands run at the same time, by default as many as there
+are cpus.  The exit status and wall time of each job are reported
+as it finishes, and cset fails if any job failed.
+
+For example, with a file jobs holding:
+
+    /batch/a<TAB>./simulate --seed 1
+    /batch/b<TAB>./simulate --seed 2
+    system<TAB>sh -c "gzip -9 results-*.dat"
+
+    # cset proc --batch jobs --jobs 2
+        This command will run the three jobs, two at a time.
+
 The PIDSPEC argument taken for the move command is a comma
 separated list of PIDs or TIDs.  The list can also include
 brackets of PIDs or TIDs (i.e. tasks) that are inclusive of the
@@ -78,6 +102,7 @@ endpoints.
 For example:
     1,2,5               Means processes 1, 2 and 5
     1,2,600-700         Means processes 1, 2 and from 600 to 700
+    1000-               Means processes from 1000 up
 
 Note that the range of PIDs or TIDs does not need to have every
 position populated.  In other words, for the example above, if
@@ -113,6 +138,16 @@ are specified in the PIDSPEC and move them.  This provides an easy
 way to move all related threads: just pick one TID from the set
 and use the --threads option.
 
+Threads that a process starts while it is being moved may start
+in the old cpuset.  With --threads the threads of the moved
+processes are therefore listed again after the move, and new ones
+moved, until no more show up (at most thread_rounds times, see
+the configuration file in cset(1)).  A process that starts threads
+all the time can be frozen for the move with --freeze, which
+implies --threads.  The cgroup v1 freezer only freezes the moved
+processes; with cgroup v2, cgroup.freeze freezes the whole cgroup
+of each process.
+
 To move all userspace tasks from one cpuset to another, you need
 to specify the source and destination cpuset by name.
 
@@ -151,6 +186,32 @@ Then, to move a process from myset in group1 to yourset in
 group2, you would have to issue the following command:
     # cset proc --move --pid=50 --fromset=/group1/myset \\
             --toset=/group2/yourset
+
+The --watch option keeps running and places tasks into cpusets
+according to the rules read from the file given with --rules.
+Existing tasks are placed first, then every new process is
+matched as it is created (or as it executes a new program).  The
+rules file holds one section per rule, the first matching rule
+wins:
+
+    [stray-root-tasks]
+    set = system
+    from = root
+
+    [batch-jobs]
+    set = /batch
+    exe = /opt/batch/bin/*
+    uid = jobs
+
+    [kernel-threads]
+    set = system
+    kthread = yes
+
+Tasks can be matched by comm, exe, uid, parent (the comm or PID
+of the parent task) and from (the cpuset the task currently runs
+in); patterns use shell-style wildcards.  Rules only match
+userspace tasks unless kthread = yes is given, in which case they
+only match unbound kernel threads.
 """
 
 verbose = 0
@@ -181,6 +242,10 @@ options = [make_option('-l', '--list',
                               'added to the PIDSPEC; use to move all related threads to a '
                               'cpuset',
                        action = 'store_true'),
+           make_option('--freeze',
+                       help = 'freeze the processes while they are moved, so no '
+                              'threads are started meanwhile; implies --threads',
+                       action = 'store_true'),
            make_option('-s', '--set',
                        metavar = 'CPUSET',
                        help = 'specify name of immediate cpuset'),
@@ -194,18 +259,69 @@ options = [make_option('-l', '--list',
            make_option('--force',
                        help = 'force all processes and threads to be moved',
                        action = 'store_true'),
+           make_option('--batch',
+                       metavar = 'JOBFILE',
+                       help = 'run the commands of JOBFILE, one "cpuset<TAB>command" '
+                              'per line, in their cpusets; - reads stdin'),
+           make_option('-j', '--jobs',
+                       type = 'int',
+                       metavar = 'N',
+                       help = 'run at most N --batch jobs at a time '
+                              '(default: number of cpus)'),
+           make_option('-w', '--watch',
+                       help = 'keep placing new tasks into cpusets according '
+                              'to the rules given with --rules',
+                       action = 'store_true'),
+           make_option('--rules',
+                       metavar = 'FILE',
+                       help = 'read task placement rules for --watch from FILE'),
            make_option('-v', '--verbose',
                        help = 'prints more detailed output, additive',
                        action = 'count')
           ]
 
+def lock_scope(options, args):
+    """(exclusive, cpusets) to lock for cpuset.lock, None not to lock"""
+    if options.exc or options.batch or options.watch:
+        # one write per task, or running until interrupted
+        return None
+    names = [n for n in (options.set, options.toset, options.fromset) if n]
+    names.extend([a for a in args if not re.match(r'^[0-9,-]*$', a)])
+    if options.move or options.kthread:
+        return True, names
+    return False, names or ['/']
+
 def func(parser, options, args):
     log.debug("entering func, options=%s, args=%s", options, args)
 
     global verbose
     if options.verbose: verbose = options.verbose
 
-    cset.rescan()
+    if options.exc and not options.list:
+        # a set given by path is joined without looking at any other
+        # cpuset, the fast path for launching many jobs
+        if options.set or options.toset:
+            target, cmd = options.set or options.toset, args
+        else:
+            target, cmd = (args[0] if args else None), args[1:]
+        if target and (target.find('/') != -1 or target == 'root'):
+            if len(cmd) == 0:
+                raise CpusetException('no program to execute')
+            run_path(target, cmd, options.user, options.group)
+
+    # sets given by path are looked up without discovering all cpusets
+    cset.locate()
+
+    if options.batch:
+        run_batch(options.batch, options.jobs, options.user, options.group)
+        return
+
+    if options.watch:
+        if not options.rules:
+            raise CpusetException('--watch needs a --rules file')
+        from cpuset import watch
+        watch.watch(watch.read_rules(options.rules))
+        return
 
     tset = None 
     if options.list or options.exc:
@@ -232,6 +348,8 @@ def func(parser, options, args):
         list_sets(tset)
         return
 
+    if options.freeze: options.threads = True
+
     if options.move or options.kthread:
         fset = None
         tset = None
@@ -267,6 +385,7 @@ def func(parser, options, args):
                     tset = cset.unique_set(args[1])
         else:
             raise CpusetException("destination cpuset not specified")
+        from cpuset.commands import set
         set.active(tset)
         # next, if there is a pidspec, move just that
         if options.pid:
@@ -277,7 +396,10 @@ def func(parser, options, args):
             pids = pidspec_to_list(options.pid, fset, options.threads)
             if len(pids):
                 log.info('moving following pidspec: %s' % ','.join(pids))
-                selective_move(None, tset, pids, options.kthread, options.force)
+                with freezing(pids, options.freeze):
+                    moved = selective_move(None, tset, pids, options.kthread,
+                                           options.force)
+                    if options.threads: follow_threads(tset, moved)
             else:
                 log.info('**> no tasks moved')
             log.info('done')
@@ -293,23 +415,21 @@ def func(parser, options, args):
                 fset = cset.unique_set(args[0])
             if fset == None:
                 raise CpusetException("origination cpuset not specified")
-            nt = len(fset.tasks)
+            nt = len(fset.task_ids)
             if nt == 0:
                 raise CpusetException('no tasks to move from cpuset "%s"' 
                                       % fset.path)
             if options.move:
                 log.info('moving all tasks from %s to %s', 
                          fset.name, tset.path)
-                selective_move(fset, tset, None, options.kthread, options.force,
-                               options.threads)
+                with freezing(fset.tasks, options.freeze):
+                    selective_move(fset, tset, None, options.kthread, options.force,
+                                   options.threads)
             else:
                 log.info('moving all kernel threads from %s to %s', 
                          fset.path, tset.path)
                 # this is a -k "move", so only move kernel threads
-                pids = []
-                for task in fset.tasks:
-                    try: os.readlink('/proc/'+task+'/exe')
-                    except: pids.append(task)
+                pids = procfs.classifier.kthreads(fset.tasks)
                 selective_move(fset, tset, pids, options.kthread, options.force)
             log.info('done')
         return
@@ -341,7 +461,7 @@ def list_sets(args):
     if len(l) == 0:
         raise CpusetException("cpuset(s) to list not specified");
     for s in l:
-        if len(s.tasks) > 0:
+        if len(s.task_ids) > 0:
             if verbose:
                 log_detailed_task_table(s, ' ')
             else:
@@ -395,7 +515,10 @@ def move(fromset, toset, plist=None, verb=None, force=None):
     # do the move...
     tset.tasks = plist
 
+@trace.traced('selective_move')
 def selective_move(fset, tset, plist=None, kthread=None, force=None, threads=None):
+    """move the tasks of fset or plist to tset, leaving out the ones
+       the options do not allow; return the tasks moved"""
     log.debug('entering selective_move, fset=%s tset=%s plist=%s kthread=%s force=%s',
               fset, tset, plist, kthread, force)
     task_check = []
@@ -415,33 +538,40 @@ def selective_move(fset, tset, plist=None, kthread=None, force=None, threads=Non
         if fset == target and not force:
             raise CpusetException(
                     "error, same source/destination cpuset, use --force if ok")
-        task_check = fset.tasks
+        ids = fset.task_ids
+        task_check = cset.task_array(ids)
     if plist:
         task_heap = plist
+    elif fset:
+        task_heap = [str(t) for t in ids]
     else:
-        task_heap = cset.unique_set(fset).tasks
+        raise CpusetException('selective_move() passed neither fset nor plist')
     log.debug('processing task heap')
+    kinds = procfs.classifier.classify(task_heap,
+                                       ProgressBar(len(task_heap), '=',
+                                                   'tasks scanned'))
     for task in task_heap:
         try:
-            # kernel threads do not have an excutable image
-            os.readlink('/proc/'+task+'/exe')
+            kind = kinds.get(int(task))
+            if kind == None or kind.kthread:
+                # gone by now, or a kernel thread
+                raise OSError(errno.ENOENT, task)
             autsk += 1
             if fset and not force: 
-                try:
-                    task_check.index(task)
+                if cset.in_array(task_check, int(task)):
                     tasks.append(task)
                     log.debug(' added task %s', task)
                     utsk += 1
                     if threads:
                         log.debug(' thread matching, looking for threads for task %s', task)
-                        dirs = os.listdir('/proc/'+task+'/task')
+                        dirs = cset.backend.listdir('/proc/'+task+'/task')
                         if len(dirs) > 1:
                             for thread in dirs:
                                 if thread != task:
                                     log.debug('  adding thread %s', thread)
                                     tasks.append(thread)
                                     utsk += 1 
-                except ValueError:
+                else:
                     log.debug(' task %s not running in %s, skipped', 
                               task, fset.name)
                     utsknr += 1
@@ -488,7 +618,7 @@ def selective_move(fset, tset, plist=None, kthread=None, force=None, threads=Non
             raise CpusetException('if you want to move kernel threads, use -k')
         elif ktskb > 0:
             raise CpusetException('kernel tasks are bound, use --force if ok')
-        return
+        return []
     if utsk > 0:
         l = []
         l.append('moving')
@@ -523,6 +653,8 @@ def selective_move(fset, tset, plist=None, kthread=None, force=None, threads=Non
         l.append(str(ktsknr))
         l.append('tasks because they are missing (race)')
     move(None, target, tasks)
+    if threads: follow_threads(target, tasks)
+    return tasks
 
 def run(tset, args, usr_par=None, grp_par=None):
     if isstr(tset):
@@ -533,7 +665,65 @@ def run(tset, args, usr_par=None, grp_par=None):
     else:
         s = tset
     log.debug('entering run, set=%s args=%s ', s.path, args)
+    from cpuset.commands import set
     set.active(s)
+    user, group = credentials(usr_par, grp_par)
+    # move myself into target cpuset and exec child
+    move_pidspec(str(os.getpid()), s)
+    log.info('--> last message, executed args into cpuset "%s", new pid is: %s', 
+             s.path, os.getpid()) 
+    switch_user(usr_par, user, group)
+    if stats.current != None:
+        log.info('\n'.join(stats.current.report(config.mread)))
+    os.execvp(args[0], args)
+
+def run_path(path, args, usr_par=None, grp_par=None):
+    """the fast path of run for a set given by path: join it with one
+       write of our pid and exec args, no cpusets are discovered"""
+    log.debug('entering run_path, path=%s args=%s ', path, args)
+    user, group = credentials(usr_par, grp_par)
+    path = '/' if path == 'root' else '/' + path.strip('/')
+    cset.join(path)
+    log.info('--> last message, executed args into cpuset "%s", new pid is: %s', 
+             path, os.getpid()) 
+    switch_user(usr_par, user, group)
+    if stats.current != None:
+        log.info('\n'.join(stats.current.report(config.mread)))
+    os.execvp(args[0], args)
+
+def run_batch(jobfile, limit=None, usr_par=None, grp_par=None):
+    """run the jobs of jobfile in their cpusets, limit at a time"""
+    from cpuset import batch
+    if limit == None: limit = os.cpu_count() or 1
+    if limit < 1:
+        raise CpusetException('--jobs must be at least 1')
+    try:
+        f = sys.stdin if jobfile == '-' else open(jobfile)
+    except (IOError, OSError) as err:
+        raise CpusetException('cannot read job file "%s": %s' %
+                              (jobfile, err.strerror))
+    try:
+        jobs = batch.read_jobs(f)
+    finally:
+        if f != sys.stdin: f.close()
+    batch.resolve(jobs)
+    user, group = credentials(usr_par, grp_par)
+    switch = None
+    if user != None or group != None:
+        switch = lambda: switch_user(usr_par, user, group)
+    start = time.time()
+    done = batch.Batch(jobs, limit, switch).run()
+    failed = len([job for job in done if job.status != 0])
+    log.info('--> %d jobs run in %.3fs, %d at a time, %d failed',
+             len(done), time.time() - start, limit, failed)
+    if failed:
+        raise CpusetException('%d of %d jobs failed' % (failed, len(done)))
+
+def credentials(usr_par, grp_par):
+    """return the (uid, gid) to run as for --user and --group, None for
+       what is to be left unchanged"""
+    import pwd, grp
+    user = group = None
     # check user
     if usr_par: 
         try: 
@@ -557,34 +747,26 @@ def run(tset, args, usr_par=None, grp_par=None):
         if user != 0:
             try:
                 group = grp.getgrnam('users')[2]
-                grp_par = True
             except:
                 pass # just forget it
-    # move myself into target cpuset and exec child
-    move_pidspec(str(os.getpid()), s)
-    log.info('--> last message, executed args into cpuset "%s", new pid is: %s', 
-             s.path, os.getpid()) 
-    # change user and group before exec
-    if grp_par: os.setgid(group)
-    if usr_par: 
+    return user, group
+
+def switch_user(usr_par, user, group):
+    """change user and group before exec"""
+    if group != None: os.setgid(group)
+    if user != None: 
         os.setuid(user)
         os.environ["LOGNAME"] = usr_par
         os.environ["USERNAME"] = usr_par
         os.environ["USER"] = usr_par
-    os.execvp(args[0], args)
 
 def is_unbound(proc):
-    # FIXME: popen is slow... 
-    # --> use /proc/<pid>/status -> Cpus_allowed
-    #     int(line.replace(',',''), 16)
-    #     note: delete leading zeros to compare to allcpumask
-    line = os.popen('/usr/bin/taskset -p ' + str(proc) +' 2>/dev/null', 'r').readline()
-    aff = line.split()[-1]
-    log.debug('is_unbound, proc=%s aff=%s allcpumask=%s', 
-              proc, aff, cset.allcpumask)
-    if aff == cset.allcpumask: return True
-    return False
+    """True if task proc may run on all cpus, raises if it is gone"""
+    unbound = procfs.classifier.unbound(proc)
+    log.debug('is_unbound, proc=%s unbound=%s', proc, unbound)
+    return unbound
 
+@trace.traced('pidspec_to_list')
 def pidspec_to_list(pidspec, fset=None, threads=False):
     """create a list of process ids out of a pidspec"""
     log.debug('entering pidspecToList, pidspec=%s fset=%s threads=%s', 
@@ -599,7 +781,8 @@ def pidspec_to_list(pidspec, fset=None, threads=False):
     groups = pidspec.split(',')
     plist = []
     nifs = 0
-    if fset: chktsk = fset.tasks
+    if fset: chktsk = cset.task_array(fset.task_ids)
+    live = None
     log.debug('parsing groups: %s', groups)
     for sub in groups:
         items = sub.split('-')
@@ -609,32 +792,33 @@ def pidspec_to_list(pidspec, fset=None, threads=False):
                 continue
             # one pid in this group
             if fset:
-                try:
-                    chktsk.index(items[0])
+                if items[0].isdigit() and cset.in_array(chktsk, int(items[0])):
                     plist.append(items[0])
                     log.debug(' added single pid: %s', items[0])
-                except:
+                else:
                     log.debug(' task %s not running in %s, skipped', items[0], fset.name)
                     nifs += 1
             else:
                 plist.append(items[0])
                 log.debug(' added single pid: %s', items[0])
         elif len(items) == 2:
-            # a range of pids, only include those that exist
-            rng = [str(x) for x in range(int(items[0]), int(items[1])+1)
-                           if os.access('/proc/'+str(x), os.F_OK)]
+            # a range of pids, only include those that exist; either
+            # end may be left out for a range open at that end
+            if not items[0] and not items[1]:
+                raise CpusetException('pidspec=%s has bad group=%s' % (pidspec, items))
+            try:
+                lo = int(items[0]) if items[0] else 0
+                hi = int(items[1]) if items[1] else None
+            except ValueError:
+                raise CpusetException('pidspec=%s has bad group=%s' % (pidspec, items))
             if fset:
-                for tsk in rng:
-                    try:
-                        chktsk.index(tsk)
-                        plist.append(tsk)
-                        log.debug(' added task from range: %s', tsk)
-                    except:
-                        log.debug(' task %s not running in %s, skipped', tsk, fset.name)
-                        nifs += 1
+                rng = cset.array_range(chktsk, lo, hi)
+                log.debug(' added %s tasks of %s from range %s', len(rng), fset.name, sub)
             else:
-                plist.extend(rng)
-                log.debug(' added range of pids from %s-%s: %s', items[0], items[1], rng)
+                if live == None: live = LiveTasks()
+                rng = live.range(lo, hi)
+                log.debug(' added range of pids from %s: %s', sub, rng)
+            plist.extend([str(t) for t in rng])
         else:
             raise CpusetException('pidspec=%s has bad group=%s' % (pidspec, items))
     log.debug('raw parsed pid list of %s tasks: %s', len(plist), plist)
@@ -656,7 +840,7 @@ def pidspec_to_list(pidspec, fset=None, threads=False):
         dups = 0
         hits = 0
         for task in list(pdict.keys()):
-            dirs = os.listdir('/proc/'+str(task)+'/task')
+            dirs = cset.backend.listdir('/proc/'+str(task)+'/task')
             if len(dirs) > 1:
                 hits += 1
                 for thread in dirs:
@@ -669,6 +853,69 @@ def pidspec_to_list(pidspec, fset=None, threads=False):
     log.debug('returning parsed pid list of %s tasks: %s', len(plist), plist)
     return plist
 
+class LiveTasks(object):
+    """the tasks running on the system for expanding ranges of a pidspec:
+       a range narrower than the number of processes is probed in /proc
+       ID by ID, a wider one is taken from the listing of all threads of
+       all processes, so the cost never exceeds that of the listing"""
+    def __init__(self):
+        self.pids = cset.backend.pids()
+        self.tids = None
+
+    def range(self, lo, hi=None):
+        if hi != None and hi - lo < len(self.pids):
+            return [x for x in range(lo, hi + 1)
+                    if cset.backend.exists('/proc/'+str(x))]
+        if self.tids == None:
+            tids = []
+            for pid in self.pids:
+                try:
+                    tids.extend(cset.backend.listdir('/proc/'+pid+'/task'))
+                except OSError:
+                    # the process exited, its threads are gone too
+                    pass
+            self.tids = cset.task_array(tids)
+        return cset.array_range(self.tids, lo, hi)
+
+def freezing(tasks, freeze):
+    """the context of a move, frozen if freeze is set"""
+    if freeze:
+        from cpuset import freeze
+        return freeze.Freezer(tasks)
+    return contextlib.nullcontext()
+
+def follow_threads(tset, tasks, rounds=None):
+    """move the threads of the processes of tasks that are not in tset
+       into it too: a thread started during the move by a thread that
+       was not moved yet starts out in the old cpuset, so the threads are
+       listed again until no new ones show up, for at most rounds times;
+       return the number of threads left behind"""
+    if rounds == None: rounds = config.thread_rounds
+    for nr in range(rounds + 1):
+        inset = frozenset(tset.task_ids)
+        left = []
+        seen = set()
+        for task in tasks:
+            if task in seen:
+                # listed with another thread of its process
+                continue
+            try:
+                tids = cset.backend.listdir('/proc/'+str(task)+'/task')
+            except OSError:
+                continue
+            seen.update(tids)
+            left.extend([t for t in tids if int(t) not in inset])
+        if len(left) == 0:
+            log.debug('all threads followed after %d rounds', nr)
+            return 0
+        if nr == rounds:
+            break
+        log.debug('round %d: moving %d new threads', nr + 1, len(left))
+        tset.tasks = left
+    log.info('**> %d threads still not in %s after %d rounds, use --freeze',
+             len(left), tset.path, rounds)
+    return len(left)
+
 def move_pidspec(pidspec, toset, fset=None, threads=False):
     log.debug('entering move_pidspec, pidspec=%s toset=%s threads=%s', pidspec, toset,
               threads)
@@ -682,10 +929,13 @@ def move_pidspec(pidspec, toset, fset=None, threads=False):
         if len(pids) == 0:
             raise CpusetException('tasks do not match all criteria, none moved')
     move(None, toset, pids)
+    if threads: follow_threads(cset.unique_set(toset), pids)
 
-def task_detail(pid, width=70):
-    # scheduler policy definitions
-    policy = ['o', 'f', 'r', 'b', '?', 'i', 'd']
+# scheduler policies by number
+policies = ['other', 'fifo', 'rr', 'batch', 'iso', 'idle', 'deadline']
+
+def task_record(pid):
+    """return dict of task details, the record of structured output"""
     # stat location definitions
     statdef = {
         'pid': 0,
@@ -694,6 +944,7 @@ def task_detail(pid, width=70):
         'ppid': 3,
         'pgid': 4,
         'sid': 5,
+        'flags': 8,
         'priority': 17,
         'nice': 18,
         'numthreads': 19,
@@ -702,62 +953,76 @@ def task_detail(pid, width=70):
     }
     # get task details from /proc, stat has rtprio/policy but not uid...
     pid = str(pid)
-    if not os.access('/proc/'+pid, os.F_OK):
+    if not cset.backend.exists('/proc/'+pid):
         raise CpusetException('task "%s" does not exist' % pid)
-    status = io.open('/proc/'+pid+'/status', 'r',encoding="iso8859-1").readlines()
+    status = cset.backend.read('/proc/'+pid+'/status').splitlines()
     stdict = {}
     for line in status:
         try:
             stdict[line.split()[0][:-1]] = line.split(':')[1].strip()
         except:
             pass  # sometimes, we get an extra \n out of this file...
-    stat = io.open('/proc/'+pid+'/stat', 'r',encoding="iso8859-1").readline()
+    stat = cset.backend.read('/proc/'+pid+'/stat').split('\n', 1)[0]
     # we assume parentheses appear only around the name
     stat_right_paren = stat.rfind(')')
     stat_left_paren = stat.find('(')
     stat = [stat[:stat_left_paren-1]] + \
            [stat[stat_left_paren:stat_right_paren+1]] + \
            stat[stat_right_paren+2:].split()
-    cmdline = io.open('/proc/'+pid+'/cmdline',encoding="iso8859-1").readline()
-    # assume that a zero delimits the cmdline (it does now...)
-    cmdline = cmdline.replace('\0', ' ')
+    cmdline = cset.backend.read('/proc/'+pid+'/cmdline')
 
-    out = []
+    import pwd
+    uid = int(stdict['Uid'].split()[0])
     try:
-        uid=pwd.getpwuid(int(stdict['Uid'].split()[0]))[0][:8].ljust(8)
-    except:
-        uid=stdict['Uid'].split()[0][:8].ljust(8)
-    out.append(uid)
-    out.append(stdict['Pid'].rjust(5))
-    out.append(stdict['PPid'].rjust(5))
+        user = pwd.getpwuid(uid)[0]
+    except KeyError:
+        user = None
+    policy = int(stat[statdef['rtpolicy']])
+    kthread = bool(int(stat[statdef['flags']]) & procfs.PF_KTHREAD)
+    return {'type': 'task', 'pid': int(stdict['Pid']), 'ppid': int(stdict['PPid']),
+            'uid': uid, 'user': user, 'state': stdict['State'].split()[0],
+            'policy': policies[policy] if policy < len(policies) else policy,
+            'rtpriority': int(stat[statdef['rtpriority']]),
+            'threads': int(stat[statdef['numthreads']]),
+            'name': stdict['Name'], 'kthread': kthread,
+            'cmdline': [a for a in cmdline.split('\0') if a]}
+
+def task_detail(pid, width=70):
+    rec = task_record(pid)
+    out = []
+    if rec['user'] != None:
+        out.append(rec['user'][:8].ljust(8))
+    else:
+        out.append(str(rec['uid'])[:8].ljust(8))
+    out.append(str(rec['pid']).rjust(5))
+    out.append(str(rec['ppid']).rjust(5))
 
     out2 = []
-    out2.append(stdict['State'].split()[0])
-    policy_code=int(stat[statdef['rtpolicy']])
-    out2.append(policy[policy_code] if policy_code<len(policy) else '?')
-    if stat[statdef['rtpolicy']] == '0':
+    out2.append(rec['state'])
+    policy = rec['policy']
+    out2.append(policy[0] if policy in policies else '?')
+    if policy == 'other':
         out2.append('th')
-    elif stat[statdef['rtpolicy']] == '3':
+    elif policy == 'batch':
         out2.append('at')
     # SCHED_ISO is reserved but not yet implemented as of Linux v4.4
-    elif stat[statdef['rtpolicy']] == '4':
+    elif policy == 'iso':
         out2.append('??')
-    elif stat[statdef['rtpolicy']] == '5':
+    elif policy == 'idle':
         out2.append('dl')
     else:
-        if int(stat[statdef['rtpriority']]) < 10:
+        if rec['rtpriority'] < 10:
             out2.append('_')
-            out2.append(stat[statdef['rtpriority']])
+            out2.append(str(rec['rtpriority']))
         else:
-            out2.append(stat[statdef['rtpriority']].rjust(2))
+            out2.append(str(rec['rtpriority']).rjust(2))
     out.append(''.join(out2))
 
-    try:
-        os.readlink('/proc/'+pid+'/exe')
-        #prog = stdict['Name'] + ' '.join(cmdline.split()[1:])
-        prog = cmdline
-    except:
-        prog = '['+stdict['Name']+']'
+    if rec['kthread'] or len(rec['cmdline']) == 0:
+        prog = '['+rec['name']+']'
+    else:
+        # a zero delimits the arguments, they are joined with blanks
+        prog = ' '.join(rec['cmdline']).split('\n', 1)[0]
     out.append(prog)
 
     if config.mread:
@@ -780,23 +1045,32 @@ def task_detail_header(indent=None):
     l.append(istr + '-------- ----- ----- ---- ---------')
     return l
 
-def task_detail_table(pids, indent=None, width=None):
+def task_detail_table(pids, indent=None, width=None, progress=None):
     l = []
     if indent == None: istr = ""
     else: istr = indent
     for task in pids:
         if width: l.append(istr + task_detail(task, width))
         else: l.append(istr + task_detail(task, 0))
+        if progress: progress(len(l))
     return l
 
 def log_detailed_task_table(set, indent=None, width=None):
     log.debug("entering print_detailed_task_table, set=%s indent=%s width=%s",
               set.path, indent, width)
+    if output.structured():
+        for task in set.tasks:
+            rec = task_record(task)
+            rec['set'] = set.path
+            output.emit(rec)
+        return
     l = []
     if not config.mread:
         l.append(cset.summary(set))
         l.extend(task_detail_header(indent))
-        l.extend(task_detail_table(set.tasks, indent, width))
+        tasks = set.tasks
+        l.extend(task_detail_table(tasks, indent, width,
+                                   ProgressBar(len(tasks), '=', 'tasks read')))
     else:
         l.append('proc_list_start-' + set.name)
         l.extend(task_detail_table(set.tasks))
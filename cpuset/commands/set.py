@@ -20,11 +20,12 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
-import sys, os, logging, time
+import sys, os, logging
 from optparse import OptionParser, make_option
 
 from cpuset import config
 from cpuset import cset
+from cpuset import output
 from cpuset.util import *
 from cpuset.commands.common import *
 try: from cpuset.commands import proc
@@ -94,6 +95,12 @@ memory node specification that is not valid, you may get a
 cryptic error message, "No space left on device", and the
 modification will not be allowed.
 
+With --top the cpu utilization of all cpusets is shown, sampled
+from /proc and refreshed every --interval seconds: Busy% is the
+busy time of the set's CPUs, Tasks% the CPU time used by the set's
+tasks, both in percent of the time of the set's CPUs, and Run/CPU
+the runnable tasks of the set per CPU.
+
 When you destroy a cpuset, then the tasks running in that set are
 moved to the parent of that cpuset.  If this is not what you
 want, then manually move those tasks to the cpuset of your choice
@@ -167,8 +174,32 @@ options = [make_option('-l', '--list',
            make_option('--mem_exclusive',
                        help = 'mark this cpuset as owning its MEMs exclusively',
                        action = 'store_true'),
+           make_option('--top',
+                       help = 'show the cpu utilization of all cpusets, '
+                              'refreshed every --interval seconds',
+                       action = 'store_true'),
+           make_option('--interval',
+                       help = 'seconds between refreshes of --top (default 1)',
+                       type = 'float',
+                       default = 1.0,
+                       metavar = 'S'),
           ]
 
+def lock_scope(options, args):
+    """(exclusive, cpusets) to lock for cpuset.lock, None not to lock"""
+    if options.top:
+        return None
+    names = [options.set] if options.set else list(args)
+    if options.cpu or options.mem or options.destroy:
+        return True, names
+    if options.newname:
+        from cpuset import lock
+        old = lock.resolve(names[0]) if names else '/'
+        new = options.newname
+        if new.find('/') == -1: new = old[:old.rfind('/')+1] + new
+        return True, [old, new]
+    return False, names or ['/']
+
 def func(parser, options, args):
     log.debug("entering func, options=%s, args=%s", options, args)
     global verbose
@@ -176,6 +207,16 @@ def func(parser, options, args):
 
     cset.rescan()
 
+    if options.top:
+        from cpuset import top
+        if options.interval <= 0:
+            raise CpusetException('--interval must be greater than zero')
+        try:
+            top.run(options.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
     if options.list:
         if options.set:
             list_sets(options.set, options.recurse, options.usehex)
@@ -228,6 +269,10 @@ def list_sets(tset, recurse=None, usehex=False):
                 for nd in cset.walk_set(node):
                     sl2.append(nd)
     sl = sl2
+    if output.structured():
+        for s in sl:
+            output.emit(set_record(s))
+        return
     if config.mread:
         pl = ['cpuset_list_start']
     else:
@@ -266,26 +311,36 @@ def destroy_sets(sets, recurse=False, force=False):
                 raise CpusetException(
                         'cpuset "%s" has subsets, use --force to destroy'
                         % st.path)
-            sl2.extend(st.subsets)
-            for node in st.subsets:
-                for nd in cset.walk_set(node):
-                    sl2.append(nd)
 
-    # ok, good to go
-    if recurse: sl2.reverse()
-    for s in sl2:
-        s = cset.unique_set(s)
-        # skip the root set!!! or you'll have problems...
-        if s.path == '/': continue
+    # ok, good to go, each requested set is handled with its subsets
+    # in one pass: all their tasks are moved to the surviving parent
+    # at once, then the sets are removed bottom-up
+    # skip the root set!!! or you'll have problems...
+    sl2 = [st for st in sl2 if st.path != '/']
+    paths = [st.path for st in sl2]
+    for st in sl2:
+        # sets given together with one of their parents go with it
+        if [p for p in paths if st.path.startswith(p.rstrip('/') + '/')]:
+            continue
+        tree = [st] + list(cset.walk_set(st))
+        tasks = []
+        for s in tree:
+            tasks.extend(s.tasks)
         log.info('--> processing cpuset "%s", moving %s tasks to parent "%s"...',
-                 s.name, len(s.tasks), s.parent.path)
-        proc.move(s, s.parent)
-        log.info('--> deleting cpuset "%s"', s.path)
-        destroy(s)
+                 st.path, len(tasks), st.parent.path)
+        if len(tasks) > 0:
+            proc.move(None, st.parent, tasks)
+        tree.sort(key=lambda s: s.path.count('/'), reverse=True)
+        for s in tree:
+            log.info('--> deleting cpuset "%s"', s.path)
+            destroy(s, st.parent, rescan=False)
+    cset.rescan()
     log.info('done')
 
-def destroy(name):
-    """destroy one cpuset by name as cset or string"""
+def destroy(name, moveto=None, rescan=True):
+    """destroy one cpuset by name as cset or string, tasks that still
+       turn up in it while waiting for it to empty are moved to moveto,
+       the model is only rescanned afterwards if rescan is true"""
     log.debug('entering destroy, name=%s', name)
     if isstr(name):
         set = cset.unique_set(name)
@@ -294,26 +349,19 @@ def destroy(name):
                 "passed name=%s, which is not a string or CpuSet" % name) 
     else:
         set = name
-    tsks = set.tasks
+    if isstr(moveto):
+        moveto = cset.unique_set(moveto)
+    # tasks that were just moved out sometimes take a little while to
+    # leave the set, and may have forked in the meantime
+    tsks = cset.wait_empty(set.path, moveto and moveto.path)
     if len(tsks) > 0:
-        # wait for tasks, sometimes it takes a little while to
-        # have them leave the set
-        ii = 0
-        while len(tsks)>0:
-            log.debug('%i tasks still running in set %s, waiting interval %s...',
-                      len(tsks), set.name, ii+1)
-            time.sleep(0.5)
-            tsks = set.tasks
-            ii += 1
-            if (ii) > 6:
-                # try it for 3 seconds, bail if tasks still there
-                raise CpusetException(
-                    "trying to destroy cpuset %s with tasks running: %s" %
-                    (set.path, set.tasks))
+        raise CpusetException(
+            "trying to destroy cpuset %s with tasks running: %s" %
+            (set.path, tsks))
     log.debug("tasks expired, deleting set %s" % set.path)
-    os.rmdir(cset.CpuSet.basepath+set.path)
-    # fixme: perhaps reparsing the all the sets is not so efficient...
-    cset.rescan()
+    cset.backend.rmdir(cset.CpuSet.basepath+set.path)
+    if rescan:
+        cset.rescan()
 
 def rename_set(options, args):
     """rename cpuset as specified in options and args lists"""
@@ -344,7 +392,7 @@ def rename_set(options, args):
     if name.rfind('/') != -1:
         name = name[name.rfind('/')+1:]
     log.info('--> renaming "%s" to "%s"', cset.CpuSet.basepath+tset.path, name)
-    os.rename(cset.CpuSet.basepath+tset.path, cset.CpuSet.basepath+path+name)
+    cset.backend.rename(cset.CpuSet.basepath+tset.path, cset.CpuSet.basepath+path+name)
     cset.rescan()
 
 def create_from_options(options, args):
@@ -391,7 +439,7 @@ def create(name, cpuspec, memspec, cx, mx):
     else:
         raise CpusetExists('attempt to create already existing set: "%s"' % name) 
     # FIXME: check if name is a path here
-    os.mkdir(cset.CpuSet.basepath+'/'+name)
+    cset.backend.mkdir(cset.CpuSet.basepath+"/"+name)
     # fixme: perhaps reparsing the all the sets is not so efficient...
     cset.rescan()
     log.debug('created new cpuset "%s"', name)
@@ -438,51 +486,60 @@ def set_header(indent=None):
     l.append(istr + '------------ ---------- - ------- - ----- ---- ----------')
     return l
 
-def set_details(name, indent=None, width=None, usehex=False):
-    """return string of cpuset details"""
-    if width == None: width = 0
+def set_record(name):
+    """return dict of cpuset details, the record of structured output"""
     if isstr(name):
         set = cset.unique_set(name)
     elif not isinstance(name, cset.CpuSet):
         raise CpusetException("passing bogus set=%s" % name)
     else:
         set = name
+    return {'type': 'set', 'name': set.name, 'path': set.path,
+            'cpus': set.cpus, 'cpu_exclusive': set.cpu_exclusive,
+            'mems': set.mems, 'mem_exclusive': set.mem_exclusive,
+            'tasks': len(set.task_ids), 'subsets': len(set.subsets)}
+
+def set_details(name, indent=None, width=None, usehex=False):
+    """return string of cpuset details"""
+    if width == None: width = 0
+    rec = set_record(name)
 
     l = []
-    l.append(set.name.rjust(12))
-    cs = set.cpus
+    l.append(rec['name'].rjust(12))
+    cs = rec['cpus']
     if cs == '': cs = '*****'
     elif usehex: cs = cset.cpuspec_to_hex(cs)
     l.append(cs.rjust(10))
-    if set.cpu_exclusive:
+    if rec['cpu_exclusive']:
         l.append('y')
     else:
         l.append('n')
-    cs = set.mems
+    cs = rec['mems']
     if cs == '': cs = '*****'
     elif usehex: cs = cset.cpuspec_to_hex(cs)
     l.append(cs.rjust(7))
-    if set.mem_exclusive:
+    if rec['mem_exclusive']:
         l.append('y')
     else:
         l.append('n')
-    l.append(str(len(set.tasks)).rjust(5))
-    l.append(str(len(set.subsets)).rjust(4))
+    l.append(str(rec['tasks']).rjust(5))
+    l.append(str(rec['subsets']).rjust(4))
 
+    path = rec['path']
     if config.mread:
-        l.append(set.path)
+        l.append(path)
         l2 = []
         for line in l: 
             l2.append(line.strip())
         return ';'.join(l2)
 
     out = ' '.join(l) + ' '
-    tst = out + set.path
+    tst = out + path
 
     if width != 0 and len(tst) > width:
         target = width - len(out)
-        patha = set.path[:len(set.path)//2-3]
-        pathb = set.path[len(set.path)//2:]
+        patha = path[:len(path)//2-3]
+        pathb = path[len(path)//2:]
         patha = patha[:target//2-3]
         pathb = pathb[-target//2:]
         out += patha + '...' + pathb
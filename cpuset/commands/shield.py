@@ -20,15 +20,18 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
-import sys, os, logging
+import sys, os, time, logging
 from optparse import OptionParser, make_option
 
 from cpuset.commands.common import *
 from cpuset.commands import proc
 from cpuset.commands import set
 from cpuset import cset
+from cpuset import layout
 from cpuset.util import *
 from cpuset import config
+from cpuset import output
+from cpuset import procfs
 
 global log 
 log = logging.getLogger('shield')
@@ -113,6 +116,7 @@ brackets of PIDs or TIDs that are inclusive of the endpoints.
 For example:
     1,2,5               Means processes 1, 2 and 5
     1,2,600-700         Means processes 1, 2 and from 600 to 700
+    1000-               Means processes from 1000 up
 
     # cset shield --shield --pid=50-65
         This command moves all processes and threads with PID or
@@ -154,7 +158,9 @@ the following command:
 then that command will move CPU1 into the shielded "user" cpuset.
 Any processes or threads that were running on CPU1 that belonged
 to the unshielded "system" cpuset are migrated to CPU0 by the
-system.
+system.  The new configuration is checked before anything is
+changed, and if the kernel refuses one of the changes anyway, the
+previous configuration of both cpusets is restored.
 
 The --reset subcommand will in essence destroy the shield.  For
 example, if there was a shield on a 4-way machine with CPU0 in
@@ -165,6 +171,40 @@ be migrated to the root cpuset (which has access to all CPUs and
 never goes away), after which both system and user cpusets would
 be destroyed.
 
+The --violations subcommand checks that the shield holds.  It
+reads the cpu every thread of the system last ran on from the
+stat files in /proc and reports, by process, the threads that
+were seen on a cpu outside their cpuset (kind "outside") and the
+threads outside the shield seen on a shielded cpu (kind
+"shield").  Kernel threads bound to a single cpu are not
+reported, they have to run where they are bound.  Note that the
+last cpu of a thread that has slept since it was moved may still
+be one of its old cpus.  With --watch, a sample is taken every
+--interval seconds and the violations of each sample are shown
+until interrupted, followed by the total of all samples.
+
+For example:
+
+    # cset shield --violations --watch --interval 0.5
+
+The --guard subcommand keeps the shield in shape across cpu
+hotplug.  Cpus taken offline are removed from the cpusets by the
+kernel and are not given back to them when they come online
+again, so the shield shrinks and an emptied user set loses its
+tasks to the root set.  The guard records the cpus of the user
+set when it starts, or the CPUSPEC of --cpu given with it, and
+checks /sys/devices/system/cpu/online every --interval seconds.
+When the cpus online change, both shield sets are set up again
+with the recorded cpus that are online, and tasks the kernel
+moved out of the user set are moved back.  While the user set has
+fewer cpus than recorded, the shield is degraded: this is logged
+as an error when it happens, and the time it lasted is logged
+when the cpus are back.  The guard runs until interrupted.
+
+For example:
+
+    # cset shield --guard --cpu=2-3 --interval 5
+
 Note that even though you can mix general usage of cpusets with
 the shielding concepts described here, you generally will not
 want to.  For more complex shielding or usage scenarios, one
@@ -213,12 +253,42 @@ options = [make_option('-c', '--cpu',
            make_option('-v', '--verbose',
                        help = 'prints more detailed output, additive',
                        action = 'count'),
+           make_option('--violations',
+                       help = 'report threads that ran on cpus they should not',
+                       action = 'store_true'),
+           make_option('--watch',
+                       help = 'with --violations, sample every --interval '
+                              'seconds until interrupted',
+                       action = 'store_true'),
+           make_option('--guard',
+                       help = 'keep the shield at its cpus across cpu hotplug '
+                              'until interrupted',
+                       action = 'store_true'),
+           make_option('--interval',
+                       help = 'seconds between samples of --watch or checks '
+                              'of --guard (default 1)',
+                       type = 'float',
+                       default = 1.0,
+                       metavar = 'S'),
            make_option('--sysset',
                        help = 'optionally specify system cpuset name'),
            make_option('--userset',
                        help = 'optionally specify user cpuset name')
           ]
 
+def lock_scope(options, args):
+    """(exclusive, cpusets) to lock for cpuset.lock, None not to lock"""
+    if options.violations or options.guard or options.exc:
+        # the guard locks the shield it sets up and each repair itself
+        return None
+    sets = [options.userset or USR_SET, options.sysset or SYS_SET]
+    if options.cpu or options.reset or options.kthread:
+        # tasks of the root set are moved as well
+        return True, ['/']
+    if options.shield or options.unshield or args:
+        return True, sets
+    return False, sets
+
 def func(parser, options, args):
     log.debug("entering shield, options=%s, args=%s", options, args)
     global verbose
@@ -232,6 +302,28 @@ def func(parser, options, args):
         global USR_SET
         USR_SET = options.userset
 
+    if options.violations:
+        if options.interval <= 0:
+            raise CpusetException('--interval must be greater than zero')
+        try:
+            watch_violations(options.interval if options.watch else None)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if options.guard:
+        if options.interval <= 0:
+            raise CpusetException('--interval must be greater than zero')
+        if options.cpu:
+            from cpuset import lock
+            with lock.exclusive('/'):
+                make_shield(options.cpu, options.kthread)
+        try:
+            guard_shield(options.cpu, options.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
     if (not options.cpu and not options.reset and not options.exc and
         not options.shield and not options.unshield and not options.kthread):
         shield_exists()
@@ -310,8 +402,19 @@ def print_all_stats():
     print_sys_stats()
     print_usr_stats()
 
+def emit_stats(path, role):
+    """emit the record of a shield set, and with -v of its tasks"""
+    rec = set.set_record(cset.unique_set(path))
+    rec['shield'] = role
+    output.emit(rec)
+    if verbose:
+        proc.log_detailed_task_table(cset.unique_set(path))
+
 def print_sys_stats():
-    if verbose and len(cset.unique_set(SYS_SET).tasks) > 0:
+    if output.structured():
+        emit_stats(SYS_SET, 'system')
+        return
+    if verbose and len(cset.unique_set(SYS_SET).task_ids) > 0:
         if verbose == 1:
             proc.log_detailed_task_table(cset.unique_set(SYS_SET), '   ', 76)
         else:
@@ -325,7 +428,10 @@ def print_sys_stats():
             log.info(cset.summary(cset.unique_set(SYS_SET)))
 
 def print_usr_stats():
-    if verbose and len(cset.unique_set(USR_SET).tasks) > 0:
+    if output.structured():
+        emit_stats(USR_SET, 'user')
+        return
+    if verbose and len(cset.unique_set(USR_SET).task_ids) > 0:
         if verbose == 1:
             proc.log_detailed_task_table(cset.unique_set(USR_SET), '   ', 76)
         else:
@@ -359,68 +465,71 @@ def reset_shield():
              len(tasks), SYS_SET)
     proc.move(SYS_SET, 'root', None, verbose)
     log.info('deleting "%s" and "%s" sets', USR_SET, SYS_SET)
-    set.destroy(USR_SET)
-    set.destroy(SYS_SET)
+    set.destroy(USR_SET, 'root')
+    set.destroy(SYS_SET, 'root')
     log.info('done')
 
+def shield_path(name):
+    """return path of shield set name, which need not exist yet"""
+    try:
+        return cset.unique_set(name).path
+    except CpusetNotFound:
+        return name if name.startswith('/') else '/' + name
+
+def apply_shield(usr_cpus, sys_cpus, memspec='0'):
+    """set up the user and system sets with the given cpus"""
+    # both sets are changed in one planned transaction: the final state is
+    # validated up front, the writes are ordered such that the kernel
+    # accepts every intermediate state and all changes are rolled back
+    # if one of them fails anyway
+    lay = layout.Layout([layout.SetSpec(shield_path(USR_SET),
+                                        {'cpus': usr_cpus, 'mems': memspec,
+                                         'cpu_exclusive': True}),
+                         layout.SetSpec(shield_path(SYS_SET),
+                                        {'cpus': sys_cpus, 'mems': memspec,
+                                         'cpu_exclusive': True})], [])
+    layout.execute(layout.plan(lay, layout.State()))
+
 def make_shield(cpuspec, kthread):
     memspec = '0' # FIXME: for numa, we probably want a more intelligent scheme
     log.debug("entering make_shield, cpuspec=%s kthread=%s", cpuspec, kthread)
     # create base cpusets for shield
     cset.cpuspec_check(cpuspec)
-    cpuspec_inv = cset.cpuspec_inverse(cpuspec)
+    # the cpus of the root set are those online, there may be holes
+    cpuspec_inv = cset.ints_to_cpuspec(
+        cset.cpuspec_to_ints(cset.unique_set('/').cpus) -
+        cset.cpuspec_to_ints(cpuspec))
+    if cpuspec_inv == '':
+        raise CpusetException('CPUSPEC "%s" leaves no CPUs for the system set'
+                              % cpuspec)
     try:
         shield_exists()
-    except:
+        exists = True
+    except CpusetException:
         log.debug("shielding does not exist, creating")
-        try:
-            set.create(USR_SET, cpuspec, memspec, True, False)
-            set.create(SYS_SET, cpuspec_inv, memspec, True, False)
-        except Exception as instance:
-            # unroll
-            try: set.destroy(USR_SET)
-            except: pass
-            try: set.destroy(SYS_SET)
-            except: pass
+        exists = False
+    try:
+        apply_shield(cpuspec, cpuspec_inv, memspec)
+    except:
+        if not exists:
             log.critical('--> failed to create shield, hint: do other cpusets exist?')
-            raise instance
-        log.info('--> activating shielding:')
-    else:
-        log.debug("shielding exists, modifying cpuspec")
-        # note, since we're going to modify the cpu assigments to these sets,
-        # they cannot be exclusive, the following modify() calls will make
-        # them exclusive again
-        cset.unique_set(USR_SET).cpu_exclusive = False
-        cset.unique_set(SYS_SET).cpu_exclusive = False
-        set.modify(USR_SET, cpuspec, memspec, False, False)
-        set.modify(SYS_SET, cpuspec_inv, memspec, False, False)
-        # reset cpu exlusivity
-        cset.unique_set(USR_SET).cpu_exclusive = True
-        cset.unique_set(SYS_SET).cpu_exclusive = True
+        raise
+    if exists:
         log.info('--> shielding modified with:')
+    else:
+        log.info('--> activating shielding:')
     # move root tasks into system set
     root_tasks = cset.unique_set('/').tasks
     log.debug("number of root tasks are: %s", len(root_tasks))
     # figure out what in root set is not a kernel thread
-    tasks = []
-    for task in root_tasks:
-        try:
-            os.readlink('/proc/'+task+'/exe')
-            tasks.append(task)
-        except:
-            pass
+    tasks = procfs.classifier.userspace(root_tasks)
     if len(tasks) != 0:
         log.info("moving %s tasks from root into system cpuset...", len(tasks))
     proc.move('root', SYS_SET, tasks, verbose)
     # move kernel theads into system set if asked for
     if kthread == 'on':
         root_tasks = cset.unique_set('/').tasks
-        tasks = []
-        for task in root_tasks:
-            try:
-                if proc.is_unbound(task): tasks.append(task)
-            except:
-                pass
+        tasks = procfs.classifier.unbound_tasks(root_tasks)
         if len(tasks) != 0:
             log.info("kthread shield activated, moving %s tasks into system cpuset...",
                      len(tasks))
@@ -436,12 +545,7 @@ def make_kthread(state):
         root_tasks = cset.unique_set('/').tasks
         log.debug('root set has %d tasks, checking for unbound', 
                   len(root_tasks))
-        tasks = []
-        for task in root_tasks:
-            try:
-                if proc.is_unbound(task): tasks.append(task)
-            except:
-                pass
+        tasks = procfs.classifier.unbound_tasks(root_tasks)
         if len(tasks) != 0:
             log.debug("total root tasks %s", len(root_tasks))
             log.info("kthread shield activated, moving %s tasks into system cpuset...",
@@ -450,17 +554,251 @@ def make_kthread(state):
     else:
         log.info('--> deactivating kthread shielding')
         usr_tasks = cset.unique_set(SYS_SET).tasks
-        tasks = []
-        for task in usr_tasks:
-            try:
-                os.readlink('/proc/'+task+'/exe')
-            except:
-                tasks.append(task)
+        tasks = procfs.classifier.kthreads(usr_tasks)
         if len(tasks) != 0:
             log.info("moving %s tasks into root cpuset...", len(tasks))
         proc.move(SYS_SET, '/', tasks, verbose)
     log.info('done')
 
+class Violation(object):
+    """the threads of one process seen on cpus they should not run on;
+       kind is 'outside' for cpus outside the thread's own cpuset and
+       'shield' for shielded cpus used by a thread outside the shield"""
+    def __init__(self, pid, path, kind):
+        self.pid = int(pid)
+        self.path = path
+        self.kind = kind
+        self.name = ''
+        self.tids = {}          # thread ID -> times seen
+        self.cpus = {}          # cpu -> times seen
+
+    def add(self, st):
+        self.tids[st.tid] = self.tids.get(st.tid, 0) + 1
+        self.cpus[st.processor] = self.cpus.get(st.processor, 0) + 1
+
+    def merge(self, other):
+        for tid, n in other.tids.items():
+            self.tids[tid] = self.tids.get(tid, 0) + n
+        for cpu, n in other.cpus.items():
+            self.cpus[cpu] = self.cpus.get(cpu, 0) + n
+
+    def record(self):
+        return {'type': 'violation', 'pid': self.pid, 'name': self.name,
+                'set': self.path, 'kind': self.kind,
+                'threads': sorted(self.tids), 'cpus': sorted(self.cpus),
+                'seen': sum(self.tids.values())}
+
+    def line(self):
+        return '%6d %-16s %-7s %7d %10s %5d %s' % (
+            self.pid, self.name[:16], self.kind, len(self.tids),
+            cset.ints_to_cpuspec(sorted(self.cpus)), sum(self.tids.values()),
+            self.path)
+
+def sample_violations():
+    """sample the cpu every thread of the system last ran on, return the
+       Violations found, by (pid, kind)"""
+    cset.rescan()
+    shield_exists()
+    usr = cset.unique_set(USR_SET)
+    shielded = frozenset(cset.cpuspec_to_ints(usr.cpus))
+    where = {}                  # thread ID -> set
+    allowed = {}                # set path -> cpus, read once per sample
+    for s in [cset.RootSet] + list(cset.walk_set(cset.RootSet)):
+        allowed[s.path] = frozenset(cset.cpuspec_to_ints(s.cpus))
+        for tid in s.task_ids:
+            where[tid] = s
+    found = {}
+    for pid in cset.backend.pids():
+        for st in procfs.thread_stats(pid):
+            s = where.get(st.tid)
+            if s == None:
+                # started after the sets were read
+                continue
+            if st.processor not in allowed[s.path]:
+                kind = 'outside'
+            elif (st.processor in shielded and s.path != usr.path and
+                  not s.path.startswith(usr.path + '/')):
+                # per-cpu kernel threads have to run where they are bound
+                if (st.flags & procfs.PF_KTHREAD and
+                    len(procfs.cpus_allowed(st.tid) or ()) == 1):
+                    continue
+                kind = 'shield'
+            else:
+                continue
+            if (pid, kind) not in found:
+                found[(pid, kind)] = Violation(pid, s.path, kind)
+            found[(pid, kind)].add(st)
+    for v in found.values():
+        try:
+            v.name = cset.backend.read('/proc/%s/comm' % v.pid).strip()
+        except (IOError, OSError):
+            pass
+    return found
+
+def report_violations(violations, title):
+    violations = sorted(violations, key=lambda v: (v.kind, v.pid))
+    if output.structured():
+        for v in violations:
+            output.emit(v.record())
+        return
+    if not violations:
+        log.info('%s: no violations', title)
+        return
+    log.info('%s: %d processes', title, len(violations))
+    log.info('   PID Name             Kind    Threads       CPUs  Seen Cpuset')
+    log.info('------ ---------------- ------- ------- ---------- ----- ------')
+    for v in violations:
+        log.info(v.line())
+
+def watch_violations(interval=None):
+    """report the violations of one sample, or with interval of a
+       sample every interval seconds until interrupted, then the total"""
+    if interval == None:
+        report_violations(sample_violations().values(), '--> placement violations')
+        return
+    if cset.watcher == None:
+        # only rediscover the sets when they change
+        cset.watcher = cset.HierarchyWatcher()
+    total = {}
+    samples = 0
+    try:
+        while True:
+            start = time.time()
+            found = sample_violations()
+            samples += 1
+            for key, v in found.items():
+                if key in total: total[key].merge(v)
+                else: total[key] = v
+            if found:
+                report_violations(found.values(), time.strftime('%H:%M:%S'))
+            time.sleep(max(0, interval - (time.time() - start)))
+    finally:
+        if not output.structured():
+            report_violations(total.values(),
+                              '--> total of %d samples' % samples)
+
+CPU_ONLINE = '/sys/devices/system/cpu/online'
+
+class Guard(object):
+    """keeps the shield at the cpus recorded when it was created, the
+       cpus of the user set by default, across cpu hotplug"""
+    def __init__(self, cpuspec=None):
+        shield_exists()
+        if cpuspec == None: cpuspec = cset.unique_set(USR_SET).cpus
+        self.cpus = cset.cpuspec_to_ints(cpuspec)
+        if not self.cpus:
+            raise CpusetException('the shield has no cpus to guard')
+        self.online = None
+        self.tasks = cset.task_array(cset.unique_set(USR_SET).task_ids)
+        self.have = len(self.cpus)  # cpus of the user set at the last check
+        self.degraded = None        # time the shield became degraded
+        self.downtime = 0.0         # seconds degraded before that
+        self.repairs = 0
+
+    def event(self, what, level, msg, *args):
+        if output.structured():
+            output.emit({'type': 'guard', 'event': what, 'set': USR_SET,
+                         'cpus': sorted(self.cpus), 'have': self.have,
+                         'downtime': round(self.downtime, 3)})
+        else:
+            log.log(level, msg, *args)
+
+    def check(self, now=None):
+        """set the shield up again if the cpus online changed, return
+           True if the user set has all of its cpus"""
+        if now == None: now = time.time()
+        online = cset.cpuspec_to_ints(cset.backend.read(CPU_ONLINE).strip())
+        if online != self.online:
+            if self.online != None:
+                log.info('--> cpus online changed to %s',
+                         cset.ints_to_cpuspec(online))
+            self.online = online
+            self.repair(online)
+        have = cset.cpuspec_to_ints(cset.unique_set(USR_SET).cpus)
+        if len(have) > 0:
+            self.tasks = cset.task_array(cset.unique_set(USR_SET).task_ids)
+        if len(have) < len(self.cpus):
+            if self.degraded == None:
+                self.degraded = now
+            if len(have) != self.have or self.degraded == now:
+                self.have = len(have)
+                self.event('degraded', logging.ERROR,
+                           '**> shield degraded: "%s" has %d of its %d cpus '
+                           '(%s), missing %s', USR_SET, len(have),
+                           len(self.cpus), cset.ints_to_cpuspec(self.cpus),
+                           cset.ints_to_cpuspec(self.cpus - have) or '-')
+            return False
+        self.have = len(have)
+        if self.degraded != None:
+            self.downtime += now - self.degraded
+            lasted = now - self.degraded
+            self.degraded = None
+            self.event('restored', logging.INFO,
+                       '--> shield restored after %s degraded', duration(lasted))
+        return True
+
+    def repair(self, online):
+        """set up both shield sets with the recorded cpus online"""
+        # the guard runs for long, task IDs seen before may be reused
+        procfs.classifier.forget()
+        usr_cpus = self.cpus & online
+        sys_cpus = online - self.cpus
+        cset.rescan()
+        usr = cset.unique_set(USR_SET)
+        if (cset.cpuspec_to_ints(usr.cpus) == usr_cpus and
+            cset.cpuspec_to_ints(cset.unique_set(SYS_SET).cpus) == sys_cpus):
+            return
+        if not usr_cpus or not sys_cpus:
+            log.error('**> cannot repair shield, no cpus online %s it',
+                      'in' if not usr_cpus else 'outside')
+            return
+        emptied = len(usr.cpus) == 0
+        log.info('--> setting up shield with cpus %s, system cpus %s',
+                 cset.ints_to_cpuspec(usr_cpus), cset.ints_to_cpuspec(sys_cpus))
+        from cpuset import lock
+        try:
+            with lock.exclusive('/'):
+                apply_shield(cset.ints_to_cpuspec(usr_cpus),
+                             cset.ints_to_cpuspec(sys_cpus))
+                self.repairs += 1
+                if emptied:
+                    self.restore_tasks()
+        except CpusetException as err:
+            log.error('**> cannot repair shield: %s', err)
+
+    def restore_tasks(self):
+        """move the tasks the kernel moved from the emptied user set to
+           the root set back, kernel threads that got the ID of one of
+           them since are left alone"""
+        tasks = procfs.classifier.userspace(
+            [str(t) for t in cset.unique_set('/').task_ids
+             if cset.in_array(self.tasks, t)])
+        if tasks:
+            log.info('--> moving %d tasks back into "%s"', len(tasks), USR_SET)
+            proc.move('root', USR_SET, tasks)
+
+    def summary(self, now=None):
+        if now == None: now = time.time()
+        total = self.downtime
+        if self.degraded != None: total += now - self.degraded
+        if output.structured():
+            return
+        log.info('--> shield degraded for %s in total, %d repairs',
+                 duration(total), self.repairs)
+
+def guard_shield(cpuspec=None, interval=1.0):
+    """check the shield every interval seconds until interrupted"""
+    guard = Guard(cpuspec)
+    log.info('--> guarding shield "%s" with cpus %s', USR_SET,
+             cset.ints_to_cpuspec(guard.cpus))
+    try:
+        while True:
+            start = time.time()
+            guard.check(start)
+            time.sleep(max(0, interval - (time.time() - start)))
+    finally:
+        guard.summary()
+
 def exec_args(args, upar, gpar):
     log.debug("entering exec_args, args=%s", args)
     shield_exists()
@@ -28,8 +28,6 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
 import sys
-import types
-import configparser
 
 ############################################################################
 # Default configuration variable values
@@ -37,11 +35,34 @@ import configparser
 defloc = '/etc/cset.conf'           # default config file location
 mread = False                       # machine readable output, usually set
                                     # via option -m/--machine 
+format = 'text'                     # listing format: text, json or ndjson,
+                                    # set via option --format
 mountpoint = '/cpusets'             # cpuset filessytem mount point
+daemon_socket = '/run/cset.sock'    # unix socket of cset daemon, commands
+                                    # are forwarded to it when it exists
+destroy_timeout = 3.5               # seconds to wait for tasks to leave a
+                                    # cpuset that is being destroyed
+thread_rounds = 8                   # times the threads of processes moved
+                                    # with --threads are listed again for
+                                    # threads started during the move
+freeze_timeout = 1.0                # seconds to wait for processes to
+                                    # freeze with --freeze
+lock_file = '/run/cset.lock'        # file locked by cset commands so that
+                                    # concurrent ones do not interleave
+lock_timeout = 30.0                 # seconds to wait for the lock of a
+                                    # command, 0 not to wait, below 0
+                                    # to wait as long as it takes
+progress_rate = 10                  # redraws of a progress bar per second
+                                    # at most, on a terminal
+progress_interval = 10.0            # seconds between progress log lines
+                                    # when not on a terminal
 ############################################################################
 
 def ReadConfigFiles(path=None):
     if path == None: path = defloc
+    import os
+    if not os.access(path, os.R_OK): return
+    import configparser
     cf = configparser.ConfigParser()
     try:
         fr = cf.read(path)
@@ -67,11 +88,7 @@ def ReadConfigFiles(path=None):
             globals()[opt] = cf.getboolean('default', opt)
         elif typ == int:
             globals()[opt] = cf.getint('default', opt)
+        elif typ == float:
+            globals()[opt] = cf.getfloat('default', opt)
         else:
             globals()[opt] = cf.get('default', opt)
-
-# Importing module autoinitializes it
-def __init():
-    ReadConfigFiles()
-
-__init()
@@ -1,8 +1,6 @@
 """Cpuset class and cpuset graph, importing module will create model
 """
 
-import io
-
 __copyright__ = """
 Copyright (C) 2007-2010 Novell Inc.
 Copyright (C) 2013-2017 SUSE
@@ -22,15 +20,24 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
-import os, re, sys, logging
+import os, re, sys, errno, bisect, logging
+from array import array
 
 if __name__ == '__main__': 
     sys.path.insert(0, "..")
     logging.basicConfig()
 
 from cpuset.util import *
+from cpuset import api
+from cpuset import trace
+from cpuset import stats
+from cpuset.api import cpuspec_to_ints, ints_to_cpuspec
+# all file system I/O goes through the backend, see cpuset.backend
+from cpuset.backend import kernel
+backend = kernel
 log = logging.getLogger('cset')
 RootSet = None
+watcher = None
 
 class CpuSet(object):
     # sets is a class variable dict that keeps track of all 
@@ -53,8 +60,8 @@ class CpuSet(object):
             #       pass, but there are never many cpusets, so
             #       that optimization is left for the future
             log.debug("finding all cpusets")
-            path = self.locate_cpusets()
-            CpuSet.basepath = path
+            locate(force=True)
+            path = CpuSet.basepath
             log.debug("creating root node at %s", path)
             self.__root = True
             self.name = 'root'
@@ -65,16 +72,9 @@ class CpuSet(object):
                 CpuSet.sets = {}
             CpuSet.sets[self.path] = self
 
-            # if mounted as a cgroup controller, switch file name format
-            if not os.access(path + CpuSet.cpus_path, os.F_OK):
-                CpuSet.cpus_path = '/cpuset.cpus'
-                CpuSet.mems_path = '/cpuset.mems'
-                CpuSet.cpu_exclusive_path = '/cpuset.cpu_exclusive'
-                CpuSet.mem_exclusive_path = '/cpuset.mem_exclusive'
-
             # bottom-up search otherwise links will not exist
             log.debug("starting bottom-up discovery walk...")
-            for dir, dirs, files in os.walk(path, topdown=False):
+            for dir, dirs, files in backend.walk(path, topdown=False):
                 log.debug("*** walking %s", dir)
                 node = self if dir == CpuSet.basepath else CpuSet(dir)
                 node.subsets = []
@@ -86,7 +86,7 @@ class CpuSet(object):
                           len(node.subsets), '|'.join(dirs))
 
             log.debug("staring top-down parenting walk...")
-            for dir, dirs, files in os.walk(path):
+            for dir, dirs, files in backend.walk(path):
                 dir = dir.replace(CpuSet.basepath, '')
                 if len(dir) == 0: dir = '/'
                 node = CpuSet.sets[dir]
@@ -114,7 +114,7 @@ class CpuSet(object):
                 self = CpuSet.sets[path]  # questionable....
                 return
             cpus = CpuSet.basepath + path +  CpuSet.cpus_path
-            if not os.access(cpus, os.F_OK):
+            if not backend.exists(cpus):
                 # not a cpuset directory
                 str = '%s is not a cpuset directory' % (CpuSet.basepath + path)
                 log.error(str)
@@ -123,25 +123,24 @@ class CpuSet(object):
             self.read_cpuset(path)
             CpuSet.sets[path] = self
 
-    def locate_cpusets(self):
+    @staticmethod
+    def locate_cpusets():
         log.debug("locating cpuset filesystem...")
         cpuset_mount_regex = re.compile(r"^[^ ]+ (/.+) (?:cpuset |cgroup (?:[^ ]*,)?cpuset[, ])")
         path = None
-        f = io.open("/proc/mounts",encoding="iso8859-1")
-        for line in f:
+        for line in backend.read("/proc/mounts").splitlines():
             res = cpuset_mount_regex.search(line)
             if res:
                 path = res.group(1)
                 break
-        f.close()
 
         if not path:
             # mounted cpusets not found, so mount them
 
-            if not os.access(config.mountpoint, os.F_OK):
-                os.mkdir(config.mountpoint)
-            ret = os.system("mount -t cpuset none " + config.mountpoint)
-            if ret:
+            stats.count('spawns')
+            try:
+                backend.mount(config.mountpoint)
+            except OSError:
                raise CpusetException(
                      'mount of cpuset filesystem failed, do you have permission?')
             path = config.mountpoint
@@ -156,16 +155,16 @@ class CpuSet(object):
         log.debug("...name=%s", self.name)
 
     def read_first_line_from(self, file_to_read):
-        f = io.open(CpuSet.basepath+self.path+file_to_read, encoding="iso8859-1")
-        retval = f.readline().strip()
-        f.close()
+        stats.count('property_reads')
+        with trace.span('read', path=self.path, file=file_to_read):
+            data = backend.read(CpuSet.basepath+self.path+file_to_read)
+            retval = data.split('\n', 1)[0].strip()
         return retval
 
     def write_value_to(self, file_to_write, value):
         log.debug("-> prop_set %s.%s = %s", self.path, file_to_write, value)
-        f = io.open(CpuSet.basepath+self.path+file_to_write, 'w', encoding="iso8859-1")
-        f.write(str(value))
-        f.close()
+        stats.count('property_writes')
+        backend.write(CpuSet.basepath+self.path+file_to_write, value)
 
     def write_01_to(self, file_to_write, value):
         self.write_value_to(file_to_write, '1' if value else '0')
@@ -202,35 +201,19 @@ class CpuSet(object):
     mem_exclusive = property(getmemxlsv, setmemxlsv, delprop, 
                              "Memory exclusive flag")
 
+    def gettask_ids(self):
+        stats.count('tasks_reads')
+        with trace.span('read', path=self.path, file=CpuSet.tasks_path) as sp:
+            ids = backend.read_tasks(CpuSet.basepath+self.path+CpuSet.tasks_path)
+            sp.set(tasks=len(ids))
+        return ids
+    task_ids = property(gettask_ids, None, delprop,
+                        "Task IDs, an array('i') in the order of the tasks file")
+
     def gettasks(self):
-        f = io.open(CpuSet.basepath+self.path+CpuSet.tasks_path,encoding="iso8859-1")
-        lst = map(lambda line: line.strip(), f.readlines())
-        f.close()
-        return list(lst)
+        return [str(t) for t in self.task_ids]
     def settasks(self, tasklist):
-        notfound = []
-        unmovable = []
-        if len(tasklist) > 3:
-            pb = ProgressBar(len(tasklist), '=')
-            tick = 0
-            prog = True
-        else:
-            prog = False
-        for task in tasklist:
-            try:
-                f = io.open(CpuSet.basepath+self.path+CpuSet.tasks_path,'w',encoding="iso8859-1")
-                f.write(task)
-                f.close()
-            except Exception as err:
-                if str(err).find('No such process') != -1:
-                    notfound.append(task)
-                elif str(err).find('Invalid argument'):
-                    unmovable.append(task)
-                else: 
-                    raise
-            if prog:
-                tick += 1
-                pb.progress(tick)
+        notfound, unmovable = migrate(self.path, tasklist)
         if len(notfound) > 0:
             log.info('**> %s tasks were not found, so were not moved', len(notfound))
             log.debug(' not found: %s', notfound)
@@ -245,14 +228,76 @@ class CpuSet(object):
 # Helper functions
 #
 
+def hierarchy():
+    """the api.Hierarchy of the cpusets in the model"""
+    return api.Hierarchy(CpuSet.basepath, stats.current, backend)
+
+def task_array(tasks):
+    """the sorted array of the task IDs of a task list or task_ids"""
+    return array('i', sorted([int(t) for t in tasks]))
+
+def in_array(tasks, task):
+    """True if task is in the sorted array tasks"""
+    i = bisect.bisect_left(tasks, task)
+    return i < len(tasks) and tasks[i] == task
+
+def array_range(tasks, lo, hi=None):
+    """the tasks of the sorted array tasks from lo to hi inclusive, hi
+       None for no upper bound"""
+    end = len(tasks) if hi == None else bisect.bisect_right(tasks, hi)
+    return tasks[bisect.bisect_left(tasks, lo):end]
+
+def migrate(path, tasklist):
+    """move tasks into the cpuset at relative path, return the lists of
+       tasks that were not found and that could not be moved"""
+    with trace.span('migrate', path=path, tasks=len(tasklist)) as sp:
+        if len(tasklist) > 3:
+            pb = ProgressBar(len(tasklist), '=', 'tasks moved')
+            res = api.TaskMover(hierarchy()).move(tasklist, path, pb.progress)
+        else:
+            res = api.TaskMover(hierarchy()).move(tasklist, path)
+        sp.set(notfound=len(res.notfound), unmovable=len(res.unmovable))
+    return res.notfound, res.unmovable
+
+def join(path, pid=None):
+    """move pid, by default this process, into the cpuset at path with a
+       single write to its tasks file, without discovering any cpusets"""
+    if path[0] != '/': path = '/' + path
+    # the mount point is all that is needed, not the cpus of the system
+    base = CpuSet.basepath or CpuSet.locate_cpusets()
+    if pid == None: pid = os.getpid()
+    try:
+        f = backend.open_tasks(base + path.rstrip('/') + '/tasks')
+        try:
+            f.write(pid)
+        finally:
+            f.close()
+    except (IOError, OSError) as err:
+        if err.errno == errno.ENOENT:
+            raise CpusetNotFound('cpuset "%s" not found in cpusets' % path)
+        if err.errno == errno.ENOSPC:
+            raise CpusetException('"%s" cpuset not active, no cpus or mems defined'
+                                  % path)
+        raise CpusetException('unable to move task %s into "%s": %s' %
+                              (pid, path, err.strerror))
+    stats.count('tasks_writes')
+
+def wait_empty(path, moveto=None, timeout=None):
+    """wait for the cpuset at relative path to have no tasks left, tasks
+       that still show up are moved to moveto if given, see
+       api.TaskMover.wait_empty; returns the tasks left after timeout"""
+    if timeout == None: timeout = config.destroy_timeout
+    with trace.span('wait_empty', path=path) as sp:
+        left = api.TaskMover(hierarchy()).wait_empty(path, moveto, timeout)
+        sp.set(left=len(left))
+    return left
+
 def lookup_task_from_proc(pid):
     """lookup the cpuset of the specified pid from proc filesystem"""
     log.debug("entering lookup_task_from_proc, pid = %s", str(pid))
     path = "/proc/"+str(pid)+"/cpuset"
-    if os.access(path, os.F_OK):
-        f = io.open(path,encoding="iso8859-1")
-        set = f.readline().strip()
-        f.close()
+    if backend.exists(path):
+        set = backend.read(path).strip()
         log.debug('lookup_task_from_proc: found task %s cpuset: %s', str(pid), set)
         return set
     # FIXME: add search for threads here...
@@ -264,11 +309,12 @@ def lookup_task_from_cpusets(pid):
     global RootSet
     if RootSet == None: rescan()
     gotit = None
-    if pid in RootSet.tasks:
+    pid = int(pid)
+    if pid in RootSet.task_ids:
         gotit = RootSet
     else:
         for node in walk_set(RootSet):
-            if pid in node.tasks:
+            if pid in node.task_ids:
                 gotit = node
                 break
     if gotit:
@@ -296,6 +342,7 @@ def find_sets(name):
     nodelist = []
     if name.find('/') == -1:
         log.debug("find by name")
+        if RootSet == None: rescan()
         if name == 'root':
             log.debug("returning root set")
             nodelist.append(RootSet)
@@ -309,6 +356,14 @@ def find_sets(name):
         log.debug("find by path")
         # make sure that leading slash is used if searching by path
         if name[0] != '/': name = '/' + name
+        if RootSet == None:
+            # no need to discover all cpusets to find one by its path
+            if name == '/':
+                rescan()
+            elif name not in CpuSet.sets:
+                locate()
+                if backend.exists(CpuSet.basepath + name + CpuSet.cpus_path):
+                    CpuSet(CpuSet.basepath + name)
         if name in CpuSet.sets:
             log.debug('... found node "%s"', CpuSet.sets[name].name)
             nodelist.append(CpuSet.sets[name])
@@ -328,18 +383,101 @@ def walk_set(set):
             log.debug("++++++ yield %s", node.name) 
             yield result 
 
-def rescan():
-    """re-read the cpuset directory to sync system with data structs"""
-    log.debug("entering rescan")
-    global RootSet, maxcpu, allcpumask
-    RootSet = CpuSet()
-    # figure out system properties
-    log.debug("rescan: all cpus = %s", RootSet.cpus)
-    maxcpu = int(RootSet.cpus.split('-')[-1].split(',')[-1])
+class HierarchyWatcher(object):
+    """notice cpusets created, removed or renamed since the last rescan
+
+    Used by long-running users of the model (cset daemon) so that the
+    hierarchy does not have to be walked again for every operation.
+    inotify is used when available, otherwise the directory tree is
+    compared against a snapshot taken when the model was built.
+    """
+    mask = (Inotify.IN_CREATE | Inotify.IN_DELETE | Inotify.IN_MOVED_FROM |
+            Inotify.IN_MOVED_TO | Inotify.IN_DELETE_SELF | Inotify.IN_ONLYDIR)
+
+    def __init__(self):
+        try:
+            if backend != kernel:
+                raise OSError('not watching a simulated hierarchy')
+            self.inotify = Inotify()
+        except (OSError, AttributeError) as err:
+            log.debug("inotify not available (%s), using tree snapshots", err)
+            self.inotify = None
+        self.snapshot = None
+
+    def tree(self):
+        l = []
+        for dir, dirs, files in backend.walk(CpuSet.basepath):
+            l.append(dir)
+        return frozenset(l)
+
+    def watch(self):
+        """arm the watcher for the sets currently in the model"""
+        if self.inotify:
+            for path in CpuSet.sets:
+                try:
+                    self.inotify.add_watch(CpuSet.basepath + path, self.mask)
+                except OSError as err:
+                    # raced with a removal, next rescan will sort it out
+                    log.debug("cannot watch %s: %s", path, err)
+        else:
+            self.snapshot = self.tree()
+
+    def pending(self):
+        """return True if the hierarchy changed, does not consume the change"""
+        if self.inotify:
+            return self.inotify.pending()
+        return self.snapshot != self.tree()
+
+    def drain(self):
+        """like pending(), but consume the change notifications"""
+        if self.inotify:
+            return len(self.inotify.read()) > 0
+        return self.pending()
+
+def locate(force=False):
+    """find the cpuset filesystem, its file names and the cpus of the
+       system, without discovering the cpusets"""
+    global maxcpu, allcpumask
+    if CpuSet.basepath and not force:
+        return
+    with trace.span('locate'):
+        _locate()
+
+def _locate():
+    global maxcpu, allcpumask
+    path = CpuSet.locate_cpusets()
+    CpuSet.basepath = path
+    # if mounted as a cgroup controller, switch file name format
+    prefix = '/' if backend.exists(path + '/cpus') else '/cpuset.'
+    CpuSet.cpus_path = prefix + 'cpus'
+    CpuSet.mems_path = prefix + 'mems'
+    CpuSet.cpu_exclusive_path = prefix + 'cpu_exclusive'
+    CpuSet.mem_exclusive_path = prefix + 'mem_exclusive'
+    cpus = backend.read(path + CpuSet.cpus_path).strip()
+    log.debug("locate: all cpus = %s", cpus)
+    maxcpu = int(cpus.split('-')[-1].split(',')[-1])
     log.debug("        max cpu = %s", maxcpu)
-    allcpumask = calc_cpumask(maxcpu)
+    # cpus taken offline leave holes, the mask is of the cpus there are
+    allcpumask = '%x' % sum([1 << c for c in cpuspec_to_ints(cpus)])
     log.debug("        allcpumask = %s", allcpumask)
 
+def rescan(force=False):
+    """re-read the cpuset directory to sync system with data structs"""
+    log.debug("entering rescan")
+    global RootSet
+    if watcher and RootSet and not force and not watcher.pending():
+        log.debug("rescan: hierarchy unchanged, keeping model")
+        return
+    # consume the changes before the walk, any made during it show up
+    # at the next rescan; there are none before the first one
+    if watcher and RootSet: watcher.drain()
+    # also figures out system properties, maxcpu and allcpumask
+    with trace.span('discover') as sp:
+        RootSet = CpuSet()
+        sp.set(sets=len(CpuSet.sets))
+    stats.count('sets_discovered', len(CpuSet.sets))
+    if watcher: watcher.watch()
+
 def cpuspec_check(cpuspec, usemax=True):
     """check format of cpuspec for validity"""
     log.debug("cpuspec_check(%s)", cpuspec)
@@ -449,10 +587,11 @@ def cpuspec_inverse(cpuspec):
 def summary(set):
     """return summary of cpuset with number of tasks running"""
     log.debug("entering summary, set=%s", set.path)
-    if len(set.tasks) == 1: msg = 'task'
+    nt = len(set.task_ids)
+    if nt == 1: msg = 'task'
     else: msg = 'tasks'
     return ('"%s" cpuset of CPUSPEC(%s) with %s %s running' %
-            (set.name, set.cpus, len(set.tasks), msg) )
+            (set.name, set.cpus, nt, msg) )
             
 def calc_cpumask(max):
     all = 1
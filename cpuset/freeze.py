@@ -0,0 +1,171 @@
+"""Freeze processes while their threads are moved between cpusets
+
+A frozen process cannot create threads, so all of its threads are
+moved in one pass.  With the cgroup v1 freezer the processes are put
+into a freezer cgroup of their own for the move and returned to their
+previous freezer cgroups afterwards, nothing else is frozen.  With
+cgroup v2 there is no such private group: cgroup.freeze freezes the
+whole cgroup of each process, which is only done if cset itself does
+not run in that cgroup.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, time, logging
+
+from cpuset import config
+from cpuset import cset
+from cpuset.util import *
+
+log = logging.getLogger('freeze')
+
+def mounts():
+    """return the mount points of the v1 freezer and of cgroup v2, None
+       for those not mounted"""
+    v1 = v2 = None
+    for line in cset.backend.read('/proc/mounts').splitlines():
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        if fields[2] == 'cgroup' and 'freezer' in fields[3].split(','):
+            v1 = v1 or fields[1]
+        elif fields[2] == 'cgroup2':
+            v2 = v2 or fields[1]
+    return v1, v2
+
+def cgroup_of(pid, controller):
+    """the cgroup of pid in the v1 hierarchy of controller, or with
+       controller '' in the v2 hierarchy; None if the task is gone"""
+    try:
+        data = cset.backend.read('/proc/%s/cgroup' % pid)
+    except (IOError, OSError):
+        return None
+    for line in data.splitlines():
+        num, ctrls, path = line.split(':', 2)
+        if (controller in ctrls.split(',')) if controller else num == '0':
+            return path
+    return None
+
+class Freezer(object):
+    """freezes the processes of tasks on enter and thaws them on exit;
+       without a freezer, entering raises a CpusetException"""
+    def __init__(self, tasks, timeout=None):
+        self.tasks = list(tasks)
+        self.timeout = config.freeze_timeout if timeout == None else timeout
+        self.v1, self.v2 = mounts()
+        self.group = None       # v1: our freezer cgroup
+        self.origin = {}        # v1: pid -> previous freezer cgroup
+        self.frozen = []        # v2: cgroups we froze
+
+    def __enter__(self):
+        if self.v1:
+            self.freeze_v1()
+        elif self.v2:
+            self.freeze_v2()
+        else:
+            raise CpusetException('no cgroup freezer available to --freeze')
+        return self
+
+    def __exit__(self, *exc):
+        if self.group:
+            self.thaw_v1()
+        for path in self.frozen:
+            self.write(path + '/cgroup.freeze', '0')
+        self.frozen = []
+
+    def write(self, path, value):
+        try:
+            cset.backend.write(path, value)
+        except (IOError, OSError) as err:
+            raise CpusetException('cannot write "%s" to %s: %s' %
+                                  (value, path, err.strerror))
+
+    def wait(self, path, done):
+        """poll file path until done(contents) or the timeout"""
+        end = time.time() + self.timeout
+        while not done(cset.backend.read(path)):
+            if time.time() > end:
+                raise CpusetException('tasks did not freeze within %ss' %
+                                      self.timeout)
+            time.sleep(0.001)
+
+    def freeze_v1(self):
+        self.group = '%s/cset-%d' % (self.v1, os.getpid())
+        cset.backend.mkdir(self.group)
+        try:
+            for task in self.tasks:
+                if int(task) == os.getpid():
+                    continue
+                origin = cgroup_of(task, 'freezer')
+                if origin == None or origin == self.group[len(self.v1):]:
+                    # gone, or a thread of a process already moved
+                    continue
+                try:
+                    # cgroup.procs moves all threads of the process at once
+                    cset.backend.write(self.group + '/cgroup.procs', str(task))
+                    self.origin[task] = origin
+                except (IOError, OSError) as err:
+                    log.debug('cannot freeze task %s: %s', task, err)
+            self.write(self.group + '/freezer.state', 'FROZEN')
+            self.wait(self.group + '/freezer.state',
+                      lambda s: s.strip() == 'FROZEN')
+        except:
+            self.thaw_v1()
+            raise
+        log.debug('froze %d processes in %s', len(self.origin), self.group)
+
+    def thaw_v1(self):
+        self.write(self.group + '/freezer.state', 'THAWED')
+        for task, origin in self.origin.items():
+            try:
+                cset.backend.write(self.v1 + origin.rstrip('/') + '/cgroup.procs',
+                                   str(task))
+            except (IOError, OSError) as err:
+                log.debug('cannot return task %s to %s: %s', task, origin, err)
+        self.origin = {}
+        try:
+            cset.backend.rmdir(self.group)
+        except OSError as err:
+            log.warning('cannot remove freezer cgroup %s: %s', self.group,
+                        err.strerror)
+        self.group = None
+
+    def freeze_v2(self):
+        mine = cgroup_of(os.getpid(), '')
+        groups = []
+        for task in self.tasks:
+            path = cgroup_of(task, '')
+            if path == None or path in groups:
+                continue
+            if path == mine:
+                raise CpusetException('cannot --freeze task %s, it shares '
+                                      'cgroup %s with cset' % (task, path))
+            groups.append(path)
+        try:
+            for path in groups:
+                path = self.v2 + path.rstrip('/')
+                self.write(path + '/cgroup.freeze', '1')
+                self.frozen.append(path)
+                self.wait(path + '/cgroup.events',
+                          lambda s: 'frozen 1' in s.splitlines())
+        except:
+            self.__exit__()
+            raise
+        log.debug('froze cgroups %s', self.frozen)
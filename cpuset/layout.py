@@ -0,0 +1,486 @@
+"""Declarative cpuset layouts and minimal change planning
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import json, logging, configparser
+
+from cpuset import api
+from cpuset import cset
+from cpuset import trace
+from cpuset import watch
+from cpuset.util import *
+
+log = logging.getLogger('layout')
+
+PROPS = ('cpus', 'mems')
+FLAGS = ('cpu_exclusive', 'mem_exclusive')
+
+def depth(path):
+    return 0 if path == '/' else path.count('/')
+
+def parent_of(path):
+    return path[:path.rfind('/')] or '/'
+
+def to_bool(name, key, val):
+    if isinstance(val, bool):
+        return val
+    val = str(val).lower()
+    if val in ('yes', 'on', 'true', '1'):
+        return True
+    if val in ('no', 'off', 'false', '0'):
+        return False
+    raise CpusetException('set "%s": %s must be yes or no' % (name, key))
+
+class SetSpec(object):
+    """desired state of one cpuset, None means leave as is"""
+    keys = PROPS + FLAGS + ('absent',)
+
+    def __init__(self, path, items):
+        if not path.startswith('/'): path = '/' + path
+        if len(path) > 1: path = path.rstrip('/')
+        self.path = path
+        for key in items:
+            if key not in SetSpec.keys:
+                raise CpusetException('set "%s" has unknown key "%s"' % (path, key))
+        self.cpus = None
+        self.mems = None
+        if items.get('cpus') != None:
+            self.cpus = cset.cpuspec_to_ints(str(items['cpus']))
+        if items.get('mems') != None:
+            cset.memspec_check(str(items['mems']))
+            self.mems = cset.cpuspec_to_ints(str(items['mems']))
+        self.cpu_exclusive = None
+        self.mem_exclusive = None
+        for flag in FLAGS:
+            if items.get(flag) != None:
+                setattr(self, flag, to_bool(path, flag, items[flag]))
+        self.absent = to_bool(path, 'absent', items.get('absent', False))
+        if self.path == '/' and (self.absent or self.cpus != None or self.mems != None):
+            raise CpusetException('the root cpuset cannot be changed')
+
+class Layout(object):
+    """desired sets and task placement rules"""
+    def __init__(self, sets, rules):
+        self.sets = {}
+        for spec in sets:
+            if spec.path in self.sets:
+                raise CpusetException('set "%s" specified twice' % spec.path)
+            self.sets[spec.path] = spec
+        self.rules = rules
+
+def read_layout(path):
+    """read a layout from an ini or JSON file
+
+    In ini format, sections named "set PATH" describe cpusets and
+    sections named "rule NAME" describe task placement rules (see
+    cpuset.watch for the rule keys).  The JSON format is an object
+    with a "sets" object keyed by path and a "rules" list or object.
+    """
+    log.debug('reading layout from %s', path)
+    try:
+        f = open(path)
+        text = f.read()
+        f.close()
+    except (IOError, OSError) as err:
+        raise CpusetException('cannot read layout "%s": %s' % (path, err))
+    if text.lstrip().startswith('{'):
+        try:
+            data = json.loads(text)
+        except ValueError as err:
+            raise CpusetException('layout "%s": %s' % (path, err))
+        sets = [SetSpec(p, v) for p, v in data.get('sets', {}).items()]
+        rules = data.get('rules', [])
+        if isinstance(rules, dict):
+            rules = [watch.Rule(n, v) for n, v in rules.items()]
+        else:
+            rules = [watch.Rule(v.pop('name', 'rule%d' % i), v)
+                     for i, v in enumerate(rules)]
+        return Layout(sets, rules)
+    cf = configparser.ConfigParser(interpolation=None)
+    try:
+        cf.read_string(text, path)
+    except configparser.Error as err:
+        raise CpusetException('layout "%s": %s' % (path, err))
+    sets = []
+    rsecs = []
+    for sec in cf.sections():
+        kind, sep, name = sec.partition(' ')
+        if kind == 'set' and name.strip():
+            sets.append(SetSpec(name.strip(), dict(cf.items(sec))))
+        elif kind == 'rule' and name.strip():
+            rsecs.append(sec)
+        else:
+            raise CpusetException('layout "%s": unknown section [%s]' % (path, sec))
+    rules = watch.rules_from_config(cf, rsecs)
+    for rule in rules:
+        rule.name = rule.name[5:].strip()
+    return Layout(sets, rules)
+
+class State(object):
+    """current state of an api.Hierarchy, each file is read at most once,
+       by default the hierarchy of the cset model"""
+    def __init__(self, hierarchy=None):
+        if hierarchy == None and cset.CpuSet.basepath:
+            hierarchy = cset.hierarchy()
+        self.hierarchy = hierarchy
+        self.cache = {}
+
+    def exists(self, path):
+        return self.hierarchy.exists(path)
+
+    def children(self, path):
+        return [s.path for s in api.CpuSet(self.hierarchy, path).children]
+
+    def paths(self):
+        return [s.path for s in self.hierarchy.sets()]
+
+    def read(self, path, prop):
+        node = api.CpuSet(self.hierarchy, path)
+        if prop == 'tasks':
+            return [str(t) for t in node.tasks]
+        return getattr(node, prop)
+
+    def get(self, path, prop):
+        if (path, prop) not in self.cache:
+            self.cache[(path, prop)] = self.read(path, prop)
+        return self.cache[(path, prop)]
+
+    def subtree(self, path):
+        l = [path]
+        for child in self.children(path):
+            l.extend(self.subtree(child))
+        return l
+
+    def task(self, pid, path):
+        return watch.Task(pid, path)
+
+def value(prop, val):
+    if prop in PROPS:
+        return cset.ints_to_cpuspec(val)
+    return '1' if val else '0'
+
+def resolve(layout, state, name):
+    """return the path of a set named in a rule"""
+    if name == 'root': return '/'
+    if name.startswith('/'):
+        return name if len(name) == 1 else name.rstrip('/')
+    found = [p for p in layout.sets if p.split('/')[-1] == name
+             and not layout.sets[p].absent]
+    if len(found) == 1: return found[0]
+    if len(found) > 1:
+        raise CpusetNotUnique('cpuset name "%s" not unique: %s' % (name, found))
+    return cset.unique_set(name).path
+
+def plan(layout, state):
+    """compute the ordered operations that turn state into layout
+
+    Operations are tuples ('mkdir', path), ('write', path, prop, value,
+    old value), ('move', path, tasks) and ('rmdir', path).  Writes are
+    ordered so that every intermediate state is one the kernel accepts:
+    unwanted exclusive flags are dropped first, unwanted sets removed,
+    sets shrunk bottom-up, created and grown top-down, exclusive flags
+    set top-down and finally the tasks placed.  A set whose children
+    move to cpus it does not keep is narrowed only after they moved.  Exclusive flags that
+    would make an intermediate write collide with a sibling are dropped
+    up front and restored at the end.  A state that already matches the
+    layout yields no operations.
+    """
+    unflag = set()
+    for attempt in range(4):
+        with trace.span('plan', attempt=attempt) as sp:
+            ops, conflicts = _plan(layout, state, unflag)
+            sp.set(ops=len(ops), conflicts=len(conflicts))
+        if len(conflicts) == 0:
+            return ops
+        log.debug('exclusive flags in the way: %s', conflicts)
+        unflag |= conflicts
+    raise CpusetException('cannot order changes, exclusive cpusets %s overlap'
+                          % sorted([c[0] for c in conflicts]))
+
+def _plan(layout, state, unflag):
+    ops = []
+    cur = {}
+    alive = {}
+    conflicts = set()
+    def exists(path):
+        if path not in alive:
+            alive[path] = state.exists(path)
+        return alive[path]
+    def current(path, prop):
+        if (path, prop) not in cur:
+            cur[(path, prop)] = state.get(path, prop) if state.exists(path) else None
+        return cur[(path, prop)]
+    def siblings(path):
+        par = parent_of(path)
+        l = state.children(par) if state.exists(par) else []
+        l.extend([p for p in layout.sets if p != '/' and parent_of(p) == par
+                  and not state.exists(p)])
+        return [p for p in l if p != path and exists(p)]
+    def write(path, prop, val):
+        if prop in PROPS:
+            # the kernel refuses overlaps if either sibling is exclusive
+            flag = FLAGS[PROPS.index(prop)]
+            for sib in siblings(path):
+                if (current(sib, prop) and val & current(sib, prop)):
+                    if current(path, flag): conflicts.add((path, flag))
+                    if current(sib, flag): conflicts.add((sib, flag))
+        ops.append(('write', path, prop, value(prop, val),
+                    None if current(path, prop) == None else
+                    value(prop, current(path, prop))))
+        cur[(path, prop)] = val
+    def wanted(path, prop):
+        spec = layout.sets.get(path)
+        if spec and not spec.absent and getattr(spec, prop) != None:
+            return getattr(spec, prop)
+        return current(path, prop)
+    def inside(path, top):
+        return (path + '/').startswith(top + '/')
+    def held(path, prop):
+        # what the live children of path hold, it has to keep that
+        l = [current(c, prop) for c in state.children(path) if exists(c)]
+        return frozenset().union(*[c for c in l if c])
+
+    present = [s for s in layout.sets.values() if not s.absent]
+    present.sort(key=lambda s: depth(s.path))
+    absent = [s for s in layout.sets.values() if s.absent]
+    absent.sort(key=lambda s: depth(s.path))
+
+    # validate the final state before touching anything
+    for spec in present:
+        par = parent_of(spec.path)
+        for p in layout.sets:
+            if layout.sets[p].absent and inside(spec.path, p):
+                raise CpusetException('set "%s" is inside absent set "%s"'
+                                      % (spec.path, p))
+        if not state.exists(par) and par not in layout.sets:
+            raise CpusetException('parent of set "%s" does not exist' % spec.path)
+        if not state.exists(spec.path):
+            if spec.cpus == None:
+                raise CpusetException('new set "%s" needs cpus' % spec.path)
+            if spec.mems == None:
+                spec.mems = frozenset([0])
+        if spec.path == '/': continue
+        for prop in PROPS:
+            if not wanted(spec.path, prop) <= wanted(par, prop):
+                raise CpusetException('%s of set "%s" not within its parent "%s"'
+                                      % (prop, spec.path, par))
+            if state.exists(spec.path):
+                for child in state.children(spec.path):
+                    if (child not in layout.sets and
+                        not current(child, prop) <= wanted(spec.path, prop)):
+                        raise CpusetException('%s of set "%s" would not fit '
+                                              'into "%s"' % (prop, child, spec.path))
+            if getattr(spec, prop) != None and len(getattr(spec, prop)) == 0:
+                raise CpusetException('set "%s" would have no %s' % (spec.path, prop))
+            flag = FLAGS[PROPS.index(prop)]
+            for sib in siblings(spec.path):
+                if len([p for p in absent if inside(sib, p.path)]): continue
+                if ((wanted(spec.path, flag) or wanted(sib, flag)) and
+                    wanted(spec.path, prop) & wanted(sib, prop)):
+                    raise CpusetException('%s of exclusive sets "%s" and "%s" '
+                                          'would overlap' % (prop, spec.path, sib))
+
+    # drop exclusive flags that are not wanted or in the way
+    for spec in present:
+        if not state.exists(spec.path): continue
+        for flag in FLAGS:
+            if getattr(spec, flag) == False and current(spec.path, flag):
+                write(spec.path, flag, False)
+    for path, flag in sorted(unflag):
+        if current(path, flag):
+            write(path, flag, False)
+
+    # remove unwanted sets, their tasks go to the surviving ancestor
+    gone = []
+    for spec in absent:
+        if not state.exists(spec.path): continue
+        if len([p for p in gone if inside(spec.path, p)]):
+            continue
+        gone.append(spec.path)
+        subtree = state.subtree(spec.path)
+        tasks = []
+        for path in subtree:
+            tasks.extend(state.get(path, 'tasks'))
+        if len(tasks):
+            ops.append(('move', parent_of(spec.path), tasks))
+        subtree.sort(key=depth, reverse=True)
+        for path in subtree:
+            ops.append(('rmdir', path))
+            alive[path] = False
+
+    # shrink bottom-up so children never stick out of their parents
+    for spec in reversed(present):
+        if not state.exists(spec.path): continue
+        for prop in PROPS:
+            want = getattr(spec, prop)
+            have = current(spec.path, prop)
+            if want == None or want >= have: continue
+            mid = (want & have) | held(spec.path, prop)
+            if len(mid) and mid != have: write(spec.path, prop, mid)
+
+    # create and grow top-down so parents are ready for their children,
+    # sets that trade all their cpus go first to make room for the rest
+    def trades(spec):
+        return len([p for p in PROPS if getattr(spec, p) != None and
+                    not getattr(spec, p) & (current(spec.path, p) or frozenset())])
+    # a set keeps the cpus its children still hold until they moved
+    narrow = []
+    for spec in sorted(present, key=lambda s: (depth(s.path), -trades(s))):
+        if not exists(spec.path):
+            ops.append(('mkdir', spec.path))
+            alive[spec.path] = True
+        for prop in PROPS:
+            want = getattr(spec, prop)
+            if want == None or want == current(spec.path, prop): continue
+            val = want | held(spec.path, prop) if state.exists(spec.path) else want
+            if val != current(spec.path, prop):
+                write(spec.path, prop, val)
+            if val != want:
+                narrow.append((spec.path, prop, want))
+    for path, prop, want in sorted(narrow, key=lambda n: depth(n[0]), reverse=True):
+        write(path, prop, want)
+
+    # exclusive flags last, parents first
+    restore = set([(spec.path, flag) for spec in present for flag in FLAGS
+                   if getattr(spec, flag)])
+    restore |= set([(path, flag) for path, flag in unflag
+                    if exists(path) and state.exists(path) and
+                    state.get(path, flag) and
+                    getattr(layout.sets.get(path), flag, None) != False])
+    for path, flag in sorted(restore, key=lambda r: (depth(r[0]), r)):
+        if not current(path, flag):
+            write(path, flag, True)
+
+    # place tasks, the first matching rule wins
+    if len(layout.rules):
+        moves = {}
+        targets = {}
+        for rule in layout.rules:
+            targets[rule] = resolve(layout, state, rule.set)
+            if rule.fromset:
+                rule.fromset = resolve(layout, state, rule.fromset)
+        if len([r for r in layout.rules if not r.fromset]):
+            sources = state.paths()
+        else:
+            sources = list(set([r.fromset for r in layout.rules]))
+        for path in sources:
+            if not state.exists(path): continue
+            where = path
+            for top in gone:
+                if inside(path, top):
+                    # already moved to the surviving ancestor above
+                    where = parent_of(top)
+            for pid in state.get(path, 'tasks'):
+                task = state.task(pid, where)
+                for rule in layout.rules:
+                    if rule.matches(task):
+                        if targets[rule] != where:
+                            moves.setdefault(targets[rule], []).append(pid)
+                        break
+        for path in sorted(moves):
+            ops.append(('move', path, moves[path]))
+
+    return ops, conflicts - unflag
+
+def describe(op):
+    """return a one line description of an operation"""
+    if op[0] == 'write':
+        if op[4] == None:
+            return 'write %s %s = %s' % (op[1], op[2], op[3])
+        return 'write %s %s = %s (was %s)' % (op[1], op[2], op[3], op[4])
+    if op[0] == 'move':
+        return 'move %s tasks to %s' % (len(op[2]), op[1])
+    return '%s %s' % (op[0], op[1])
+
+def op_record(op):
+    """return an operation as a dict, the record of structured output"""
+    rec = {'type': 'op', 'op': op[0], 'path': op[1]}
+    if op[0] == 'write':
+        rec.update({'prop': op[2], 'value': op[3], 'old': op[4]})
+    elif op[0] == 'move':
+        rec['tasks'] = [int(t) for t in op[2]]
+    return rec
+
+def execute(ops, hierarchy=None):
+    """carry out planned operations as one transaction
+
+    The old value of everything that is changed is journaled.  If an
+    operation fails, the completed ones are undone in reverse order
+    before the error is passed on; tasks that were already moved are
+    left where they are.  Without a hierarchy the operations apply to
+    the cset model, which is rescanned once at the end.
+    """
+    rescan = hierarchy == None
+    if rescan:
+        hierarchy = cset.hierarchy()
+    mover = api.TaskMover(hierarchy)
+    def propfile(path, prop):
+        return hierarchy.file(path, prop)
+    def do(op):
+        if op[0] == 'mkdir':
+            hierarchy.backend.mkdir(hierarchy.dir(op[1]))
+        elif op[0] == 'rmdir':
+            if rescan:
+                left = cset.wait_empty(op[1], parent_of(op[1]))
+            else:
+                left = mover.wait_empty(op[1], parent_of(op[1]))
+            if len(left) > 0:
+                raise CpusetException('tasks still running in "%s": %s' %
+                                      (op[1], ' '.join(left)))
+            hierarchy.backend.rmdir(hierarchy.dir(op[1]))
+        elif op[0] == 'write':
+            hierarchy.backend.write(propfile(op[1], op[2]), op[3])
+        elif op[0] == 'move':
+            res = mover.move(op[2], op[1])
+            if len(res.unmovable):
+                log.info('**> %s tasks are not movable into %s',
+                         len(res.unmovable), op[1])
+    journal = []
+    try:
+        for op in ops:
+            log.debug('-> %s', describe(op))
+            undo = []
+            if op[0] == 'mkdir':
+                undo = [('rmdir', op[1])]
+            elif op[0] == 'write' and op[4] != None:
+                undo = [('write', op[1], op[2], op[4], op[3])]
+            elif op[0] == 'rmdir':
+                undo = [('mkdir', op[1])]
+                for prop in PROPS + FLAGS:
+                    old = hierarchy.backend.read(propfile(op[1], prop)).strip()
+                    undo.append(('write', op[1], prop, old, None))
+            with trace.span(op[0], path=op[1]):
+                do(op)
+            journal.append(undo)
+    except (IOError, OSError, CpusetException) as err:
+        log.info('**> %s failed: %s', describe(op), err)
+        if len(journal):
+            log.info('**> rolling back %s completed operations', len(journal))
+        for undo in reversed(journal):
+            for uop in undo:
+                log.debug('<- %s', describe(uop))
+                try:
+                    do(uop)
+                except (IOError, OSError) as uerr:
+                    log.info('**> rollback of %s failed: %s', describe(uop), uerr)
+        raise
+    finally:
+        if rescan: cset.rescan()
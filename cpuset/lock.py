@@ -0,0 +1,206 @@
+"""Advisory locks that keep concurrent cset runs apart
+
+Commands lock the subtrees of the cpusets they work on with fcntl(2)
+record locks on the lock file config.lock_file, listings with shared
+locks and changes with exclusive ones.  Each cpuset owns a byte range
+of the lock file that holds the ranges of all of its children, so a
+lock on a set covers its subtree, conflicts with locks of its parents
+and children, and leaves the sets next to it alone.  The range of a
+child is picked by a hash of its name, sets that get the same range
+only lock more than they have to.  Below DEPTH levels the sets share
+the range of their parent at that level.
+
+The locks are advisory, tools other than cset do not see them.  They
+are released when cset exits or executes a program.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, time, errno, fcntl, struct, binascii, logging, contextlib
+
+from cpuset import config
+from cpuset import trace
+from cpuset.util import *
+
+log = logging.getLogger('cset')
+
+FANOUT = 256
+DEPTH = 7
+
+# struct flock of Linux: type, whence, start, len, pid
+_flock = struct.Struct('hhqqi')
+
+held = None             # the Lock this process holds
+
+def span(path):
+    """the (start, length) of the byte range of the subtree of path"""
+    start, length = 0, FANOUT ** DEPTH
+    for name in [n for n in path.split('/') if n][:DEPTH]:
+        length //= FANOUT
+        start += (binascii.crc32(name.encode()) % FANOUT) * length
+    return start, length
+
+def ranges(paths):
+    """the byte ranges of paths in ascending order, ranges inside
+       another one are left out"""
+    l = []
+    for start, length in sorted(set([span(p) for p in paths])):
+        if l and start < l[-1][0] + l[-1][1]:
+            continue
+        l.append((start, length))
+    return l
+
+def resolve(name):
+    """the path of a cpuset given by name or path; a name of no set is
+       taken as a set to be created below the root, a name that is not
+       unique as the root"""
+    from cpuset import cset
+    if name in (None, '', 'root'):
+        return '/'
+    if name.find('/') != -1:
+        return '/' + name.strip('/')
+    try:
+        return cset.unique_set(name).path
+    except CpusetNotFound:
+        return '/' + name
+    except CpusetException:
+        return '/'
+
+def holder(fd, exclusive, start, length):
+    """the pid of a process holding a lock that conflicts, or None"""
+    req = _flock.pack(fcntl.F_WRLCK if exclusive else fcntl.F_RDLCK, os.SEEK_SET,
+                      start, length, 0)
+    try:
+        res = fcntl.fcntl(fd, fcntl.F_GETLK, req)
+    except OSError:
+        return None
+    typ, whence, start, length, pid = _flock.unpack(res[:_flock.size])
+    return None if typ == fcntl.F_UNLCK else pid
+
+class Lock(object):
+    """the lock of the subtrees of the cpusets at paths, shared or
+       exclusive; timeout is in seconds, 0 not to wait and below 0 to
+       wait for as long as it takes"""
+    def __init__(self, paths, exclusive, timeout=None, path=None):
+        self.paths = sorted(set(paths)) or ['/']
+        self.exclusive = exclusive
+        self.timeout = config.lock_timeout if timeout == None else timeout
+        self.path = config.lock_file if path == None else path
+        self.fd = None
+        self.waited = 0.0
+        self.contended = False  # True if another process held it first
+
+    def mode(self):
+        return 'exclusive' if self.exclusive else 'shared'
+
+    def open(self):
+        """open the lock file, return False if there is none to be had"""
+        if not self.path:
+            return False
+        flags = os.O_RDWR | os.O_CREAT | os.O_CLOEXEC
+        try:
+            self.fd = os.open(self.path, flags, 0o644)
+        except OSError as err:
+            if self.exclusive or err.errno not in (errno.EACCES, errno.EROFS):
+                log.debug('not locking, cannot open %s: %s', self.path,
+                          err.strerror)
+                return False
+            # a shared lock only needs read access
+            try:
+                self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            except OSError as err:
+                log.debug('not locking, cannot open %s: %s', self.path,
+                          err.strerror)
+                return False
+        return True
+
+    def acquire(self):
+        """take the lock, raise CpusetException on timeout; return the
+           seconds waited"""
+        if not self.open():
+            return 0.0
+        op = fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH
+        start = time.time()
+        with trace.span('lock', paths=self.paths, mode=self.mode()) as sp:
+            try:
+                for rstart, rlen in ranges(self.paths):
+                    self.take(op, rstart, rlen, start)
+            except:
+                self.release()
+                raise
+            self.waited = time.time() - start
+            sp.set(waited=round(self.waited, 6))
+        return self.waited
+
+    def take(self, op, rstart, rlen, start):
+        pause = 0.001
+        while True:
+            try:
+                fcntl.lockf(self.fd, op | fcntl.LOCK_NB, rlen, rstart)
+                break
+            except OSError as err:
+                if err.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            pid = holder(self.fd, self.exclusive, rstart, rlen)
+            if not self.contended:
+                self.contended = True
+                log.debug('waiting for %s lock on %s, held by process %s',
+                          self.mode(), ', '.join(self.paths), pid)
+            if self.timeout >= 0 and time.time() - start >= self.timeout:
+                raise CpusetException(
+                    'timed out after %gs waiting for the lock on %s%s' %
+                    (self.timeout, ', '.join(self.paths),
+                     ', held by process %d' % pid if pid else ''))
+            time.sleep(pause)
+            pause = min(pause * 2, 0.05)
+
+    def release(self):
+        if self.fd != None:
+            # closing the file drops all locks of this process on it
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        global held
+        self.acquire()
+        held = self
+        if self.contended:
+            log.info('--> waited %.3fs for the %s lock on %s', self.waited,
+                     self.mode(), ', '.join(self.paths))
+        return self
+
+    def __exit__(self, *exc):
+        global held
+        held = None
+        self.release()
+        return False
+
+def locked(paths, exclusive, timeout=None):
+    """a context holding the lock on the subtrees of paths; locks do not
+       nest, inside another one this is a no-op"""
+    if held != None:
+        return contextlib.nullcontext()
+    return Lock(paths, exclusive, timeout)
+
+def shared(*names):
+    return locked([resolve(n) for n in names], False)
+
+def exclusive(*names):
+    return locked([resolve(n) for n in names], True)
@@ -21,8 +21,9 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
 import sys, os
-from optparse import OptionParser
 from cpuset import config
+from cpuset import trace
+from cpuset import stats
 import cpuset.commands
 from cpuset.commands.common import CmdException
 from cpuset.util import CpusetException
@@ -65,6 +66,9 @@ commands = Commands({
     'set':          'set',
 #    'mem':          'mem',
     'proc':         'proc',
+    'apply':        'apply',
+    'export':       'export',
+    'daemon':       'daemon',
     })
 
 supercommands = (
@@ -80,7 +84,10 @@ def print_help():
     print('Global options:')
     print('  -l/--log <fname>       output debugging log in fname')
     print('  -m/--machine           print machine readable output')
+    print('  --format <fmt>         list as text, json or ndjson records')
     print('  -x/--tohex <CPUSPEC>   convert a CPUSPEC to hex')
+    print('  -t/--trace <fname>     append timed spans as JSON lines to fname')
+    print('  --stats                print time per phase and I/O counts at the end')
     print()
     print('Generic commands:')
     print('  help        print the detailed command usage')
@@ -99,6 +106,13 @@ def print_help():
         if not cmd in supercommands:
             _print_helpstring(cmd)
 
+def set_log_level():
+    """let the root logger pass only what a handler will output, such
+       that disabled log.debug() calls return before building a record"""
+    import logging
+    root = logging.getLogger('')
+    root.setLevel(min([h.level for h in root.handlers]))
+
 def main():
 
     # handle pipes better
@@ -118,6 +132,7 @@ def main():
     
     # configure logging
     import logging
+    global console
     console = logging.StreamHandler(sys.stdout)
     console.setLevel(logging.INFO)
     formatter = logging.Formatter(prog + ': %(message)s')
@@ -125,7 +140,10 @@ def main():
     logging.getLogger('').addHandler(console)
     global log
     log = logging.getLogger('')
-    log.setLevel(logging.DEBUG)
+    set_log_level()
+
+    if os.environ.get('CSET_TRACE'):
+        trace.enable(os.environ['CSET_TRACE'])
 
     try:
         debug_level = int(os.environ['CSET_DEBUG_LEVEL'])
@@ -135,6 +153,8 @@ def main():
         log.error('Invalid CSET_DEBUG_LEVEL environment variable')
         sys.exit(1)
 
+    # global options given, they win over the config file read later
+    overrides = {}
     while True:
         if len(sys.argv) == 1:
             log.error('no arguments, nothing to do!')
@@ -146,19 +166,32 @@ def main():
                 sys.exit(1)
             # FIXME: very fragile
             logfile = sys.argv[2]
-            #trace = logging.FileHandler('/var/log/cset.log', 'w')
-            trace = logging.FileHandler(logfile, 'a')
-            trace.setLevel(logging.DEBUG)
+            #loghandler = logging.FileHandler('/var/log/cset.log', 'w')
+            loghandler = logging.FileHandler(logfile, 'a')
+            loghandler.setLevel(logging.DEBUG)
             formatter = logging.Formatter('%(asctime)s %(name)-6s %(levelname)-8s %(message)s',
                                           '%y%m%d-%H:%M:%S')
-            trace.setFormatter(formatter)
-            logging.getLogger('').addHandler(trace)
+            loghandler.setFormatter(formatter)
+            logging.getLogger('').addHandler(loghandler)
+            set_log_level()
             log.debug("---------- STARTING ----------")
             from cpuset.version import version
             log.debug('Cpuset (cset) %s' % version)
             del(sys.argv[2])
             del(sys.argv[1])
             continue
+        if cmd == '--stats':
+            stats.enable()
+            del(sys.argv[1])
+            continue
+        if cmd in ['-t', '--trace']:
+            if len(sys.argv) < 3:
+                log.critical('not enough arguments')
+                sys.exit(1)
+            trace.enable(sys.argv[2])
+            del(sys.argv[2])
+            del(sys.argv[1])
+            continue
         if cmd in ['-h', '--help']:
            if len(sys.argv) >= 3:
                cmd = commands.canonical_cmd(sys.argv[2])
@@ -175,6 +208,7 @@ def main():
 
                 sys.argv[0] += ' %s' % cmd
                 command = commands[cmd]
+                from optparse import OptionParser
                 parser = OptionParser(usage = command.usage,
                                       option_list = command.options)
                 from pydoc import pager
@@ -190,8 +224,27 @@ def main():
             log.info(__copyright__)
             sys.exit(0)
         if cmd in ['-m', '--machine']:
-            config.mread = True
+            config.mread = overrides['mread'] = True
+            del(sys.argv[1])
+            continue
+        if cmd == '--format' or cmd.startswith('--format='):
+            from cpuset import output
+            if cmd == '--format':
+                if len(sys.argv) < 3:
+                    log.critical('not enough arguments')
+                    sys.exit(1)
+                config.format = sys.argv[2]
+                del(sys.argv[2])
+            else:
+                config.format = cmd[len('--format='):]
             del(sys.argv[1])
+            if config.format not in output.formats:
+                log.critical('format must be one of: %s' % ', '.join(output.formats))
+                sys.exit(1)
+            overrides['format'] = config.format
+            # keep stdout for the records
+            if output.structured():
+                console.setStream(sys.stderr)
             continue
         if cmd in ['-x', '--tohex']:
             if len(sys.argv) < 3:
@@ -211,21 +264,51 @@ def main():
 
         break
 
+    # only commands that do something are configurable
+    config.ReadConfigFiles()
+    for name in overrides:
+        setattr(config, name, overrides[name])
+
     # re-build the command line arguments
     cmd = commands.canonical_cmd(cmd)
     sys.argv[0] += ' %s' % cmd
     del(sys.argv[1])
     log.debug('cmdline: ' + ' '.join(sys.argv))
 
+    # hand the request to a running cset daemon if there is one
+    if (not logfile and trace.output == None and stats.current == None and
+        config.format == 'text' and cmd not in ('daemon', 'export') and
+        'CSET_NO_DAEMON' not in os.environ
+        and config.daemon_socket and os.path.exists(config.daemon_socket)):
+        from cpuset.commands import daemon
+        status = daemon.forward(cmd, sys.argv[1:])
+        if status != None:
+            sys.exit(status)
+
+    run_command(cmd, debug_level)
+
+def command_lock(command, options, args):
+    """the lock of a run of command, as its lock_scope() tells: None not
+       to lock, or (exclusive, names of cpusets), see cpuset.lock"""
+    scope = getattr(command, 'lock_scope', None)
+    scope = scope and scope(options, args)
+    if scope == None:
+        import contextlib
+        return contextlib.nullcontext()
+    from cpuset import lock
+    return lock.locked([lock.resolve(n) for n in scope[1]], scope[0])
+
+def run_command(cmd, debug_level=0):
+    """run canonical command cmd with options from sys.argv, exits"""
+    from optparse import OptionParser
     try:
-        # importing the cset class creates the model
-        log.debug("creating cpuset model")
-        import cpuset.cset
         command = commands[cmd]
         usage = command.usage.split('\n')[0].strip()
         parser = OptionParser(usage = usage, option_list = command.options)
         options, args = parser.parse_args()
-        command.func(parser, options, args)
+        with trace.span('command', cmd=cmd, args=sys.argv[1:]):
+            with command_lock(command, options, args):
+                command.func(parser, options, args)
     except (ValueError, OSError, IOError, CpusetException, CmdException) as err:
         log.critical('**> ' + str(err))
         if str(err).find('Permission denied') != -1:
@@ -238,5 +321,11 @@ def main():
             sys.exit(2)
     except KeyboardInterrupt:
         sys.exit(1)
+    finally:
+        if config.format == 'json':
+            from cpuset import output
+            output.finish()
+        if stats.current != None:
+            log.info('\n'.join(stats.current.report(config.mread)))
 
     sys.exit(0)
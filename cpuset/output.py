@@ -0,0 +1,59 @@
+"""Structured output of listings, selected with --format
+
+In the json and ndjson formats the listing commands hand the records
+of sets, tasks and shields to emit() instead of formatting lines.
+Every record is a dict with a "type" key.  ndjson writes each record
+on its own line as it comes, so that consumers can process listings
+of any size incrementally; json collects them and finish() writes one
+array.  Other messages go to stderr in these formats.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys
+
+from cpuset import config
+
+formats = ('text', 'json', 'ndjson')
+pending = []
+
+def structured():
+    """True if listings are to be emitted as records"""
+    return config.format in ('json', 'ndjson')
+
+def emit(record, out=None):
+    """output one record"""
+    import json
+    if config.format == 'ndjson':
+        (out or sys.stdout).write(json.dumps(record, sort_keys=True) + '\n')
+    else:
+        pending.append(record)
+
+def finish(out=None):
+    """write what was collected in json format"""
+    global pending
+    if config.format != 'json':
+        return
+    import json
+    out = out or sys.stdout
+    json.dump(pending, out, indent=1, sort_keys=True)
+    out.write('\n')
+    out.flush()
+    pending = []
@@ -0,0 +1,214 @@
+"""Batched reads of /proc for many tasks at a time
+
+The files are read through the backend of the cset model with
+read_many(), which on the kernel costs three system calls per file.
+Tasks that went away while being read are left out of the results.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import collections
+from array import array
+
+from cpuset import cset
+from cpuset.util import CpusetException
+
+# fields of /proc/<pid>/stat we use, numbered as in proc(5) from 1
+TaskStat = collections.namedtuple('TaskStat', 'tid state flags utime stime processor')
+STATE, FLAGS, UTIME, STIME, PROCESSOR = 3, 9, 14, 15, 39
+PF_KTHREAD = 0x00200000
+
+def parse_stat(tid, data):
+    """return the TaskStat of the contents of a stat file"""
+    # the command name may contain blanks and parentheses, skip it
+    fields = data[data.rfind(')')+2:].split()
+    return TaskStat(int(tid), fields[STATE-3], int(fields[FLAGS-3]),
+                    int(fields[UTIME-3]), int(fields[STIME-3]),
+                    int(fields[PROCESSOR-3]))
+
+def task_stats(tids, progress=None, backend=None):
+    """generate the TaskStat of each task or thread ID still running; if
+       given, progress is called with the number of tasks read so far"""
+    if backend == None: backend = cset.backend
+    tids = list(tids)
+    paths = ['/proc/%s/stat' % tid for tid in tids]
+    for nr, (tid, (path, data)) in enumerate(zip(tids,
+                                             backend.read_many(paths)), 1):
+        if progress: progress(nr)
+        if data:
+            yield parse_stat(tid, data)
+
+def thread_stats(pid):
+    """the TaskStat of every thread of process pid, empty if it is gone"""
+    try:
+        tids = cset.backend.listdir('/proc/%s/task' % pid)
+    except OSError:
+        return []
+    paths = ['/proc/%s/task/%s/stat' % (pid, tid) for tid in tids]
+    return [parse_stat(tid, data) for tid, (path, data)
+            in zip(tids, cset.backend.read_many(paths)) if data]
+
+def cpus_allowed(tid, backend=None):
+    """the cpus a task may run on, from its status file, None if it is
+       gone"""
+    if backend == None: backend = cset.backend
+    try:
+        return status_cpus(backend.read('/proc/%s/status' % tid))
+    except (IOError, OSError):
+        return None
+
+def status_cpus(data):
+    """the cpus of Cpus_allowed_list in the contents of a status file"""
+    for line in data.splitlines():
+        if line.startswith('Cpus_allowed_list:'):
+            return cset.cpuspec_to_ints(line.split(':')[1].strip())
+    return None
+
+TaskKind = collections.namedtuple('TaskKind', 'tid kthread cpus')
+TaskKind.__doc__ = """whether a task is a kernel thread and the cpus it may
+run on; cpus is None for userspace tasks until Classifier.cpus() asked"""
+
+class Classifier(object):
+    """tells kernel threads from userspace tasks by the PF_KTHREAD flag
+       of their stat file, and bound kernel threads (such as ksoftirqd/N)
+       from unbound ones by their allowed cpus.  Each task is read once
+       and remembered until forget(), tasks that are gone are None.
+       The tasks are read from backend, or if None from the backend of
+       the cset model."""
+    def __init__(self, backend=None):
+        self.kinds = {}         # task ID -> TaskKind
+        self.source = backend
+        self.backend = None
+
+    def forget(self):
+        self.kinds = {}
+
+    def classify(self, tids, progress=None):
+        """return {tid: TaskKind} of tids, for running tasks only; the
+           tasks not known yet are read in one batch, progress is called
+           with the number of tids classified so far"""
+        source = cset.backend if self.source == None else self.source
+        if self.backend is not source:
+            # task IDs of another system
+            self.forget()
+            self.backend = source
+        tids = [int(t) for t in tids]
+        new = [t for t in tids if t not in self.kinds]
+        if new:
+            kthreads = []
+            for tid in new:
+                self.kinds[tid] = None
+            known = len(tids) - len(new)
+            reading = progress and (lambda nr: progress(known + nr))
+            for st in task_stats(new, reading, self.backend):
+                if st.flags & PF_KTHREAD:
+                    kthreads.append(st.tid)
+                else:
+                    self.kinds[st.tid] = TaskKind(st.tid, False, None)
+            # only the affinity of kernel threads decides what cset does
+            # with them, read it for all of them up front
+            paths = ['/proc/%s/status' % t for t in kthreads]
+            for tid, (path, data) in zip(kthreads, self.backend.read_many(paths)):
+                if data:
+                    self.kinds[tid] = TaskKind(tid, True, status_cpus(data))
+        if progress: progress(len(tids))
+        return dict([(t, self.kinds[t]) for t in tids if self.kinds[t] != None])
+
+    def kind(self, tid):
+        """the TaskKind of a task, None if it is not running"""
+        return self.classify([tid]).get(int(tid))
+
+    def kthread(self, tid):
+        """True for kernel threads, None if the task is not running"""
+        kind = self.kind(tid)
+        return kind.kthread if kind else None
+
+    def kthreads(self, tids):
+        """the tasks of tids that are kernel threads, in order"""
+        kinds = self.classify(tids)
+        return [t for t in tids if int(t) in kinds and kinds[int(t)].kthread]
+
+    def userspace(self, tids):
+        """the tasks of tids that are running userspace tasks, in order"""
+        kinds = self.classify(tids)
+        return [t for t in tids if int(t) in kinds and not kinds[int(t)].kthread]
+
+    def cpus(self, tid):
+        """the cpus a task may run on, None if it is not running"""
+        kind = self.kind(tid)
+        if kind == None:
+            return None
+        if kind.cpus == None:
+            cpus = cpus_allowed(tid, self.backend)
+            if cpus == None:
+                return None
+            kind = self.kinds[kind.tid] = kind._replace(cpus=cpus)
+        return kind.cpus
+
+    def bound(self, tid):
+        """True for a task that may only run on one cpu"""
+        return len(self.cpus(tid) or ()) == 1
+
+    def unbound(self, tid):
+        """True for a task that may run on all cpus of the system"""
+        cpus = self.cpus(tid)
+        if cpus == None:
+            raise CpusetException('task %s not found, i.e. not running' % tid)
+        cset.locate()
+        return set(range(cset.maxcpu + 1)).issubset(cpus)
+
+    def unbound_tasks(self, tids):
+        """the tasks of tids that may run on all cpus, in order"""
+        self.classify(tids)
+        l = []
+        for tid in tids:
+            try:
+                if self.unbound(tid): l.append(tid)
+            except CpusetException:
+                pass
+        return l
+
+# the tasks seen by the current command
+classifier = Classifier()
+
+class CpuTimes(object):
+    """the busy and total clock ticks of each cpu, as arrays indexed by
+       cpu number, cpus that are offline have zeros"""
+    def __init__(self, busy, total):
+        self.busy = busy
+        self.total = total
+
+def cpu_times():
+    """read the per-cpu counters of /proc/stat"""
+    busy = array('Q')
+    total = array('Q')
+    for line in cset.backend.read('/proc/stat').splitlines():
+        if not line.startswith('cpu') or line.startswith('cpu '):
+            continue
+        fields = line.split()
+        cpu = int(fields[0][3:])
+        ticks = [int(f) for f in fields[1:9]]
+        while len(busy) <= cpu:
+            busy.append(0)
+            total.append(0)
+        # idle and iowait are the time the cpu had nothing to run
+        total[cpu] = sum(ticks)
+        busy[cpu] = total[cpu] - ticks[3] - ticks[4]
+    return CpuTimes(busy, total)
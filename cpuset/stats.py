@@ -0,0 +1,86 @@
+"""Per-phase times and I/O counters of one cset run
+
+Collection is off unless enable() was called; current is then the
+Stats object that the I/O paths count into.  Phases are the spans of
+cpuset.trace, each phase is charged its own time without the time of
+the phases nested in it, so the phase times add up to the command.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import time
+
+current = None
+
+class Stats(object):
+    """counters by name and [calls, seconds] by phase"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.counters = {}
+        self.phases = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def phase(self, name, seconds):
+        ph = self.phases.setdefault(name, [0, 0.0])
+        ph[0] += 1
+        ph[1] += seconds
+
+    def report(self, mread=False):
+        """return the lines of the breakdown"""
+        total = time.perf_counter() - self.start
+        l = []
+        if mread:
+            l.append('stats_total;%.6f' % total)
+            for name in sorted(self.phases):
+                l.append('stats_phase;%s;%s;%.6f' % (name, self.phases[name][0],
+                                                     self.phases[name][1]))
+            for name in sorted(self.counters):
+                l.append('stats_count;%s;%s' % (name, self.counters[name]))
+            return l
+        l.append('')
+        l.append('%-24s %8s %10s %6s' % ('Phase', 'Calls', 'Seconds', '%'))
+        l.append('%-24s %8s %10s %6s' % ('-'*24, '-'*8, '-'*10, '-'*6))
+        for name, ph in sorted(self.phases.items(), key=lambda x: -x[1][1]):
+            l.append('%-24s %8s %10.6f %6.1f' % (name, ph[0], ph[1],
+                                                100.0 * ph[1] / total if total else 0))
+        other = total - sum([ph[1] for ph in self.phases.values()])
+        l.append('%-24s %8s %10.6f %6.1f' % ('(startup and other)', '', other,
+                                            100.0 * other / total if total else 0))
+        l.append('%-24s %8s %10.6f' % ('total', '', total))
+        if len(self.counters):
+            l.append('')
+            l.append('%-24s %8s' % ('Counter', 'Value'))
+            l.append('%-24s %8s' % ('-'*24, '-'*8))
+            for name in sorted(self.counters):
+                l.append('%-24s %8s' % (name, self.counters[name]))
+        return l
+
+def enable():
+    """start collecting, return the Stats object"""
+    global current
+    current = Stats()
+    return current
+
+def count(name, n=1):
+    """count into the current Stats, if any"""
+    if current != None:
+        current.count(name, n)
@@ -0,0 +1,152 @@
+"""CPU utilization of cpusets, sampled at intervals
+
+Each sample reads the per-cpu counters of /proc/stat and the stat
+file of every task in the sets.  Between two samples a set is shown
+with:
+
+  busy     the time its cpus were busy, in percent of the cpus' time
+  tasks    the cpu time of the tasks in the set, in percent of the
+           time of its cpus; tasks may also run elsewhere if their
+           affinity allows it, or be crowded out by other sets
+  run/cpu  the runnable tasks of the set per cpu of the set, above 1
+           tasks are waiting for a cpu
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys, time, logging
+
+from cpuset import cset
+from cpuset import output
+from cpuset import procfs
+
+log = logging.getLogger('top')
+
+class Sample(object):
+    """the counters of the system and of the tasks of each set"""
+    def __init__(self, sets):
+        self.time = time.time()
+        self.cpu = procfs.cpu_times()
+        self.tasks = {}         # set path -> task IDs
+        for s in sets:
+            self.tasks[s.path] = s.task_ids
+        self.ticks = {}         # task ID -> utime + stime
+        self.running = set()
+        for st in procfs.task_stats([t for l in self.tasks.values() for t in l]):
+            self.ticks[st.tid] = st.utime + st.stime
+            if st.state == 'R': self.running.add(st.tid)
+
+class SetLoad(object):
+    """the utilization of one set between two samples, fractions of 1"""
+    def __init__(self, set, busy, taskcpu, runnable, tasks):
+        self.set = set
+        self.busy = busy
+        self.taskcpu = taskcpu
+        self.runnable = runnable
+        self.tasks = tasks
+
+class Top(object):
+    """samples the sets of the cset model"""
+    def __init__(self):
+        self.cpus = {}          # cpuspec -> cpu numbers
+        self.last = None
+
+    def cpus_of(self, cpuspec):
+        if cpuspec not in self.cpus:
+            self.cpus[cpuspec] = cset.cpuspec_to_ints(cpuspec)
+        return self.cpus[cpuspec]
+
+    def sets(self):
+        cset.rescan()
+        return [cset.RootSet] + list(cset.walk_set(cset.RootSet))
+
+    def sample(self):
+        """take a sample, return the SetLoads since the last one or None"""
+        sets = self.sets()
+        now = Sample(sets)
+        last, self.last = self.last, now
+        if last == None:
+            return None
+        busy = [a - b for a, b in zip(now.cpu.busy, last.cpu.busy)]
+        total = [a - b for a, b in zip(now.cpu.total, last.cpu.total)]
+        # tick counts are per cpu, their sum over the cpus of a set is
+        # the time the set had, in the same USER_HZ ticks as task times
+        loads = []
+        for s in sets:
+            cpus = [c for c in self.cpus_of(s.cpus) if c < len(total)]
+            setbusy = sum([busy[c] for c in cpus])
+            settotal = sum([total[c] for c in cpus])
+            ticks = 0
+            for tid in now.tasks[s.path]:
+                if tid in last.ticks and tid in now.ticks:
+                    ticks += now.ticks[tid] - last.ticks[tid]
+            runnable = len([t for t in now.tasks[s.path] if t in now.running])
+            loads.append(SetLoad(s, float(setbusy) / settotal if settotal else 0.0,
+                                 float(ticks) / settotal if settotal else 0.0,
+                                 float(runnable) / len(cpus) if cpus else 0.0,
+                                 len(now.tasks[s.path])))
+        return loads
+
+def header():
+    return ['        Name       CPUs  Busy%  Tasks% Run/CPU Tasks Path',
+            '------------ ---------- ------ ------- ------- ----- ----------']
+
+def line(load):
+    return '%12s %10s %6.1f %7.1f %7.2f %5d %s' % (
+        load.set.name[:12], load.set.cpus or '*****', 100 * load.busy,
+        100 * load.taskcpu, load.runnable, load.tasks, load.set.path)
+
+def record(load):
+    return {'type': 'top', 'name': load.set.name, 'path': load.set.path,
+            'cpus': load.set.cpus, 'busy': round(load.busy, 4),
+            'taskcpu': round(load.taskcpu, 4), 'runnable': round(load.runnable, 4),
+            'tasks': load.tasks}
+
+def run(interval=1.0, count=None, out=None):
+    """show the load of the sets every interval seconds, count times or
+       until interrupted; on a terminal each refresh replaces the last"""
+    out = out or sys.stdout
+    tty = out.isatty() and not output.structured()
+    if cset.watcher == None:
+        # only rediscover the sets when they change
+        cset.watcher = cset.HierarchyWatcher()
+    top = Top()
+    top.sample()
+    shown = 0
+    while count == None or shown < count:
+        time.sleep(interval)
+        loads = top.sample()
+        shown += 1
+        if output.structured():
+            for load in loads:
+                rec = record(load)
+                rec['time'] = round(top.last.time, 3)
+                output.emit(rec, out)
+            out.flush()
+            continue
+        l = header() + [line(load) for load in loads]
+        if tty:
+            # home the cursor, clear the screen below it
+            out.write('\033[H\033[J')
+            out.write(time.strftime('%H:%M:%S') + '  every %ss\n' % interval)
+        elif shown > 1:
+            out.write('\n')
+        out.write('\n'.join(l) + '\n')
+        out.flush()
@@ -0,0 +1,111 @@
+"""Timed spans of cset operations written as JSON lines
+
+Tracing is off unless enable() was called, span() then returns a shared
+do-nothing context manager unless cpuset.stats collects the time spent
+in each span.  When on, every span that ends writes one line such as
+
+    {"span": "discover", "start": 1546300800.123456, "dur": 0.004127,
+     "pid": 4711, "parent": "command", "sets": 12}
+
+to the trace file.  The start is wall clock time, dur is in seconds.
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, time
+
+from cpuset import stats
+
+output = None
+stack = []
+
+class NullSpan(object):
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def set(self, **attrs):
+        pass
+
+nullspan = NullSpan()
+
+class Span(object):
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """add attributes, e.g. counts only known at the end of the span"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = stack[-1].name if stack else None
+        self.nested = 0.0
+        stack.append(self)
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, typ, val, tb):
+        dur = time.perf_counter() - self.start
+        stack.pop()
+        if stack:
+            stack[-1].nested += dur
+        if stats.current != None:
+            stats.current.phase(self.name, dur - self.nested)
+        if output == None:
+            return False
+        rec = {'span': self.name, 'start': round(self.wall, 6),
+               'dur': round(dur, 6), 'pid': os.getpid(), 'parent': self.parent}
+        if typ != None:
+            rec['error'] = str(val) or typ.__name__
+        rec.update(self.attrs)
+        import json
+        output.write(json.dumps(rec, default=str) + '\n')
+        return False
+
+def enable(path):
+    """start writing spans to the file at path, appending to it"""
+    global output
+    output = open(path, 'a', buffering=1)
+
+def disable():
+    global output
+    if output: output.close()
+    output = None
+
+def span(name, **attrs):
+    """return a context manager timing the operation name"""
+    if output == None and stats.current == None:
+        return nullspan
+    return Span(name, attrs)
+
+def traced(name):
+    """decorator that times every call of a function as span name"""
+    def decorate(func):
+        import functools
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if output == None and stats.current == None:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -20,7 +20,7 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
-import sys, time
+import sys, os, time, struct
 from cpuset import config
 
 class CpusetException(Exception):
@@ -46,51 +46,148 @@ except NameError:
     def isstr(s):
         return isinstance(s, str)
 
-# a progress bar indicator
+# inotify(7) access, there is no stdlib binding so go through libc
+class Inotify(object):
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_ONLYDIR = 0x01000000
+    IN_CLOEXEC = 0o2000000
+    IN_NONBLOCK = 0o4000
+
+    _event = struct.Struct('iIII')
+
+    def __init__(self):
+        import ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches = {}
+
+    def add_watch(self, path, mask):
+        """watch path for events in mask, return the watch descriptor"""
+        import ctypes
+        wd = self.libc.inotify_add_watch(self.fd, path.encode(), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+        return wd
+
+    def pending(self, timeout=0):
+        """check for queued events without consuming them"""
+        import select
+        return len(select.select([self.fd], [], [], timeout)[0]) > 0
+
+    def read(self):
+        """consume queued events, return list of (path, mask, name)"""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(buf):
+                wd, mask, cookie, length = self._event.unpack_from(buf, pos)
+                pos += self._event.size
+                name = buf[pos:pos+length].rstrip(b'\0').decode()
+                pos += length
+                events.append((self.watches.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+def duration(secs):
+    """format seconds as m:ss, or h:mm:ss from an hour on"""
+    secs = int(secs)
+    if secs >= 3600:
+        return '%d:%02d:%02d' % (secs // 3600, secs // 60 % 60, secs % 60)
+    return '%d:%02d' % (secs // 60, secs % 60)
+
+# a progress indicator of a long operation, called with the number of
+# items done; on a terminal a bar with the rate, the elapsed time and
+# the ETA is redrawn at most config.progress_rate times a second,
+# otherwise a log line is written every config.progress_interval seconds
 class ProgressBar(object):
-    def __init__(self, finalcount, progresschar=None):
+    width = 30
+
+    def __init__(self, finalcount, progresschar=None, what='tasks', f=None):
         self.finalcount=finalcount
-        self.blockcount=0
+        self.what=what
         self.finished=False
         # Use dark shade (U+2593) char for progress if none passed
         if not progresschar: 
             self.block='\u2593'
         else: 
             self.block=progresschar
-        if config.mread: 
-            return
-        self.f=sys.stdout
-        if not self.finalcount: return
-        self.f.write('[')
-        for i in range(50): self.f.write(' ')
-        self.f.write(']%')
-        for i in range(52): self.f.write('\b')
+        self.f = f or sys.stdout
+        from cpuset import output
+        self.quiet = config.mread or output.structured() or not finalcount
+        try:
+            self.tty = self.f.isatty()
+        except (AttributeError, ValueError):
+            self.tty = False
+        if self.tty:
+            self.every = 1.0 / config.progress_rate
+        else:
+            self.every = config.progress_interval
+        self.start = time.time()
+        # nothing is shown for operations that are done before this
+        self.next = self.start + self.every
+        self.shown = 0      # length of the line drawn, or lines logged
 
     def __call__(self, count):
         self.progress(count)
 
     def progress(self, count):
-        if self.finished:
+        if self.finished or self.quiet:
             return
-
-        count=min(count, self.finalcount)
-
-        if self.finalcount:
-            percentcomplete=int(round(100*count/self.finalcount))
-            if percentcomplete < 1: percentcomplete=1
-        else:
-            percentcomplete=100
-            self.finished=True
+        count = min(count, self.finalcount)
+        done = count == self.finalcount
+        now = time.time()
+        if now < self.next and not done:
             return
-
-        blockcount=percentcomplete//2
-        if not config.mread:
-            if blockcount > self.blockcount:
-                for i in range(self.blockcount,blockcount):
-                    self.f.write(self.block)
-                    self.f.flush()
-
-            if percentcomplete == 100:
-                self.f.write("]\n")
-                self.finished=True
-        self.blockcount=blockcount
+        self.next = now + self.every
+        if done:
+            self.finished = True
+            if not self.shown:
+                return
+        elapsed = now - self.start
+        rate = count / elapsed if elapsed > 0 else 0.0
+        if self.tty:
+            self.draw(count, elapsed, rate)
+        else:
+            self.log(count, elapsed, rate)
+
+    def eta(self, count, rate):
+        if count == self.finalcount: return 'done'
+        if rate <= 0: return '?'
+        return duration((self.finalcount - count) / rate)
+
+    def draw(self, count, elapsed, rate):
+        fill = self.width * count // self.finalcount
+        line = '[%s%s] %3d%% %d/%d %s %.0f/s %s ETA %s' % (
+               self.block * fill, ' ' * (self.width - fill),
+               100 * count // self.finalcount, count, self.finalcount,
+               self.what, rate, duration(elapsed), self.eta(count, rate))
+        # blank out what is left of a longer line drawn before
+        self.f.write('\r' + line.ljust(self.shown))
+        self.shown = len(line)
+        if self.finished:
+            self.f.write('\n')
+        self.f.flush()
+
+    def log(self, count, elapsed, rate):
+        import logging
+        logging.getLogger('cset').info(
+            'progress: %d/%d %s (%d%%), %.0f/s, elapsed %s, ETA %s',
+            count, self.finalcount, self.what, 100 * count // self.finalcount,
+            rate, duration(elapsed), self.eta(count, rate))
+        self.shown += 1
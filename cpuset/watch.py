@@ -0,0 +1,319 @@
+"""Task placement rules and new task notification
+"""
+
+__copyright__ = """
+Copyright (C) 2007-2010 Novell Inc.
+Copyright (C) 2013-2018 SUSE
+Author: Alex Tsariounov <tsariounov@gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 2 as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os, time, struct, socket, select, fnmatch, logging, configparser
+
+from cpuset import cset
+from cpuset import procfs
+from cpuset.util import *
+
+log = logging.getLogger('watch')
+
+class Task(object):
+    """lazily read /proc attributes of one task, None if it went away;
+       kernel threads are told apart by classifier, by default
+       procfs.classifier"""
+    def __init__(self, pid, cpuset=None, classifier=None):
+        self.pid = str(pid)
+        self._status = None
+        self._cpuset = cpuset
+        self.classifier = classifier or procfs.classifier
+
+    def read(self, name):
+        try:
+            return cset.backend.read('/proc/'+self.pid+'/'+name)
+        except (IOError, OSError):
+            return None
+
+    def status(self, key):
+        if self._status == None:
+            self._status = {}
+            for line in (self.read('status') or '').splitlines():
+                k, sep, v = line.partition(':')
+                self._status[k] = v.strip()
+        return self._status.get(key)
+
+    @property
+    def comm(self):
+        comm = self.read('comm')
+        return comm.rstrip('\n') if comm != None else None
+
+    @property
+    def exe(self):
+        try: return cset.backend.readlink('/proc/'+self.pid+'/exe')
+        except OSError: return None
+
+    @property
+    def kthread(self):
+        return bool(self.classifier.kthread(self.pid))
+
+    @property
+    def unbound(self):
+        """True if the task may run on all cpus of the system"""
+        try:
+            return self.classifier.unbound(self.pid)
+        except CpusetException:
+            return False
+
+    @property
+    def uid(self):
+        uid = self.status('Uid')
+        return int(uid.split()[0]) if uid else None
+
+    @property
+    def ppid(self):
+        return self.status('PPid')
+
+    @property
+    def cpuset(self):
+        if self._cpuset == None:
+            cs = self.read('cpuset')
+            self._cpuset = cs.strip() if cs != None else None
+        return self._cpuset
+
+class Rule(object):
+    """match tasks by comm, exe, uid, parent or origin and name a target set
+
+    Patterns for comm, exe and parent (the comm of the parent task) are
+    shell-style wildcards, parent may also be a PID.  A rule only
+    matches userspace tasks unless kthread is set, in which case it
+    only matches unbound kernel threads.
+    """
+    keys = ('set', 'comm', 'exe', 'uid', 'parent', 'from', 'kthread')
+
+    def __init__(self, name, items):
+        self.name = name
+        for key in items:
+            if key not in Rule.keys:
+                raise CpusetException('rule "%s" has unknown key "%s"' % (name, key))
+        if 'set' not in items:
+            raise CpusetException('rule "%s" does not specify a set' % name)
+        self.set = items['set']
+        self.comm = items.get('comm')
+        self.exe = items.get('exe')
+        self.parent = items.get('parent')
+        self.fromset = items.get('from')
+        self.uid = None
+        if 'uid' in items:
+            try:
+                self.uid = int(items['uid'])
+            except ValueError:
+                import pwd
+                try:
+                    self.uid = pwd.getpwnam(items['uid'])[2]
+                except KeyError:
+                    raise CpusetException('rule "%s": unknown user "%s"' %
+                                          (name, items['uid']))
+        kt = items.get('kthread', 'no').lower()
+        if kt not in ('yes', 'no', 'on', 'off', 'true', 'false', '1', '0'):
+            raise CpusetException('rule "%s": kthread must be yes or no' % name)
+        self.kthread = kt in ('yes', 'on', 'true', '1')
+
+    def __repr__(self):
+        return '<Rule %s -> %s>' % (self.name, self.set)
+
+    def resolve(self):
+        """look up the cpusets named by the rule"""
+        self.target = cset.unique_set(self.set)
+        if self.fromset:
+            self.fromset = cset.unique_set(self.fromset).path
+
+    def matches(self, task):
+        if task.kthread != self.kthread:
+            return False
+        if self.fromset and task.cpuset != self.fromset:
+            return False
+        if self.comm and not fnmatch.fnmatchcase(task.comm or '', self.comm):
+            return False
+        if self.exe and not fnmatch.fnmatchcase(task.exe or '', self.exe):
+            return False
+        if self.uid != None and task.uid != self.uid:
+            return False
+        if self.parent:
+            ppid = task.ppid
+            if self.parent.isdigit():
+                if ppid != self.parent:
+                    return False
+            elif ppid == None or not fnmatch.fnmatchcase(Task(ppid).comm or '',
+                                                         self.parent):
+                return False
+        if self.kthread and not task.unbound:
+            return False
+        return True
+
+def rules_from_config(cf, sections):
+    """build rules from sections of a ConfigParser"""
+    rules = []
+    for sec in sections:
+        rules.append(Rule(sec, dict(cf.items(sec))))
+    return rules
+
+def read_rules(path):
+    """read placement rules, one ini section per rule, first match wins"""
+    log.debug('reading rules from %s', path)
+    cf = configparser.ConfigParser(interpolation=None)
+    try:
+        if len(cf.read(path)) == 0:
+            raise CpusetException('cannot read rules file "%s"' % path)
+    except configparser.Error as err:
+        raise CpusetException('rules file "%s": %s' % (path, err))
+    rules = rules_from_config(cf, cf.sections())
+    if len(rules) == 0:
+        raise CpusetException('no rules found in "%s"' % path)
+    return rules
+
+def place(rules, pids):
+    """move tasks in pids matching rules into their sets, return count"""
+    moves = {}
+    # task IDs are reused, each round classifies its tasks anew
+    procfs.classifier.forget()
+    procfs.classifier.classify(pids)
+    for pid in pids:
+        task = Task(pid)
+        for rule in rules:
+            if rule.matches(task):
+                if task.cpuset not in (None, rule.target.path):
+                    log.debug('task %s (%s) matches rule %s', pid, task.comm, rule.name)
+                    moves.setdefault(rule.target, []).append(task.pid)
+                break
+    from cpuset.commands import proc
+    nr = 0
+    for target, tasks in moves.items():
+        log.info('--> placing %s tasks into "%s"', len(tasks), target.path)
+        proc.move(None, target, tasks)
+        nr += len(tasks)
+    return nr
+
+class ProcConnector(object):
+    """new process notifications from the kernel proc connector"""
+    NETLINK_CONNECTOR = 11
+    CN_IDX_PROC = 1
+    CN_VAL_PROC = 1
+    PROC_CN_MCAST_LISTEN = 1
+    PROC_EVENT_FORK = 0x00000001
+    PROC_EVENT_EXEC = 0x00000002
+    NLMSG_DONE = 3
+
+    nlmsghdr = struct.Struct('=IHHII')
+    cn_msg = struct.Struct('=IIIIHH')
+    proc_event = struct.Struct('=IIQ')
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                  self.NETLINK_CONNECTOR)
+        try:
+            self.sock.bind((os.getpid(), self.CN_IDX_PROC))
+            op = struct.pack('=I', self.PROC_CN_MCAST_LISTEN)
+            msg = self.cn_msg.pack(self.CN_IDX_PROC, self.CN_VAL_PROC, 0, 0,
+                                   len(op), 0) + op
+            self.sock.send(self.nlmsghdr.pack(self.nlmsghdr.size + len(msg),
+                                              self.NLMSG_DONE, 0, 0,
+                                              os.getpid()) + msg)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def events(self):
+        """return new process pids from the messages queued now"""
+        pids = []
+        off = self.nlmsghdr.size + self.cn_msg.size
+        while True:
+            try:
+                data = self.sock.recv(4096, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            except OSError as err:
+                # ENOBUFS, events were dropped, rely on the next sweep
+                log.debug('proc connector: %s', err)
+                pids.append(None)
+                break
+            if len(data) < off + self.proc_event.size + 16:
+                continue
+            what = self.proc_event.unpack_from(data, off)[0]
+            args = struct.unpack_from('=4i', data, off + self.proc_event.size)
+            if what == self.PROC_EVENT_FORK and args[2] == args[3]:
+                # new process, threads inherit the cpuset of their process
+                pids.append(args[3])
+            elif what == self.PROC_EVENT_EXEC:
+                pids.append(args[1])
+        return pids
+
+    def wait(self, timeout=None):
+        select.select([self.sock], [], [], timeout)
+
+    def close(self):
+        self.sock.close()
+
+class ProcPoller(object):
+    """new process notifications by comparing /proc listings"""
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.known = self.scan()
+
+    def scan(self):
+        return set(int(p) for p in cset.backend.pids())
+
+    def events(self):
+        now = self.scan()
+        new = now - self.known
+        self.known = now
+        return sorted(new)
+
+    def wait(self, timeout=None):
+        time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+def watch(rules, interval=0.1):
+    """keep placing tasks according to rules until interrupted"""
+    for rule in rules:
+        rule.resolve()
+    log.debug('rules: %s', rules)
+    try:
+        if cset.backend != cset.kernel:
+            raise OSError('simulated processes')
+        source = ProcConnector()
+        log.info('--> watching for new tasks with the proc connector')
+    except OSError as err:
+        log.debug('proc connector not available: %s', err)
+        source = ProcPoller(interval)
+        log.info('--> watching for new tasks, polling /proc every %ss', interval)
+    try:
+        # the existing tasks first, also after we lost notifications
+        sweep = True
+        while True:
+            if sweep:
+                pids = cset.backend.pids()
+                place(rules, pids)
+                sweep = False
+            source.wait()
+            pids = source.events()
+            if None in pids:
+                sweep = True
+                pids = [p for p in pids if p != None]
+            place(rules, pids)
+    finally:
+        source.close()
@@ -0,0 +1,26 @@
+"""the base of the tests that run the cset model on a simulated system"""
+
+import unittest
+
+from cpuset import backend, cset
+
+class SimulatedTest(unittest.TestCase):
+    """each test runs with a backend.Simulated made from the arguments
+       in system as the backend of the cset model, self.sim, and the
+       model is put back on the kernel afterwards"""
+    system = {}
+
+    def setUp(self):
+        self.sim = backend.Simulated(**self.system)
+        cset.backend = self.sim
+        cset.RootSet = None
+        cset.CpuSet.basepath = ''
+        cset.watcher = None
+        cset.rescan()
+
+    def tearDown(self):
+        cset.backend = cset.kernel
+        cset.RootSet = None
+        cset.CpuSet.basepath = ''
+        cset.CpuSet.sets = {}
+        cset.watcher = None
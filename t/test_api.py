@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cpuset import api
+from cpuset.util import CpusetException, CpusetNotFound, CpusetNotUnique
+
+def make_tree(root, sets):
+    """lay out a directory like a cpuset mount, sets maps path -> cpus"""
+    for path, cpus in sorted(sets.items()):
+        dir = root + path.rstrip('/')
+        if not os.path.isdir(dir): os.mkdir(dir)
+        for name, val in (('cpuset.cpus', cpus), ('cpuset.mems', '0'),
+                          ('cpuset.cpu_exclusive', '0'),
+                          ('cpuset.mem_exclusive', '0'), ('tasks', '')):
+            f = open(dir + '/' + name, 'w')
+            f.write(val + '\n')
+            f.close()
+
+class TestHierarchy(unittest.TestCase):
+
+    def setUp(self):
+        self.roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        make_tree(self.roots[0], {'/': '0-3', '/a': '0-1', '/a/x': '1',
+                                  '/b': '2-3', '/b/x': '2'})
+        make_tree(self.roots[1], {'/': '0-7', '/a': '4-7'})
+        self.h = api.Hierarchy(self.roots[0])
+
+    def tearDown(self):
+        for root in self.roots:
+            shutil.rmtree(root)
+
+    def test_lookup(self):
+        self.assertEqual([s.path for s in self.h.sets()],
+                         ['/', '/a', '/a/x', '/b', '/b/x'])
+        self.assertEqual(self.h.unique('a').path, '/a')
+        self.assertEqual(self.h.unique('root'), self.h.rootset)
+        self.assertEqual(len(self.h.find('x')), 2)
+        with self.assertRaises(CpusetNotUnique):
+            self.h.unique('x')
+        with self.assertRaises(CpusetNotFound):
+            self.h.set('/c')
+        self.assertEqual(self.h.set('b/x').parent.path, '/b')
+        self.assertEqual([s.path for s in self.h.rootset.children], ['/a', '/b'])
+
+    def test_properties(self):
+        s = self.h.set('/b')
+        self.assertEqual(s.cpus, frozenset([2, 3]))
+        s.cpus = [3, 2]
+        self.assertEqual(s.read('cpus'), '2-3')
+        s.cpu_exclusive = True
+        self.assertEqual(s.info(), {'path': '/b', 'name': 'b', 'cpus': '2-3',
+                                    'mems': '0', 'cpu_exclusive': True,
+                                    'mem_exclusive': False, 'tasks': 0})
+
+    def test_independent(self):
+        other = api.Hierarchy(self.roots[1])
+        self.assertEqual(other.set('/a').cpus, frozenset(range(4, 8)))
+        self.assertEqual(self.h.set('/a').cpus, frozenset([0, 1]))
+        self.assertNotEqual(other.set('/a'), self.h.set('/a'))
+
+    def test_move(self):
+        res = api.TaskMover(self.h).move([10, 11], '/a')
+        self.assertEqual(res, api.MoveResult([10, 11], [], []))
+        self.assertEqual(res.moved, [10, 11])
+
+    def test_shield(self):
+        shield = api.Shield(self.h)
+        self.assertFalse(shield.status().active)
+        with self.assertRaises(CpusetException):
+            shield.apply('0-3')
+        with self.assertRaises(CpusetNotFound):
+            shield.reset()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import errno
+import os
+import tempfile
+import unittest
+from array import array
+
+from cpuset import api, backend, cset, freeze, procfs
+from cpuset.commands import proc, set
+from cpuset.util import CpusetException, CpusetNotFound
+
+from simulated import SimulatedTest
+
+class TestSimulated(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = backend.Simulated(cpus=4, processes=5, threads=1, kthreads=2)
+        self.h = api.Hierarchy(stats=None, backend=self.sim)
+
+    def error(self, err, func, *args):
+        with self.assertRaises(OSError) as cm:
+            func(*args)
+        self.assertEqual(cm.exception.errno, err)
+
+    def test_mount(self):
+        self.assertEqual(api.locate_mount(self.sim), '/sim/cpuset')
+        self.assertEqual(self.h.prefix, 'cpuset.')
+        self.assertEqual(self.h.rootset.cpus, frozenset(range(4)))
+
+    def test_rules(self):
+        a = self.h.create('/a', '0-1', '0', cpu_exclusive=True)
+        self.error(errno.EACCES, self.sim.write, self.h.file('/a', 'cpus'), '0-5')
+        self.h.create('/a/x', '1', '0')
+        self.error(errno.EBUSY, self.sim.write, self.h.file('/a', 'cpus'), '0')
+        self.error(errno.EINVAL, self.h.create, '/b', '1-2', '0')
+        self.sim.mkdir('/sim/cpuset/c')
+        self.error(errno.ENOSPC, self.sim.write, self.h.file('/c', 'tasks'), '1')
+        api.TaskMover(self.h).move([1], '/a/x')
+        self.error(errno.ENOSPC, self.sim.write, self.h.file('/a/x', 'cpus'), '')
+        self.error(errno.EBUSY, self.sim.rmdir, self.h.dir('/a'))
+
+    def test_tasks(self):
+        a = self.h.create('/a', '1', '0')
+        bound = [t.pid for t in self.sim.tasks.values() if t.bound != None]
+        res = api.TaskMover(self.h).move([1, 99999, bound[0]], a)
+        self.assertEqual(res, api.MoveResult([1], [99999], [bound[0]]))
+        child = self.sim.spawn(1)
+        self.assertIn(child, a.tasks)
+        self.assertEqual(self.sim.read('/proc/%s/cpuset' % child), '/a\n')
+        self.assertIn('Cpus_allowed_list:\t1\n', self.sim.read('/proc/1/status'))
+        self.sim.exit(child)
+        self.assertNotIn(child, a.tasks)
+        self.assertEqual(api.task_kind(1, self.sim), 'user')
+        self.assertEqual(api.task_kind(bound[0], self.sim), 'bound')
+        unbound = [t.pid for t in self.sim.tasks.values()
+                   if t.comm.startswith('kworker')]
+        self.assertEqual(api.task_kind(unbound[0], self.sim), 'kthread')
+        self.assertEqual(api.task_kind(child, self.sim), None)
+
+    def test_proc(self):
+        procs = backend.Simulated(processes=1000, kthreads=0)
+        self.assertEqual(len(procs.pids()), 1000 + 2 + 2 * 4)
+        pid = procs.pids()[-1]
+        self.assertEqual(procs.listdir('/proc/%s/task' % pid), [pid])
+        stat = procs.read('/proc/%s/stat' % pid).split()
+        self.assertEqual(len(stat), 52)
+        self.assertEqual(stat[19], '1')
+
+class TestModel(SimulatedTest):
+    """the cset model and commands on a simulated system"""
+
+    system = dict(cpus=4, processes=20)
+
+    def test_commands(self):
+        self.assertEqual(cset.maxcpu, 3)
+        set.create('one', '1-2', '0', False, False)
+        set.create('one/sub', '2', '0', False, False)
+        self.assertEqual(cset.unique_set('sub').cpus, '2')
+        # pids 3-10 are the per-cpu kernel threads of 4 cpus
+        proc.move('root', 'sub', ['5', '21', '22'])
+        self.assertEqual(cset.unique_set('sub').tasks, ['21', '22'])
+        self.assertEqual(cset.lookup_task_from_proc(21), '/one/sub')
+        self.assertEqual(proc.pidspec_to_list('19-22', 'root'), ['19', '20'])
+        self.assertTrue(proc.is_unbound(1))
+        set.destroy_sets(['one'], recurse=True, force=True)
+        self.assertIn('21', cset.RootSet.tasks)
+        with self.assertRaises(CpusetException):
+            cset.unique_set('sub')
+        # the root set given too is left alone, not taken as a parent
+        set.create('two', '3', '0', False, False)
+        set.destroy_sets(['/', 'two'], recurse=True, force=True)
+        self.assertNotIn('/two', self.sim.sets)
+
+    def test_pidspec(self):
+        pid = self.sim.spawn(1, threads=2)
+        self.assertEqual(pid, 41)
+        # narrow ranges are probed, wide and open ones listed
+        self.assertEqual(proc.pidspec_to_list('40-42'), ['40', '41', '42'])
+        self.assertEqual(proc.pidspec_to_list('42-'), ['42', '43'])
+        self.assertEqual(len(proc.pidspec_to_list('1-4194304')), 43)
+        set.create('one', '1-2', '0', False, False)
+        proc.move('root', 'one', ['41', '42', '43'])
+        self.assertEqual(proc.pidspec_to_list('-42,43', 'one'), ['41', '42', '43'])
+        self.assertEqual(proc.pidspec_to_list('1-41,99', 'one'), ['41'])
+        with self.assertRaises(CpusetException):
+            proc.pidspec_to_list('1-x')
+        with self.assertRaises(CpusetException):
+            proc.pidspec_to_list('41,-')
+
+    def test_task_ids(self):
+        set.create('one', '1-2', '0', False, False)
+        proc.move('root', 'one', ['25', '22', '30'])
+        one = cset.unique_set('one')
+        self.assertEqual(one.task_ids, array('i', [22, 25, 30]))
+        self.assertEqual(one.tasks, ['22', '25', '30'])
+        self.assertEqual(cset.lookup_task_from_cpusets('25'), '/one')
+        ids = cset.task_array(array('i', [9, 3, 7]))
+        self.assertEqual(list(cset.array_range(ids, 4)), [7, 9])
+        self.assertTrue(cset.in_array(ids, 3))
+        self.assertFalse(cset.in_array(ids, 4))
+        # the kernel reads the whole file at once
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, b''.join([b'%d\n' % t for t in range(1, 200001)]))
+            os.close(fd)
+            ids = backend.kernel.read_tasks(path)
+            self.assertEqual((len(ids), ids[0], ids[-1]), (200000, 1, 200000))
+        finally:
+            os.unlink(path)
+
+    def test_follow_threads(self):
+        pid = self.sim.spawn(1, threads=2)
+        set.create('one', '1-2', '0', False, False)
+        writes = self.sim.open_tasks
+        started = []
+        def racing(path):
+            # a thread not moved yet starts another one
+            if len(started) < 2:
+                started.append(self.sim.clone(pid + 2))
+            return writes(path)
+        self.sim.open_tasks = racing
+        proc.move_pidspec(str(pid), 'one', None, threads=True)
+        self.assertEqual(len(started), 2)
+        self.assertEqual(sorted(self.sim.sets['/one'].tasks),
+                         [pid, pid + 1, pid + 2] + started)
+        # a process whose newest thread keeps starting threads is given up on
+        def endless(path):
+            self.sim.clone(self.sim.threads[pid][-1])
+            return writes(path)
+        self.sim.open_tasks = endless
+        self.assertEqual(proc.follow_threads(cset.unique_set('/'), [str(pid)], 3), 1)
+        # only the threads of the tasks moved are followed, kernel
+        # threads skipped without -k stay where they are
+        self.sim.open_tasks = writes
+        one = cset.unique_set('one')
+        moved = proc.selective_move(None, one, ['11', '12', '21'], threads=True)
+        self.assertEqual(moved, ['21'])
+        self.assertEqual(self.sim.tasks[11].cpuset, '/')
+        # there is no freezer in the simulation
+        with self.assertRaises(CpusetException):
+            with freeze.Freezer([str(pid)]):
+                pass
+
+    def test_classifier(self):
+        c = procfs.Classifier()
+        # 3-10 are bound to a cpu, 11-20 unbound kernel threads
+        self.assertEqual(c.kthreads(['2', '3', '11', '21', '99999']), ['2', '3', '11'])
+        self.assertEqual(c.userspace(['2', '21', '99999']), ['21'])
+        self.assertEqual(c.kind(4), procfs.TaskKind(4, True, frozenset([0])))
+        self.assertTrue(c.bound(4))
+        self.assertFalse(c.unbound(4))
+        self.assertTrue(c.unbound(11))
+        self.assertEqual(sorted(c.cpus(21)), [0, 1, 2, 3])
+        self.assertEqual(c.unbound_tasks(['3', '11', '99999']), ['11'])
+        self.assertEqual(c.kthread(99999), None)
+        # read once, unless asked to forget
+        self.sim.exit(21)
+        self.assertEqual(c.userspace(['21']), ['21'])
+        c.forget()
+        self.assertEqual(c.userspace(['21']), [])
+
+    def test_join(self):
+        set.create('one', '1-2', '0', False, False)
+        cset.join('/one', 21)
+        self.assertEqual(self.sim.tasks[21].cpuset, '/one')
+        self.sim.mkdir(self.sim.root + '/empty')
+        with self.assertRaises(CpusetException):
+            cset.join('/empty', 21)
+        with self.assertRaises(CpusetNotFound):
+            cset.join('/none', 21)
+        cset.join('/', 21)
+        self.assertEqual(self.sim.tasks[21].cpuset, '/')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import unittest
+
+from cpuset import batch, cset
+from cpuset.commands import set
+from cpuset.util import CpusetException, CpusetNotFound
+
+from simulated import SimulatedTest
+
+class Local(batch.Batch):
+    """the children of a simulated system cannot join its cpusets"""
+    def join(self, path):
+        pass
+
+class TestBatch(SimulatedTest):
+
+    system = dict(cpus=4, processes=2)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        set.create('one', '1-2', '0', False, False)
+
+    def test_read(self):
+        jobs = batch.read_jobs(io.StringIO(
+            '# comment\n\none\techo "a b" c\n/\ttrue\n'))
+        self.assertEqual([(j.line, j.set, j.args) for j in jobs],
+                         [(3, 'one', ['echo', 'a b', 'c']), (4, '/', ['true'])])
+        with self.assertRaises(CpusetException):
+            batch.read_jobs(io.StringIO('one echo\n'))
+        with self.assertRaises(CpusetException):
+            batch.read_jobs(io.StringIO('one\t"echo\n'))
+
+    def test_resolve(self):
+        jobs = batch.read_jobs(io.StringIO('one\ttrue\n/one\ttrue\nroot\ttrue\n'))
+        batch.resolve(jobs)
+        self.assertEqual([j.path for j in jobs], ['/one', '/one', '/'])
+        with self.assertRaises(CpusetNotFound):
+            batch.resolve(batch.read_jobs(io.StringIO('two\ttrue\n')))
+
+    def test_run(self):
+        jobs = batch.read_jobs(io.StringIO(
+            '/\ttrue\n/\tsh -c "exit 3"\n/\tsh -c "kill -9 $$"\n'
+            '/\tno-such-command-here\n'))
+        batch.resolve(jobs)
+        done = Local(jobs, 2).run()
+        self.assertEqual(sorted([(j.line, j.status) for j in done]),
+                         [(1, 0), (2, 3), (3, -9), (4, 127)])
+        self.assertTrue(all([j.wall >= 0 for j in done]))
+
+if __name__ == '__main__':
+    unittest.main()
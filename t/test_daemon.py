@@ -0,0 +1,181 @@
+import io
+import os
+import sys
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import unittest
+import contextlib
+from optparse import OptionParser
+
+from cpuset import config, cset, main
+from cpuset.commands import daemon
+
+from simulated import SimulatedTest
+
+class TestDaemon(SimulatedTest):
+    """requests run by cset daemon on a simulated system"""
+
+    system = dict(cpus=4, processes=3)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.saved = (sys.argv, config.lock_file, config.daemon_socket,
+                      getattr(main, 'prog', None), getattr(main, 'console', None))
+        config.lock_file = ''
+        config.daemon_socket = os.path.join(self.dir, 'cset.sock')
+        main.prog = 'cset'
+        main.console = logging.StreamHandler(sys.stdout)
+        self.root = logging.getLogger('')
+        self.level = self.root.level
+        self.root.addHandler(main.console)
+        self.root.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.root.removeHandler(main.console)
+        self.root.setLevel(self.level)
+        (sys.argv, config.lock_file, config.daemon_socket,
+         main.prog, main.console) = self.saved
+        shutil.rmtree(self.dir)
+        SimulatedTest.tearDown(self)
+
+    def execute(self, *argv):
+        stdout = sys.stdout
+        try:
+            return daemon.execute({'argv': list(argv), 'mread': False})
+        finally:
+            sys.stdout = stdout
+
+    def forwardable(self, cmd, *argv):
+        parser = OptionParser(option_list = main.commands[cmd].options)
+        options, args = parser.parse_args(list(argv))
+        return daemon.forwardable(cmd, options, args)
+
+    def serve(self, handler):
+        """answer one request on the daemon socket with handler"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(config.daemon_socket)
+        sock.listen(1)
+        def accept():
+            conn, addr = sock.accept()
+            try:
+                handler(sock, conn)
+            finally:
+                conn.close()
+                sock.close()
+        t = threading.Thread(target=accept)
+        t.start()
+        return t
+
+    def test_forwardable(self):
+        self.assertTrue(self.forwardable('set', '-l'))
+        self.assertTrue(self.forwardable('proc', '-m', '21', 'one'))
+        self.assertTrue(self.forwardable('shield', '-c', '2-3'))
+        # programs are executed and watches kept running locally
+        self.assertFalse(self.forwardable('proc', '-e', '/one', 'true'))
+        self.assertFalse(self.forwardable('proc', '--batch', 'jobs'))
+        self.assertFalse(self.forwardable('shield', '--guard', '-c', '2-3'))
+        self.assertFalse(self.forwardable('shield', 'true'))
+        self.assertFalse(self.forwardable('set', '--top'))
+
+    def test_execute(self):
+        status, out = self.execute('set', '-c', '1-2', 'one')
+        self.assertEqual(status, 0)
+        self.assertIn('/one', self.sim.sets)
+        self.assertEqual(self.execute('proc', '-m', '21', 'one')[0], 0)
+        self.assertEqual(self.sim.tasks[21].cpuset, '/one')
+        status, out = self.execute('set', '-l', '-r')
+        self.assertEqual(status, 0)
+        self.assertIn('/one', out)
+        status, out = self.execute('daemon')
+        self.assertEqual(status, 2)
+        self.assertIn('cannot be run by the daemon', out)
+        status, out = self.execute('set', '-d', 'none')
+        self.assertEqual(status, 2)
+
+    def test_protocol(self):
+        self.execute('set', '-c', '1-2', 'one')
+        cset.watcher = cset.HierarchyWatcher()
+        t = self.serve(daemon.handle)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = daemon.forward('set', ['-l', '-r'])
+        t.join()
+        self.assertEqual(status, 0)
+        self.assertIn('/one', out.getvalue())
+
+    def test_no_reply(self):
+        # a daemon that rejects the request or whose child dies closes
+        # the connection without a reply, the command runs locally
+        def reject(sock, conn):
+            conn.makefile('rb').readline()
+        t = self.serve(reject)
+        self.assertEqual(daemon.forward('set', ['-l']), None)
+        t.join()
+
+class TestSnapshots(SimulatedTest):
+    """the watcher of a simulated hierarchy, by snapshots of its tree"""
+
+    def test_rescan(self):
+        cset.RootSet = None
+        cset.CpuSet.basepath = ''
+        cset.watcher = cset.HierarchyWatcher()
+        self.assertEqual(cset.watcher.inotify, None)
+        cset.rescan()
+        root = cset.RootSet
+        cset.rescan()
+        self.assertIs(cset.RootSet, root)
+        self.sim.mkdir(self.sim.root + '/one')
+        self.assertTrue(cset.watcher.pending())
+        cset.rescan()
+        self.assertIn('/one', cset.CpuSet.sets)
+        self.assertFalse(cset.watcher.pending())
+
+class TestWatcher(unittest.TestCase):
+    """the watcher of a cpuset hierarchy in a directory"""
+
+    def setUp(self):
+        cset.watcher = cset.HierarchyWatcher()
+        if cset.watcher.inotify == None:
+            cset.watcher = None
+            self.skipTest('inotify not available')
+        self.dir = tempfile.mkdtemp()
+        self.write('/cpus', '0-3\n')
+        self.locate = cset.CpuSet.__dict__['locate_cpusets']
+        cset.CpuSet.locate_cpusets = staticmethod(lambda: self.dir)
+        cset.RootSet = None
+
+    def tearDown(self):
+        cset.watcher.inotify.close()
+        cset.CpuSet.locate_cpusets = self.locate
+        cset.RootSet = None
+        cset.CpuSet.basepath = ''
+        cset.CpuSet.sets = {}
+        cset.watcher = None
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        with open(self.dir + name, 'w') as f:
+            f.write(data)
+
+    def test_rescan(self):
+        cset.rescan(force=True)
+        root = cset.RootSet
+        cset.rescan()
+        self.assertIs(cset.RootSet, root)
+        os.mkdir(self.dir + '/one')
+        self.write('/one/cpus', '1\n')
+        self.assertTrue(cset.watcher.pending())
+        cset.rescan()
+        self.assertIn('/one', cset.CpuSet.sets)
+        # the change is consumed, the next rescan keeps the model
+        self.assertFalse(cset.watcher.pending())
+        root = cset.RootSet
+        cset.rescan()
+        self.assertIs(cset.RootSet, root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cpuset import cset
+from cpuset.commands import export, proc, set
+
+from simulated import SimulatedTest
+
+class TestExport(SimulatedTest):
+
+    system = dict(cpus=4, processes=4, kthreads=2)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        SimulatedTest.tearDown(self)
+
+    def samples(self, text):
+        d = {}
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                d[name] = value
+        return d
+
+    def test_sets(self):
+        set.create('rt', '2-3', '0', True, False)
+        proc.move('root', 'rt', ['13', '14'])
+        self.sim.tasks[13].utime = 250
+        self.sim.tasks[14].stime = 100
+        m = self.samples(export.Exporter(hz=100).collect())
+        self.assertEqual(m['cset_cpus{set="/rt"}'], '2')
+        self.assertEqual(m['cset_cpu_exclusive{set="/rt"}'], '1')
+        self.assertEqual(m['cset_mem_exclusive{set="/rt"}'], '0')
+        self.assertEqual(m['cset_tasks{set="/rt"}'], '2')
+        self.assertEqual(m['cset_tasks_cpu_seconds{set="/rt",mode="user"}'], '2.50')
+        self.assertEqual(m['cset_tasks_cpu_seconds{set="/rt",mode="system"}'], '1.00')
+        self.assertEqual(m['cset_shield_active'], '0')
+        self.assertFalse([k for k in m if k.startswith('cset_shield_kthreads')])
+
+    def test_shield(self):
+        set.create('system', '0-1', '0', False, False)
+        set.create('user', '2-3', '0', False, False)
+        # the bound kthreads of cpu 2 and 3, and a kworker that last ran there
+        self.sim.tasks[11].processor = 3
+        m = self.samples(export.Exporter(hz=100).collect())
+        self.assertEqual(m['cset_shield_active'], '1')
+        self.assertEqual(m['cset_shield_cpus{role="user",set="/user"}'], '2')
+        self.assertEqual(m['cset_shield_kthreads{bound="1"}'], '4')
+        self.assertEqual(m['cset_shield_kthreads{bound="0"}'], '1')
+
+    def test_write(self):
+        path = os.path.join(self.dir, 'cset.prom')
+        export.write_atomic(path, 'old\n')
+        export.write_atomic(path, 'new\n')
+        self.assertEqual(open(path).read(), 'new\n')
+        self.assertEqual(os.listdir(self.dir), ['cset.prom'])
+        self.assertEqual(export.escape('a"b\\c\n'), 'a\\"b\\\\c\\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from optparse import OptionParser
+
+from cpuset import config, cset, lock, procfs
+from cpuset.commands import proc, shield
+
+from simulated import SimulatedTest
+
+class TestGuard(SimulatedTest):
+
+    system = dict(cpus=4, processes=3)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        shield.make_shield('2-3', None)
+        proc.move('system', 'user', ['22'])
+
+    def cpus(self, path):
+        return cset.ints_to_cpuspec(self.sim.sets[path].cpus)
+
+    def test_hotplug(self):
+        guard = shield.Guard()
+        self.assertTrue(guard.check(100))
+        self.sim.hotplug(3, False)
+        with self.assertLogs('shield', 'ERROR') as cm:
+            self.assertFalse(guard.check(101))
+        self.assertIn('has 1 of its 2 cpus (2-3), missing 3', cm.output[0])
+        # the user set is emptied, the kernel moves its tasks out
+        self.sim.hotplug(2, False)
+        self.assertFalse(guard.check(102))
+        self.assertEqual(self.sim.tasks[22].cpuset, '/')
+        self.sim.hotplug(2, True)
+        self.sim.hotplug(3, True)
+        self.assertEqual(self.cpus('/user'), '')
+        self.assertTrue(guard.check(110))
+        self.assertEqual(self.cpus('/user'), '2-3')
+        self.assertEqual(self.cpus('/system'), '0-1')
+        self.assertEqual(self.sim.tasks[22].cpuset, '/user')
+        self.assertEqual((guard.downtime, guard.repairs), (9, 1))
+
+    def test_reused_ids(self):
+        proc.move('system', 'user', ['23'])
+        guard = shield.Guard()
+        self.assertTrue(guard.check(100))
+        self.assertEqual(procfs.classifier.userspace(['22', '23']), ['22', '23'])
+        self.sim.hotplug(2, False)
+        self.sim.hotplug(3, False)
+        self.assertFalse(guard.check(101))
+        # a kernel thread gets the ID of a task of the shield
+        self.sim.exit(22)
+        self.sim.nextpid = 22
+        self.sim.spawn(2, 'kworker/u9', None)
+        self.sim.hotplug(2, True)
+        self.sim.hotplug(3, True)
+        self.assertTrue(guard.check(110))
+        self.assertEqual(self.sim.tasks[22].cpuset, '/')
+        self.assertEqual(self.sim.tasks[23].cpuset, '/user')
+
+    def test_system_cpus(self):
+        # a cpu outside the shield comes back to the system set
+        guard = shield.Guard('2-3')
+        self.sim.hotplug(1, False)
+        self.assertTrue(guard.check(100))
+        self.assertEqual(self.cpus('/system'), '0')
+        self.sim.hotplug(1, True)
+        self.assertTrue(guard.check(101))
+        self.assertEqual(self.cpus('/system'), '0-1')
+        # and a new shield leaves out the cpus that are offline
+        self.sim.hotplug(1, False)
+        cset.rescan()
+        shield.make_shield('3', None)
+        self.assertEqual(self.cpus('/system'), '0,2')
+
+    def test_locked_setup(self):
+        # the shield set up by --guard --cpu is locked like --cpu alone,
+        # the guard itself runs unlocked
+        held = []
+        def make_shield(cpuspec, kthread):
+            held.append((lock.held.paths, lock.held.exclusive))
+        def guard_shield(cpuspec, interval):
+            held.append(lock.held)
+        parser = OptionParser(option_list = shield.options)
+        options, args = parser.parse_args(['--guard', '--cpu', '2-3'])
+        self.assertEqual(shield.lock_scope(options, args), None)
+        dir = tempfile.mkdtemp()
+        saved = config.lock_file, shield.make_shield, shield.guard_shield
+        config.lock_file = os.path.join(dir, 'cset.lock')
+        shield.make_shield, shield.guard_shield = make_shield, guard_shield
+        try:
+            shield.func(parser, options, args)
+        finally:
+            config.lock_file, shield.make_shield, shield.guard_shield = saved
+            shutil.rmtree(dir)
+        self.assertEqual(held, [(['/'], True), None])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+from cpuset import cset, layout, watch
+from cpuset.util import CpusetException
+
+class FakeState(layout.State):
+    """cpuset state held in dicts: path -> (cpus, mems, cx, mx, tasks)"""
+    def __init__(self, sets):
+        layout.State.__init__(self)
+        self.sets = sets
+
+    def exists(self, path):
+        return path in self.sets
+
+    def children(self, path):
+        return [p for p in self.sets if p != '/' and layout.parent_of(p) == path]
+
+    def paths(self):
+        return list(self.sets)
+
+    def read(self, path, prop):
+        cpus, mems, cx, mx, tasks = self.sets[path]
+        return {'cpus': cset.cpuspec_to_ints(cpus),
+                'mems': cset.cpuspec_to_ints(mems),
+                'cpu_exclusive': cx, 'mem_exclusive': mx,
+                'tasks': tasks}[prop]
+
+    def task(self, pid, path):
+        return FakeTask(pid, path)
+
+class FakeTask(watch.Task):
+    kthread = False
+
+def shield(sys, usr):
+    return layout.Layout([layout.SetSpec('/system', {'cpus': sys, 'mems': '0',
+                                                     'cpu_exclusive': 'yes'}),
+                          layout.SetSpec('/user', {'cpus': usr, 'mems': '0',
+                                                   'cpu_exclusive': 'yes'})], [])
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.state = FakeState({
+            '/': ('0-3', '0', True, True, ['1', '2']),
+            '/system': ('0', '0', True, False, ['10']),
+            '/user': ('1-3', '0', True, False, []),
+        })
+
+    def test_cpuspec_ints(self):
+        self.assertEqual(cset.cpuspec_to_ints('0-2,,5'), frozenset([0, 1, 2, 5]))
+        self.assertEqual(cset.ints_to_cpuspec([5, 0, 1, 2, 7, 8]), '0-2,5,7-8')
+        self.assertEqual(cset.ints_to_cpuspec([]), '')
+
+    def test_nothing_to_do(self):
+        self.assertEqual(layout.plan(shield('0', '1-3'), self.state), [])
+
+    def test_shrink_before_grow(self):
+        ops = layout.plan(shield('0-1', '2-3'), self.state)
+        self.assertEqual(ops, [('write', '/user', 'cpus', '2-3', '1-3'),
+                               ('write', '/system', 'cpus', '0-1', '0')])
+
+    def test_trade_cpus(self):
+        ops = layout.plan(shield('3', '0-2'), self.state)
+        self.assertEqual(ops, [('write', '/user', 'cpus', '1-2', '1-3'),
+                               ('write', '/system', 'cpus', '3', '0'),
+                               ('write', '/user', 'cpus', '0-2', '1-2')])
+
+    def test_swap_needs_flags_dropped(self):
+        state = FakeState({'/': ('0-1', '0', True, True, []),
+                           '/system': ('0', '0', True, False, []),
+                           '/user': ('1', '0', True, False, [])})
+        ops = layout.plan(shield('1', '0'), state)
+        self.assertEqual(ops[:2], [('write', '/system', 'cpu_exclusive', '0', '1'),
+                                   ('write', '/user', 'cpu_exclusive', '0', '1')])
+        self.assertEqual(sorted(ops[-2:]),
+                         [('write', '/system', 'cpu_exclusive', '1', '0'),
+                          ('write', '/user', 'cpu_exclusive', '1', '0')])
+
+    def test_disjoint_move(self):
+        # a child moving to cpus it does not have yet goes first, its
+        # parent is narrowed only once the child is out of the way
+        state = FakeState({'/': ('0-7', '0', True, True, []),
+                           '/a': ('0-3', '0', False, False, []),
+                           '/a/b': ('0-1', '0', False, False, [])})
+        lay = layout.Layout([layout.SetSpec('/a', {'cpus': '2-3'}),
+                             layout.SetSpec('/a/b', {'cpus': '2-3'})], [])
+        self.assertEqual(layout.plan(lay, state),
+                         [('write', '/a/b', 'cpus', '2-3', '0-1'),
+                          ('write', '/a', 'cpus', '2-3', '0-3')])
+        lay = layout.Layout([layout.SetSpec('/a', {'cpus': '2-5'}),
+                             layout.SetSpec('/a/b', {'cpus': '4-5'})], [])
+        self.assertEqual(layout.plan(lay, state),
+                         [('write', '/a', 'cpus', '0-5', '0-3'),
+                          ('write', '/a/b', 'cpus', '4-5', '0-1'),
+                          ('write', '/a', 'cpus', '2-5', '0-5')])
+
+    def test_exclusive_overlap(self):
+        with self.assertRaises(CpusetException):
+            layout.plan(shield('0-1', '1-3'), self.state)
+
+    def test_create_top_down(self):
+        lay = layout.Layout([layout.SetSpec('/a/b', {'cpus': '2'}),
+                             layout.SetSpec('/a', {'cpus': '2-3', 'mems': '0',
+                                                   'cpu_exclusive': 'yes'})], [])
+        state = FakeState({'/': ('0-3', '0', True, True, [])})
+        ops = layout.plan(lay, state)
+        self.assertEqual([op[:2] for op in ops],
+                         [('mkdir', '/a'), ('write', '/a'), ('write', '/a'),
+                          ('mkdir', '/a/b'), ('write', '/a/b'), ('write', '/a/b'),
+                          ('write', '/a')])
+        self.assertEqual(ops[-1][2:4], ('cpu_exclusive', '1'))
+
+    def test_absent(self):
+        self.state.sets['/user/sub'] = ('1', '0', False, False, ['20'])
+        lay = layout.Layout([layout.SetSpec('/user', {'absent': 'yes'})], [])
+        ops = layout.plan(lay, self.state)
+        self.assertEqual(ops, [('move', '/', ['20']), ('rmdir', '/user/sub'),
+                               ('rmdir', '/user')])
+
+    def test_invalid(self):
+        with self.assertRaises(CpusetException):
+            layout.plan(layout.Layout([layout.SetSpec('/user/x', {'cpus': '0'})], []),
+                        self.state)
+        with self.assertRaises(CpusetException):
+            layout.plan(layout.Layout([layout.SetSpec('/new/x', {'cpus': '1'})], []),
+                        self.state)
+        with self.assertRaises(CpusetException):
+            layout.SetSpec('/x', {'cpus': '1', 'colour': 'red'})
+
+    def test_rules(self):
+        rule = watch.Rule('rest', {'set': '/system', 'from': 'root'})
+        lay = shield('0', '1-3')
+        lay.rules = [rule]
+        ops = layout.plan(lay, self.state)
+        self.assertEqual(ops, [('move', '/system', ['1', '2'])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from cpuset import config, lock
+from cpuset.util import CpusetException
+
+class TestLock(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cset.lock')
+        self.saved = config.lock_file
+        config.lock_file = self.path
+
+    def tearDown(self):
+        config.lock_file = self.saved
+        shutil.rmtree(self.dir)
+
+    def lock(self, paths, exclusive, timeout=0):
+        return lock.Lock(paths, exclusive, timeout)
+
+    def test_span(self):
+        root = lock.span('/')
+        a, ax, b = lock.span('/a'), lock.span('/a/x'), lock.span('/b')
+        self.assertEqual(root, (0, lock.FANOUT ** lock.DEPTH))
+        # a child lies within its parent, siblings apart
+        self.assertTrue(a[0] <= ax[0] and ax[0] + ax[1] <= a[0] + a[1])
+        self.assertTrue(a[0] + a[1] <= b[0] or b[0] + b[1] <= a[0])
+        self.assertEqual(lock.ranges(['/a/x', '/a', '/b']), sorted([a, b]))
+        self.assertEqual(lock.span('/1/2/3/4/5/6/7/8'), lock.span('/1/2/3/4/5/6/7'))
+
+    def holder(self, paths, exclusive):
+        """fork a process holding a lock until told to go"""
+        ready, held = os.pipe()
+        release, go = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with self.lock(paths, exclusive):
+                    os.write(held, b'x')
+                    os.read(release, 1)
+            finally:
+                os._exit(0)
+        os.read(ready, 1)
+        self.addCleanup(os.waitpid, pid, 0)
+        self.addCleanup(os.write, go, b'x')
+        return pid, go
+
+    def test_subtrees(self):
+        pid, go = self.holder(['/a'], True)
+        with self.lock(['/b'], True) as l:
+            self.assertFalse(l.contended)
+        for path in ('/', '/a', '/a/x'):
+            with self.assertRaises(CpusetException) as cm:
+                self.lock([path], False).acquire()
+            self.assertIn('held by process %d' % pid, str(cm.exception))
+        # release the holder only once the lock is being waited for
+        l = self.lock(['/a/x'], True, 5)
+        t = threading.Thread(target=l.acquire)
+        t.start()
+        while not l.contended and t.is_alive():
+            time.sleep(0.01)
+        os.write(go, b'x')
+        t.join()
+        self.assertTrue(l.contended)
+        l.release()
+
+    def test_shared(self):
+        pid, go = self.holder(['/'], False)
+        with self.lock(['/a'], False):
+            pass
+        with self.assertRaises(CpusetException):
+            self.lock(['/a'], True, 0.05).acquire()
+
+    def test_nested(self):
+        with lock.locked(['/'], True, 0) as outer:
+            self.assertIs(lock.held, outer)
+            with lock.locked(['/a'], False) as inner:
+                self.assertEqual(inner, None)
+        self.assertEqual(lock.held, None)
+
+if __name__ == '__main__':
+    unittest.main()
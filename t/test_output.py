@@ -0,0 +1,61 @@
+import io
+import json
+import unittest
+import contextlib
+
+from cpuset import backend, config, cset, output
+from cpuset.commands import proc, set
+
+from simulated import SimulatedTest
+
+class TestFormat(SimulatedTest):
+
+    system = dict(cpus=4, processes=3, kthreads=0)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        config.mread = False
+        set.create('one', '1-2', '0', False, False)
+        pid = self.sim.spawn(1, exe='/bin/sh')
+        self.sim.tasks[pid].comm = 'sh'
+        self.sim.procfile = self.procfile
+        proc.move('root', 'one', [str(pid)])
+        self.pid = pid
+
+    def procfile(self, task, name):
+        if name == 'cmdline' and task.pid == self.pid:
+            return '/bin/sh\0-c\0echo a;b\0'
+        return backend.Simulated.procfile(self.sim, task, name)
+
+    def tearDown(self):
+        config.format = 'text'
+        SimulatedTest.tearDown(self)
+
+    def run_listing(self, fmt, func, *args):
+        config.format = fmt
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            func(*args)
+            output.finish()
+        return out.getvalue()
+
+    def test_json(self):
+        recs = json.loads(self.run_listing('json', set.list_sets, 'root', True))
+        self.assertEqual([r['path'] for r in recs], ['/', '/one'])
+        self.assertEqual(recs[1], {'type': 'set', 'name': 'one', 'path': '/one',
+                                   'cpus': '1-2', 'cpu_exclusive': False,
+                                   'mems': '0', 'mem_exclusive': False,
+                                   'tasks': 1, 'subsets': 0})
+
+    def test_ndjson(self):
+        lines = self.run_listing('ndjson', proc.list_sets, 'one').splitlines()
+        self.assertEqual(len(lines), 1)
+        rec = json.loads(lines[0])
+        self.assertEqual(rec['pid'], self.pid)
+        self.assertEqual(rec['set'], '/one')
+        self.assertEqual(rec['cmdline'], ['/bin/sh', '-c', 'echo a;b'])
+        self.assertFalse(rec['kthread'])
+        self.assertTrue(proc.task_detail(self.pid, 0).endswith(' /bin/sh -c echo a;b'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import unittest
+
+from cpuset import config, util
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = config.progress_rate, config.progress_interval
+
+    def tearDown(self):
+        config.progress_rate, config.progress_interval = self.saved
+
+    def test_quick(self):
+        # nothing is shown for operations done within the first interval
+        f = Terminal()
+        pb = util.ProgressBar(1000, '=', f=f)
+        for n in range(1, 1001):
+            pb(n)
+        self.assertEqual(f.getvalue(), '')
+
+    def test_terminal(self):
+        config.progress_rate = 1e9
+        f = Terminal()
+        pb = util.ProgressBar(4, '=', 'tasks moved', f=f)
+        for n in range(1, 5):
+            pb(n)
+        pb(5)
+        lines = f.getvalue().split('\r')[1:]
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith('[' + '=' * 15 + ' ' * 15 + ']  50% 2/4 tasks moved'))
+        self.assertIn(' ETA ', lines[1])
+        self.assertTrue(lines[3].endswith(' ETA done\n'))
+
+    def test_log(self):
+        config.progress_interval = 0
+        pb = util.ProgressBar(3, f=io.StringIO())
+        with self.assertLogs('cset') as cm:
+            pb(1)
+            pb(3)
+        self.assertEqual(len(cm.output), 2)
+        self.assertIn('progress: 1/3 tasks (33%)', cm.output[0])
+        self.assertIn('ETA done', cm.output[1])
+
+    def test_duration(self):
+        self.assertEqual(util.duration(75.9), '1:15')
+        self.assertEqual(util.duration(3725), '1:02:05')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import subprocess
+import unittest
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def importtime(code):
+    """return {module: self time in us} of running code with -X importtime"""
+    # byte-compiling is not what we measure, let the first run cache it
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         cwd=TOP, env=env, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, universal_newlines=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        times[fields[2].strip()] = int(fields[0])
+    return times
+
+class TestStartup(unittest.TestCase):
+
+    code = 'import cpuset.main, cpuset.commands.proc'
+
+    def test_lazy_imports(self):
+        mods = importtime(self.code)
+        self.assertIn('cpuset.commands.proc', mods)
+        for mod in ('configparser', 'pwd', 'grp', 'socket', 'json',
+                    'cpuset.commands.set', 'cpuset.commands.daemon'):
+            self.assertNotIn(mod, mods)
+
+if __name__ == '__main__':
+    unittest.main()
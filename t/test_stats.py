@@ -0,0 +1,44 @@
+import unittest
+
+from cpuset import backend, procfs, stats, trace
+
+class TestStats(unittest.TestCase):
+
+    def tearDown(self):
+        stats.current = None
+
+    def test_disabled(self):
+        stats.count('anything')
+        self.assertIs(trace.span('x'), trace.nullspan)
+
+    def test_phases(self):
+        st = stats.enable()
+        with trace.span('outer'):
+            with trace.span('inner'):
+                pass
+            stats.count('tasks_writes', 3)
+        stats.count('tasks_writes')
+        self.assertEqual(st.counters, {'tasks_writes': 4})
+        self.assertEqual(sorted(st.phases), ['inner', 'outer'])
+        self.assertEqual(st.phases['outer'][0], 1)
+        lines = st.report(mread=True)
+        self.assertTrue(lines[0].startswith('stats_total;'))
+        self.assertIn('stats_count;tasks_writes;4', lines)
+        self.assertEqual([l.split(';')[1] for l in lines if l.startswith('stats_phase')],
+                         ['inner', 'outer'])
+        self.assertIn('tasks_writes', '\n'.join(st.report()))
+
+    def test_proc_reads(self):
+        # the backend counts the files of /proc it really reads
+        sim = backend.Simulated(cpus=2, processes=2, kthreads=0)
+        st = stats.enable()
+        self.assertEqual(len(list(procfs.task_stats(['7', '8', '99'], None, sim))), 2)
+        self.assertEqual(st.counters, {'proc_reads': 3})
+        sim.pids()
+        sim.listdir('/proc')
+        sim.listdir(sim.root)
+        sim.read(sim.root + '/' + sim.prefix + 'cpus')
+        self.assertEqual(st.counters, {'proc_reads': 5})
+
+if __name__ == '__main__':
+    unittest.main()
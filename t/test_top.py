@@ -0,0 +1,62 @@
+import io
+import unittest
+
+from cpuset import cset, procfs, top
+from cpuset.commands import proc, set
+
+from simulated import SimulatedTest
+
+class TestTop(SimulatedTest):
+
+    system = dict(cpus=4, processes=4, kthreads=0)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        set.create('rt', '2-3', '0', False, False)
+        proc.move('root', 'rt', ['11', '12'])
+
+    def tick(self, cpu, busy, idle):
+        self.sim.cputimes[cpu][0] += busy
+        self.sim.cputimes[cpu][3] += idle
+
+    def test_cpus(self):
+        t = top.Top()
+        self.assertEqual(sorted(t.cpus_of('0,2-3')), [0, 2, 3])
+        self.assertIs(t.cpus_of('0,2-3'), t.cpus_of('0,2-3'))
+
+    def test_procfs(self):
+        self.tick(3, 5, 7)
+        times = procfs.cpu_times()
+        self.assertEqual(list(times.total), [0, 0, 0, 12])
+        self.assertEqual(list(times.busy), [0, 0, 0, 5])
+        self.sim.tasks[11].utime = 3
+        self.sim.tasks[11].state = 'R'
+        st = list(procfs.task_stats(['11', '99999']))
+        self.assertEqual(st, [procfs.TaskStat(11, 'R', 0, 3, 0, 2)])
+
+    def test_sample(self):
+        t = top.Top()
+        self.assertEqual(t.sample(), None)
+        self.tick(0, 10, 90)
+        self.tick(2, 100, 0)
+        self.tick(3, 50, 50)
+        self.sim.tasks[11].utime += 120
+        self.sim.tasks[12].stime += 30
+        self.sim.tasks[12].state = 'R'
+        loads = dict([(l.set.path, l) for l in t.sample()])
+        self.assertAlmostEqual(loads['/rt'].busy, 0.75)
+        self.assertAlmostEqual(loads['/rt'].taskcpu, 0.75)
+        self.assertAlmostEqual(loads['/rt'].runnable, 0.5)
+        self.assertEqual(loads['/rt'].tasks, 2)
+        self.assertAlmostEqual(loads['/'].busy, 160 / 300.0)
+        self.assertAlmostEqual(loads['/'].taskcpu, 0.0)
+
+    def test_run(self):
+        out = io.StringIO()
+        top.run(0.001, 2, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 * 4 + 1)
+        self.assertTrue(lines[3].endswith(' /rt'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import json
+import logging
+import tempfile
+import unittest
+
+from cpuset import trace
+from cpuset import main
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        trace.disable()
+        os.unlink(self.path)
+
+    def records(self):
+        return [json.loads(l) for l in open(self.path)]
+
+    def test_disabled(self):
+        self.assertIs(trace.span('x', a=1), trace.nullspan)
+        with trace.span('x') as sp:
+            sp.set(b=2)
+        self.assertEqual(self.records(), [])
+
+    def test_spans(self):
+        trace.enable(self.path)
+        @trace.traced('inner')
+        def inner():
+            return 42
+        with trace.span('outer', sets=3) as sp:
+            self.assertEqual(inner(), 42)
+            sp.set(tasks=7)
+        with self.assertRaises(ValueError):
+            with trace.span('failing'):
+                raise ValueError('bad')
+        recs = self.records()
+        self.assertEqual([r['span'] for r in recs], ['inner', 'outer', 'failing'])
+        self.assertEqual(recs[0]['parent'], 'outer')
+        self.assertEqual(recs[1]['parent'], None)
+        self.assertEqual((recs[1]['sets'], recs[1]['tasks']), (3, 7))
+        self.assertGreaterEqual(recs[1]['dur'], recs[0]['dur'])
+        self.assertEqual(recs[2]['error'], 'bad')
+
+class TestLogLevel(unittest.TestCase):
+
+    def test_level_from_handlers(self):
+        root = logging.getLogger('')
+        saved = root.handlers[:], root.level
+        try:
+            root.handlers = [logging.StreamHandler()]
+            root.handlers[0].setLevel(logging.INFO)
+            main.set_log_level()
+            self.assertFalse(root.isEnabledFor(logging.DEBUG))
+            debug = logging.NullHandler()
+            debug.setLevel(logging.DEBUG)
+            root.addHandler(debug)
+            main.set_log_level()
+            self.assertTrue(root.isEnabledFor(logging.DEBUG))
+        finally:
+            root.handlers, level = saved
+            root.setLevel(level)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from cpuset import cset
+from cpuset.commands import proc, set, shield
+
+from simulated import SimulatedTest
+
+class TestViolations(SimulatedTest):
+
+    system = dict(cpus=4, processes=3, threads=1, kthreads=1)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        set.create('system', '0-1', '0', False, False)
+        set.create('user', '2-3', '0', False, False)
+        # pid 11 is a kworker, 12-17 three processes of two threads
+        proc.move('root', 'system', ['12', '13', '14', '15'])
+        proc.move('root', 'user', ['16', '17'])
+
+    def test_none(self):
+        self.assertEqual(shield.sample_violations(), {})
+
+    def test_sample(self):
+        self.sim.tasks[11].processor = 2
+        self.sim.tasks[13].processor = 3
+        self.sim.tasks[16].processor = 0
+        self.sim.tasks[17].processor = 1
+        found = shield.sample_violations()
+        self.assertEqual(sorted(found), [('11', 'shield'), ('12', 'outside'),
+                                         ('16', 'outside')])
+        v = found[('12', 'outside')]
+        self.assertEqual(v.record()['threads'], [13])
+        self.assertEqual(v.record()['cpus'], [3])
+        self.assertEqual(v.path, '/system')
+        self.assertEqual(found[('16', 'outside')].record()['threads'], [16, 17])
+        self.assertEqual(found[('11', 'shield')].path, '/')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from cpuset import cset
+
+class TestWaitEmpty(unittest.TestCase):
+
+    def setUp(self):
+        self.base = cset.CpuSet.basepath
+        self.tmp = tempfile.mkdtemp()
+        cset.CpuSet.basepath = self.tmp
+        os.mkdir(self.tmp + '/a')
+
+    def tearDown(self):
+        cset.CpuSet.basepath = self.base
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        f = open(self.tmp + '/a/' + name, 'w')
+        f.write(text)
+        f.close()
+
+    def test_empty(self):
+        self.write(cset.CpuSet.tasks_path.lstrip('/'), '')
+        self.assertEqual(cset.wait_empty('/a', timeout=1), [])
+
+    def test_timeout(self):
+        self.write(cset.CpuSet.tasks_path.lstrip('/'), '42\n43\n')
+        start = time.time()
+        self.assertEqual(cset.wait_empty('/a', timeout=0.05), ['42', '43'])
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_cgroup_events(self):
+        self.write('cgroup.procs', '42\n')
+        self.write('cgroup.events', 'populated 0\nfrozen 0\n')
+        self.assertEqual(cset.wait_empty('/a', timeout=1), [])
+
+if __name__ == '__main__':
+    unittest.main()
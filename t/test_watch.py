@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from cpuset import cset, procfs, watch
+from cpuset.commands import set
+from cpuset.util import CpusetException
+
+from simulated import SimulatedTest
+
+class TestRules(unittest.TestCase):
+
+    def test_rule_keys(self):
+        with self.assertRaises(CpusetException):
+            watch.Rule('nosset', {'comm': 'foo'})
+        with self.assertRaises(CpusetException):
+            watch.Rule('badkey', {'set': 'user', 'color': 'blue'})
+        with self.assertRaises(CpusetException):
+            watch.Rule('badkthread', {'set': 'user', 'kthread': 'maybe'})
+        rule = watch.Rule('ok', {'set': 'user', 'uid': '0', 'kthread': 'no'})
+        self.assertEqual(rule.uid, 0)
+        self.assertFalse(rule.kthread)
+
+    def test_match_self(self):
+        me = watch.Task(os.getpid())
+        self.assertFalse(me.kthread)
+        self.assertEqual(me.uid, os.getuid())
+        self.assertEqual(me.ppid, str(os.getppid()))
+        rule = watch.Rule('me', {'set': 'user', 'uid': str(os.getuid()),
+                                 'comm': me.comm[:2] + '*'})
+        self.assertTrue(rule.matches(me))
+        rule = watch.Rule('notme', {'set': 'user', 'exe': '/nonexistent/*'})
+        self.assertFalse(rule.matches(me))
+        rule = watch.Rule('parent', {'set': 'user', 'parent': str(os.getppid())})
+        self.assertTrue(rule.matches(me))
+        rule = watch.Rule('kthread', {'set': 'user', 'kthread': 'yes'})
+        self.assertFalse(rule.matches(me))
+
+    def test_poller(self):
+        poller = watch.ProcPoller()
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        try:
+            self.assertIn(pid, poller.events())
+        finally:
+            os.waitpid(pid, 0)
+        self.assertNotIn(pid, poller.events())
+
+class TestPlace(SimulatedTest):
+    """rules placing the tasks of a simulated system"""
+
+    system = dict(cpus=4, processes=3, kthreads=2)
+
+    def setUp(self):
+        SimulatedTest.setUp(self)
+        procfs.classifier.forget()
+        set.create('one', '1-2', '0', False, False)
+        set.create('two', '3', '0', False, False)
+
+    def test_place(self):
+        # 2 is kthreadd, 3-10 bound kernel threads, 11-12 unbound ones
+        # and 13-15 processes
+        rules = [watch.Rule('kthreads', {'set': 'one', 'kthread': 'yes'}),
+                 watch.Rule('procs', {'set': 'two', 'comm': 'proc*'})]
+        for rule in rules:
+            rule.resolve()
+        task = watch.Task(11)
+        self.assertTrue(task.kthread and task.unbound)
+        self.assertFalse(watch.Task(13).kthread)
+        self.assertFalse(watch.Task(99999).kthread)
+        self.assertEqual(watch.place(rules, self.sim.pids()), 6)
+        self.assertEqual(sorted(self.sim.sets['/one'].tasks), [2, 11, 12])
+        self.assertEqual(sorted(self.sim.sets['/two'].tasks), [13, 14, 15])
+        self.assertEqual(self.sim.tasks[3].cpuset, '/')
+
+if __name__ == '__main__':
+    unittest.main()